@@ -1,195 +1,141 @@
 # app.py
-from flask import Flask, request, jsonify, session, send_from_directory
-from datetime import date, timedelta
+from flask import (
+    Blueprint, Flask, Response, current_app, g, request, jsonify, session, send_from_directory,
+    stream_with_context,
+)
+from datetime import timedelta
+from functools import wraps
 from dotenv import load_dotenv
+
+load_dotenv()
+
 from config import (
     SQLALCHEMY_DATABASE_URI,
+    SQLALCHEMY_ENGINE_OPTIONS,
+    SQLALCHEMY_REPLICA_URI,
     SQLALCHEMY_TRACK_MODIFICATIONS,
-    MYSQL_USER, MYSQL_PASS, MYSQL_HOST, MYSQL_PORT, MYSQL_DB,
 )
 from models import db
 from models.user import User
 from models.pago import Pago
 from models.historial import Historial
 from models.dinero import Dinero
-from ml.model import evaluar_gasto
-from ml.gpt import generar_mensaje_gpt
+from models.estadistica_gasto import EstadisticaGasto
+from ml.model import evaluar_gasto, evaluar_gastos, limite_gasto_seguro
+from ml.gpt import generar_mensaje_gpt, generar_mensaje_gpt_stream, obtener_cache, obtener_breaker, presupuesto_latencia
 from services.balance_service import BalanceService
 from services.payment_service import PaymentService
-from sqlalchemy import text
+from services.estadistica_service import EstadisticaService
+from services.identidad_service import IdentidadService
+from services.dashboard_service import DashboardService
+from services.export_service import FORMATOS, ExportService
+from services.analitica_service import MAX_DIAS, AnaliticaService
+from services.eventos_service import heartbeat, obtener_bus, sse_habilitado
+from services.replica_service import ReplicaService, obtener_monitor, pin_segundos
+from services.pool_service import QueuePoolMedido, estado_pool, instalar_metricas, ping
+import instrumentacion
+from services.password_service import PasswordService, PoolSaturado, obtener_pool
+import click
+import json
+import math
 import os
-import pymysql
-
-load_dotenv()
+import time
 
-# ---------------------------------------------------------------------
-# Crear DB si no existe
-# ---------------------------------------------------------------------
-conn = pymysql.connect(
-    host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASS, port=int(MYSQL_PORT)
-)
-cursor = conn.cursor()
-cursor.execute(
-    f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DB}` "
-    "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;"
-)
-cursor.close()
-conn.close()
+bp = Blueprint("api", __name__)
 
 # ---------------------------------------------------------------------
 # Flask + SQLAlchemy + Sesión
 # ---------------------------------------------------------------------
-app = Flask(__name__, static_folder="public", static_url_path="/")
-app.config["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = SQLALCHEMY_TRACK_MODIFICATIONS
-
-app.secret_key = os.getenv("SESSION_SECRET", "dev-secret")
-app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=7)
-app.config["SESSION_COOKIE_HTTPONLY"] = True
-app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
-app.config["SESSION_COOKIE_SECURE"] = bool(int(os.getenv("SESSION_COOKIE_SECURE", "0")))
-
-db.init_app(app)
-
-# ---------------------------------------------------------------------
-# Bootstrapping: tablas, migraciones, normalización de contraseñas y semilla
-# ---------------------------------------------------------------------
-with app.app_context():
-    db.create_all()
-
-    # === Migraciones básicas ya existentes ===
-    pago_table   = Pago.__table__.name
-    dinero_table = Dinero.__table__.name
-
-    # pagos.tipo
-    existe_tipo = db.session.execute(text("""
-        SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = :db AND TABLE_NAME = :tbl AND COLUMN_NAME = 'tipo'
-    """), {"db": MYSQL_DB, "tbl": pago_table}).scalar()
-    if not existe_tipo:
-        db.session.execute(text(f"""
-            ALTER TABLE `{pago_table}` ADD COLUMN `tipo` VARCHAR(10) NOT NULL DEFAULT 'debito'
-        """))
-
-    # dinero.deuda_credito
-    existe_deuda = db.session.execute(text("""
-        SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = :db AND TABLE_NAME = :tbl AND COLUMN_NAME = 'deuda_credito'
-    """), {"db": MYSQL_DB, "tbl": dinero_table}).scalar()
-    if not existe_deuda:
-        db.session.execute(text(f"""
-            ALTER TABLE `{dinero_table}` ADD COLUMN `deuda_credito` DECIMAL(12,2) NOT NULL DEFAULT 0
-        """))
-    db.session.commit()
-
-    # === Migraciones mejoradas ===
-    def col_exists(table: str, col: str) -> bool:
-        return bool(db.session.execute(text("""
-            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_SCHEMA = :db AND TABLE_NAME = :tbl AND COLUMN_NAME = :col LIMIT 1
-        """), {"db": MYSQL_DB, "tbl": table, "col": col}).first())
-
-    users_tbl = User.__table__.name
-    pagos_tbl = Pago.__table__.name
-    dinero_tbl = Dinero.__table__.name
-    hist_tbl = Historial.__table__.name
-
-    # users: created/updated y last_login_at
-    if not col_exists(users_tbl, "created_at"):
-        db.session.execute(text(f"ALTER TABLE `{users_tbl}` ADD COLUMN `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"))
-    if not col_exists(users_tbl, "updated_at"):
-        db.session.execute(text(f"ALTER TABLE `{users_tbl}` ADD COLUMN `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
-    if not col_exists(users_tbl, "last_login_at"):
-        db.session.execute(text(f"ALTER TABLE `{users_tbl}` ADD COLUMN `last_login_at` DATETIME NULL"))
-
-    # pagos: metadata + auditoría
-    if not col_exists(pagos_tbl, "categoria"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `categoria` VARCHAR(60) NULL"))
-    if not col_exists(pagos_tbl, "metodo"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `metodo` VARCHAR(20) NULL"))
-    if not col_exists(pagos_tbl, "referencia"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `referencia` VARCHAR(80) NULL"))
-    if not col_exists(pagos_tbl, "notas"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `notas` TEXT NULL"))
-    if not col_exists(pagos_tbl, "created_at"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"))
-    if not col_exists(pagos_tbl, "updated_at"):
-        db.session.execute(text(f"ALTER TABLE `{pagos_tbl}` ADD COLUMN `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
-    # índice (si MySQL < 8.* ignora si falla)
-    try:
-        db.session.execute(text(f"CREATE INDEX IF NOT EXISTS idx_pagos_user_fecha ON `{pagos_tbl}` (idUser, pagoFecha)"))
-    except Exception:
-        pass
-
-    # dinero: moneda + auditoría
-    if not col_exists(dinero_tbl, "moneda"):
-        db.session.execute(text(f"ALTER TABLE `{dinero_tbl}` ADD COLUMN `moneda` VARCHAR(3) NOT NULL DEFAULT 'MXN'"))
-    if not col_exists(dinero_tbl, "created_at"):
-        db.session.execute(text(f"ALTER TABLE `{dinero_tbl}` ADD COLUMN `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"))
-    if not col_exists(dinero_tbl, "updated_at"):
-        db.session.execute(text(f"ALTER TABLE `{dinero_tbl}` ADD COLUMN `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"))
-
-    # historial: auditoría
-    if not col_exists(hist_tbl, "created_at"):
-        db.session.execute(text(f"ALTER TABLE `{hist_tbl}` ADD COLUMN `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"))
-    db.session.commit()
-
-    # --- Normaliza contraseñas antiguas (plano -> hash) ---
-    from werkzeug.security import generate_password_hash
-    def _es_hash(c: str) -> bool:
-        return isinstance(c, str) and c.startswith("pbkdf2:sha256:")
-    users = User.query.all()
-    changed = 0
-    for u in users:
-        if not _es_hash(u.contrasena) and u.contrasena:
-            u.contrasena = generate_password_hash(u.contrasena, method="pbkdf2:sha256", salt_length=16)
-            changed += 1
-    if changed:
-        db.session.commit()
-        print(f"[migracion] Contraseñas convertidas a hash: {changed}")
-
-    # --- Semilla mínima (si DB vacía) ---
-    if not User.query.first():
-        usuario = User(
-            nombre="Carlos",
-            apellido="Ramírez",
-            correo="carlos@example.com",
-            contrasena="",
-            biometricos="bio1",
-            numeroTelefono="5551234567",
+def create_app(config: dict = None) -> Flask:
+    """
+    Crea la app sin tocar la base de datos: el esquema, las migraciones y la
+    semilla viven en bootstrap.py y se corren aparte (`flask --app app bootstrap`).
+    """
+    app = Flask(__name__, static_folder="public", static_url_path="/")
+    app.config["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = SQLALCHEMY_TRACK_MODIFICATIONS
+
+    app.secret_key = os.getenv("SESSION_SECRET", "dev-secret")
+    app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=7)
+    app.config["SESSION_COOKIE_HTTPONLY"] = True
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+    app.config["SESSION_COOKIE_SECURE"] = bool(int(os.getenv("SESSION_COOKIE_SECURE", "0")))
+
+    if config:
+        app.config.update(config)
+    if SQLALCHEMY_REPLICA_URI:
+        app.config.setdefault("SQLALCHEMY_BINDS", {"replica": SQLALCHEMY_REPLICA_URI})
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config.setdefault(
+            "SQLALCHEMY_ENGINE_OPTIONS", {**SQLALCHEMY_ENGINE_OPTIONS, "poolclass": QueuePoolMedido}
         )
-        usuario.set_password("1234")
-        db.session.add(usuario)
-        db.session.flush()
-
-        saldo = Dinero(saldo=4200.00, deuda_credito=1200.00, idUser=usuario.idUser)
-        db.session.add(saldo)
-
-        p1 = Pago(idUser=usuario.idUser, motivo="Netflix",    pagoFecha=date.today(), monto=250.00,  tipo="credito", categoria="entretenimiento")
-        p2 = Pago(idUser=usuario.idUser, motivo="Super",      pagoFecha=date.today(), monto=800.00,  tipo="debito",  categoria="hogar")
-        p3 = Pago(idUser=usuario.idUser, motivo="Transporte", pagoFecha=date.today(), monto=120.50,  tipo="debito",  categoria="movilidad")
-        db.session.add_all([p1, p2, p3]); db.session.flush()
-        for p in (p1, p2, p3):
-            db.session.add(Historial(idDinero=saldo.idDinero, idPago=p.idPago))
-        db.session.commit()
 
-    # --- Verificar usuarios sin saldo y crearles uno ---
-    users_sin_saldo = db.session.query(User).outerjoin(Dinero).filter(Dinero.idDinero == None).all()
-    if users_sin_saldo:
-        for u in users_sin_saldo:
-            nuevo_saldo = Dinero(saldo=0, deuda_credito=0, idUser=u.idUser)
-            db.session.add(nuevo_saldo)
-        db.session.commit()
-        print(f"[migracion] Se creó saldo para {len(users_sin_saldo)} usuario(s) sin registro de saldo")
+    db.init_app(app)
+    app.register_blueprint(bp)
+    instrumentacion.instalar(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            instalar_metricas(engine)
+            instrumentacion.instalar_engine(engine)
+
+    @app.cli.command("bootstrap")
+    def bootstrap_command():
+        """Crea la base de datos, migra el esquema y siembra datos iniciales."""
+        from bootstrap import bootstrap
+        bootstrap(app)
+
+    @app.cli.command("rehash-contrasenas")
+    @click.option("--lote", default=1000, show_default=True, help="Usuarios por lote.")
+    @click.option("--procesos", default=None, type=int, help="Procesos para el hash (default: CPUs).")
+    @click.option("--desde", default=0, show_default=True, help="Reanudar después de este idUser.")
+    def rehash_command(lote, procesos, desde):
+        """Convierte contraseñas en texto plano a pbkdf2, por lotes."""
+        from bootstrap import normalizar_contrasenas
+        normalizar_contrasenas(lote=lote, procesos=procesos, desde_id=desde)
+
+    @app.cli.command("copiar-dinero-pagos")
+    @click.option("--lote", default=1000, show_default=True, help="Pagos por lote.")
+    @click.option("--desde", default=0, show_default=True, help="Reanudar después de este idPago.")
+    def copiar_dinero_command(lote, desde):
+        """Llena pagos.idDinero desde historial, por lotes."""
+        from bootstrap import copiar_dinero_a_pagos
+        copiar_dinero_a_pagos(lote=lote, desde_id=desde)
+
+    @app.cli.command("reconstruir-gastos")
+    @click.option("--lote", default=1000, show_default=True, help="Usuarios por lote.")
+    @click.option("--desde", default=0, show_default=True, help="Reanudar después de este idUser.")
+    def reconstruir_gastos_command(lote, desde):
+        """Recalcula gasto_diario y gasto_mensual desde pagos (pandas), por lotes."""
+        from bootstrap import reconstruir_gastos
+        reconstruir_gastos(lote=lote, desde_id=desde)
+
+    @app.cli.command("crear-saldos")
+    @click.option("--lote", default=1000, show_default=True, help="Usuarios por lote.")
+    @click.option("--desde", default=0, show_default=True, help="Reanudar después de este idUser.")
+    def crear_saldos_command(lote, desde):
+        """Crea el registro de saldo de los usuarios que no tienen, por lotes."""
+        from bootstrap import crear_saldos_faltantes
+        crear_saldos_faltantes(lote=lote, desde_id=desde)
+
+    return app
 
 # ---------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------
 def current_user():
+    """Identidad de la sesión (campos visibles + idDinero), resuelta una vez por petición."""
     uid = session.get("user_id")
     if not uid:
         return None
-    return User.query.get(uid)
+    if "identidad" not in g:
+        g.identidad = IdentidadService.cargar(uid)
+    return g.identidad
+
+@bp.teardown_app_request
+def _olvidar_identidad(exc):
+    # g vive en el app context; si alguien lo mantiene abierto (pruebas, CLI)
+    # la identidad no debe pasar de una petición a otra
+    g.pop("identidad", None)
 
 def require_auth_user():
     user = current_user()
@@ -197,25 +143,142 @@ def require_auth_user():
         return None, (jsonify({"error": "unauthorized"}), 401)
     return user, None
 
+def require_usuario_evaluado(data: dict):
+    """
+    Las evaluaciones son siempre del usuario de la sesión; un idUser en el
+    body se acepta sólo si es el mismo. Regresa (user_id, err).
+    """
+    user, err = require_auth_user()
+    if err:
+        return None, err
+    pedido = data.get("idUser")
+    if pedido not in (None, "") and str(pedido) != str(user.idUser):
+        return None, (jsonify({"error": "forbidden"}), 403)
+    return user.idUser, None
+
+def datos_evaluacion(data: dict):
+    """
+    saldo, suscripciones, esencial y nuevo_gasto del body, validados.
+    Regresa (datos, err).
+    """
+    try:
+        datos = dict(
+            saldo=float(data["saldo"]),
+            suscripciones=int(data.get("suscripciones", 0)),
+            esencial=int(data.get("esencial", 1)),
+            nuevo_gasto=float(data["nuevo_gasto"]),
+        )
+    except KeyError:
+        return None, (jsonify({"error": "Payload incompleto"}), 400)
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "Parámetros inválidos"}), 400)
+    # float() acepta "nan" e "inf": ni el modelo ni la llave de caché los soportan
+    if not (math.isfinite(datos["saldo"]) and math.isfinite(datos["nuevo_gasto"])):
+        return None, (jsonify({"error": "Parámetros inválidos"}), 400)
+    return datos, None
+
+def lectura_replica(fn):
+    """
+    Los SELECT de la ruta van a la réplica, salvo que el usuario haya escrito
+    hace poco o la réplica vaya atrasada (ver services/replica_service.py).
+    """
+    def decidir():
+        db.session.info["replica"] = ReplicaService.decidir(session.get("primario_hasta", 0))
+
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        decidir()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            db.session.info.pop("replica", None)
+    return envoltura
+
+@bp.after_app_request
+def _fijar_primario(resp):
+    # read-your-writes: tras un commit con escrituras, este usuario lee del
+    # primario unos segundos aunque la ruta prefiera la réplica
+    if ReplicaService.escritura_confirmada() and ReplicaService.configurada():
+        session["primario_hasta"] = time.time() + pin_segundos()
+    return resp
+
+def saturado_response(e: PoolSaturado):
+    resp = jsonify({"error": "Servicio saturado, intenta de nuevo en unos segundos"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def con_etag(resp: Response, etag: str) -> Response:
+    resp.set_etag(etag)
+    # el navegador guarda la respuesta pero siempre revalida con If-None-Match
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def no_modificado(etag: str):
+    """304 si el cliente ya tiene esta versión; None si hay que mandar el cuerpo."""
+    if request.if_none_match.contains_weak(etag):
+        return con_etag(Response(status=304), etag)
+    return None
+
+def sse_event(evento: str, data) -> str:
+    return f"event: {evento}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(eventos) -> Response:
+    return Response(eventos, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # que nginx no acumule el stream
+    })
+
 # ---------------------------------------------------------------------
 # Rutas estáticas
 # ---------------------------------------------------------------------
-@app.get("/")
+@bp.get("/")
 def root_index():
-    return send_from_directory(app.static_folder, "index.html")
+    return send_from_directory(current_app.static_folder, "index.html")
 
-@app.get("/dashboard.html")
+@bp.get("/dashboard.html")
 def dash_html():
-    return send_from_directory(app.static_folder, "dashboard.html")
+    return send_from_directory(current_app.static_folder, "dashboard.html")
 
-@app.get("/health")
+@bp.get("/health")
 def ok():
-    return jsonify({"ok": True})
+    estado = ping(db.engine)
+    return jsonify({"ok": estado["ok"], "db": estado}), 200 if estado["ok"] else 503
+
+@bp.get("/metrics")
+def metrics():
+    return Response(instrumentacion.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@bp.get("/health/replica")
+def replica_health():
+    return jsonify({"configurada": ReplicaService.configurada(), **obtener_monitor().stats()})
+
+@bp.get("/health/db")
+def db_health():
+    return jsonify({
+        nombre or "default": estado_pool(engine) for nombre, engine in db.engines.items()
+    })
+
+@bp.get("/health/gpt")
+def gpt_health():
+    return jsonify({
+        "cache": obtener_cache().stats(),
+        "circuit_breaker": obtener_breaker().stats(),
+        "latency_budget": presupuesto_latencia(),
+    })
+
+@bp.get("/health/hash")
+def hash_health():
+    return jsonify(obtener_pool().stats())
+
+@bp.get("/health/eventos")
+def eventos_health():
+    return jsonify(obtener_bus().stats())
 
 # ---------------------------------------------------------------------
 # Auth (hash + last_login_at)
 # ---------------------------------------------------------------------
-@app.post("/api/login")
+@bp.post("/api/login")
 def login():
     data = request.get_json(force=True)
     correo = (data.get("correo") or "").strip()
@@ -226,9 +289,22 @@ def login():
         return jsonify({"error": "Faltan datos"}), 400
 
     user = User.query.filter_by(correo=correo).first()
-    if not user or not user.check_password(contrasena):
+    try:
+        valido = bool(user) and PasswordService.verificar(user.contrasena, contrasena)
+    except PoolSaturado as e:
+        return saturado_response(e)
+    if not valido:
         return jsonify({"error": "Usuario o contraseña inválidos"}), 401
 
+    # Rehash si cambiaron los parámetros de costo; si el pool está lleno se
+    # deja para el siguiente login
+    if PasswordService.necesita_rehash(user.contrasena):
+        try:
+            user.contrasena = PasswordService.hashear(contrasena)
+            PasswordService.registrar_rehash()
+        except PoolSaturado:
+            pass
+
     session["user_id"] = user.idUser
     session.permanent = remember
 
@@ -240,7 +316,7 @@ def login():
         "idUser": user.idUser, "nombre": user.nombre, "apellido": user.apellido, "correo": user.correo
     }})
 
-@app.post("/api/register")
+@bp.post("/api/register")
 def register():
     """
     Registra un nuevo usuario en el sistema.
@@ -287,17 +363,21 @@ def register():
     if existing_user:
         return jsonify({"error": "El correo ya está registrado"}), 409
 
+    try:
+        contrasena_hash = PasswordService.hashear(contrasena)
+    except PoolSaturado as e:
+        return saturado_response(e)
+
     try:
         # Crear usuario
         nuevo_usuario = User(
             nombre=nombre,
             apellido=apellido,
             correo=correo,
-            contrasena="",  # Se establece con set_password
+            contrasena=contrasena_hash,
             numeroTelefono=numeroTelefono or None,
             biometricos=biometricos or None
         )
-        nuevo_usuario.set_password(contrasena)
         db.session.add(nuevo_usuario)
         db.session.flush()
 
@@ -320,12 +400,13 @@ def register():
         db.session.rollback()
         return jsonify({"error": "Error al registrar usuario", "detail": str(e)}), 500
 
-@app.post("/api/logout")
+@bp.post("/api/logout")
 def logout():
+    IdentidadService.invalidar(session.get("user_id"))
     session.clear()
     return jsonify({"ok": True})
 
-@app.get("/api/me")
+@bp.get("/api/me")
 def me():
     user = current_user()
     if not user:
@@ -337,50 +418,113 @@ def me():
 # ---------------------------------------------------------------------
 # Evaluación de gasto (ML)
 # ---------------------------------------------------------------------
-@app.post("/api/evaluar")
+@bp.post("/api/evaluar")
+@lectura_replica
 def evaluar():
     data = request.get_json(force=True)
 
-    # usar sesión si no llega idUser
-    user_id = data.get("idUser")
-    if not user_id:
-        user, err = require_auth_user()
-        if err: return err
-        user_id = user.idUser
+    user_id, err = require_usuario_evaluado(data)
+    if err: return err
 
-    pagos = Pago.query.filter_by(idUser=user_id).order_by(Pago.pagoFecha).all()
-    historial_pagos = [{
-        "monto": float(p.monto),
-        "motivo": p.motivo,
-        "fecha": p.pagoFecha.isoformat() if p.pagoFecha else None,
-    } for p in pagos]
+    datos, err = datos_evaluacion(data)
+    if err: return err
+
+    # Resumen incremental (tamaño constante) en lugar del historial completo
+    resumen = EstadisticaService.obtener_resumen(user_id)
+    db.session.commit()
+
+    riesgo = evaluar_gasto(**datos, resumen=resumen)
+    if riesgo == 1:
+        # El presupuesto de latencia (GPT_LATENCY_BUDGET) acota sólo esta llamada
+        mensaje = generar_mensaje_gpt(**datos, resumen=resumen)
+        return jsonify({"alerta": True, "mensaje": mensaje})
+    return jsonify({"alerta": False})
+
+@bp.post("/api/evaluar/stream")
+@lectura_replica
+def evaluar_stream():
+    """
+    Igual que /api/evaluar pero como Server-Sent Events: primero llega
+    "decision" ({alerta}) y, si hay alerta, los fragmentos del mensaje como
+    "token" y al final "fin" ({mensaje, fuente}) con el texto definitivo.
+    """
+    data = request.get_json(force=True)
+
+    user_id, err = require_usuario_evaluado(data)
+    if err: return err
+
+    datos, err = datos_evaluacion(data)
+    if err: return err
+
+    resumen = EstadisticaService.obtener_resumen(user_id)
+    db.session.commit()
+
+    riesgo = evaluar_gasto(**datos, resumen=resumen)
+
+    def eventos():
+        yield sse_event("decision", {"alerta": riesgo == 1})
+        if riesgo != 1:
+            yield sse_event("fin", {"mensaje": None, "fuente": None})
+            return
+        for ev in generar_mensaje_gpt_stream(**datos, resumen=resumen):
+            yield sse_event(ev.pop("tipo"), ev)
+
+    return sse_response(eventos())
+
+MAX_CANDIDATOS = 1000
+
+@bp.post("/api/evaluar/limite")
+@lectura_replica
+def evaluar_limite():
+    """
+    Gasto máximo que evaluar_gasto todavía considera seguro.
+    Body: {"saldo": float, "suscripciones": int, "esencial": 0|1,
+           "candidatos": [float, ...] (opcional, se evalúan en una sola pasada)}
+    """
+    data = request.get_json(force=True)
+
+    user_id, err = require_usuario_evaluado(data)
+    if err: return err
 
     try:
-        riesgo = evaluar_gasto(
-            saldo=float(data["saldo"]),
-            suscripciones=int(data.get("suscripciones", 0)),
-            esencial=int(data.get("esencial", 1)),
-            nuevo_gasto=float(data["nuevo_gasto"]),
-            historial_pagos=historial_pagos,
-        )
+        saldo = float(data["saldo"])
+        suscripciones = int(data.get("suscripciones", 0))
+        esencial = int(data.get("esencial", 1))
+        candidatos = [float(c) for c in (data.get("candidatos") or [])]
     except KeyError:
         return jsonify({"error": "Payload incompleto"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Parámetros inválidos"}), 400
+    # float() acepta "nan" e "inf"; con ellos el límite no tiene sentido
+    if not all(math.isfinite(x) for x in (saldo, *candidatos)):
+        return jsonify({"error": "Parámetros inválidos"}), 400
+    if len(candidatos) > MAX_CANDIDATOS:
+        return jsonify({"error": f"Máximo {MAX_CANDIDATOS} candidatos"}), 400
 
-    if riesgo == 1:
-        mensaje = generar_mensaje_gpt(
-            saldo=float(data["saldo"]),
-            suscripciones=int(data.get("suscripciones", 0)),
-            esencial=int(data.get("esencial", 1)),
-            nuevo_gasto=float(data["nuevo_gasto"]),
-            historial_pagos=historial_pagos,
+    resumen = EstadisticaService.obtener_resumen(user_id)
+    db.session.commit()
+
+    limite = limite_gasto_seguro(
+        saldo=saldo, suscripciones=suscripciones, esencial=esencial, resumen=resumen,
+    )
+    result = {
+        "limite": limite,
+        "porcentaje": round(limite / saldo * 100, 2) if saldo > 0 else 0,
+    }
+    if candidatos:
+        riesgos = evaluar_gastos(
+            saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+            gastos=candidatos, resumen=resumen,
         )
-        return jsonify({"alerta": True, "mensaje": mensaje})
-    return jsonify({"alerta": False})
+        result["candidatos"] = [
+            {"monto": monto, "alerta": bool(r)} for monto, r in zip(candidatos, riesgos)
+        ]
+    return jsonify(result)
 
 # ---------------------------------------------------------------------
 # Registrar pago (con metadata)
 # ---------------------------------------------------------------------
-@app.post("/api/pago")
+@bp.post("/api/pago")
 def registrar_pago():
     data = request.get_json(force=True)
     user, err = require_auth_user()
@@ -418,7 +562,33 @@ def registrar_pago():
         db.session.rollback()
         return jsonify({"error": "Error al registrar pago", "detail": str(e)}), 500
 
-@app.post("/api/pagar_tarjeta")
+@bp.post("/api/pagos/batch")
+def registrar_pagos_batch():
+    """
+    Registra un lote de movimientos (p. ej. un archivo de liquidación).
+    Body: [ {motivo, monto, tipo, fecha?, categoria?, metodo?, referencia?, notas?}, ... ]
+          o {"pagos": [...]}
+    Los errores por renglón se regresan en "errores" sin abortar el lote.
+    """
+    user, err = require_auth_user()
+    if err:
+        return err
+
+    data = request.get_json(silent=True)
+    movimientos = data.get("pagos") if isinstance(data, dict) else data
+
+    try:
+        result = PaymentService.register_payments_batch(user.idUser, movimientos)
+        db.session.commit()
+        return jsonify({"mensaje": "Lote procesado", **result})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Error al registrar lote", "detail": str(e)}), 500
+
+@bp.post("/api/pagar_tarjeta")
 def pagar_tarjeta():
     user, err = require_auth_user()
     if err:
@@ -445,68 +615,92 @@ def pagar_tarjeta():
 # ---------------------------------------------------------------------
 # Saldo actual (usado por el front)
 # ---------------------------------------------------------------------
-@app.get("/api/saldo")
+@bp.get("/api/saldo")
+@lectura_replica
 def obtener_saldo_sesion():
     user, err = require_auth_user()
     if err:
         return err
+    # La versión se lee siempre de la base (una fila por idx_dinero_user):
+    # otro worker pudo haber cambiado el saldo
     try:
         balance_info = BalanceService.get_balance_info(user.idUser)
-        return jsonify(balance_info)
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
+    etag = BalanceService.etag(user.idUser, balance_info["version"])
+    return no_modificado(etag) or con_etag(jsonify(balance_info), etag)
+
+@bp.get("/api/eventos")
+def eventos_saldo():
+    """
+    Server-Sent Events con los cambios de saldo del usuario de la sesión.
+    Al conectar llega un "saldo" con el estado actual y luego uno por cada
+    movimiento confirmado: {saldo, deuda_credito, version, movimiento}.
+    Con EVENTOS_SSE=0 responde 404 y el cliente consulta /api/saldo.
+    """
+    if not sse_habilitado():
+        return jsonify({"error": "Canal de eventos deshabilitado"}), 404
+    user, err = require_auth_user()
+    if err:
+        return err
+
+    # Suscribir antes de leer el saldo para no perder un cambio intermedio
+    bus = obtener_bus()
+    sus = bus.suscribir(user.idUser)
+    try:
+        info = BalanceService.get_balance_info(user.idUser)
+    except ValueError as e:
+        bus.cancelar(sus)
+        return jsonify({"error": str(e)}), 404
+    inicial = {
+        "saldo": info["saldo"],
+        "deuda_credito": info["deuda_credito"],
+        "version": info["version"],
+        "movimiento": None,
+    }
+    espera = heartbeat()
+
+    def eventos():
+        try:
+            yield sse_event("saldo", inicial)
+            while True:
+                pendientes = sus.esperar(espera)
+                if not pendientes:
+                    yield ": ping\n\n"  # detecta clientes que ya cerraron
+                for ev in pendientes:
+                    yield sse_event("saldo", ev)
+        finally:
+            bus.cancelar(sus)
+
+    return sse_response(eventos())
 
 # ---------------------------------------------------------------------
 # Dashboard + Movimientos (paginado)
 # ---------------------------------------------------------------------
-@app.get("/api/dashboard")
+@bp.get("/api/dashboard")
+@lectura_replica
 def obtener_dashboard_sesion():
     user, err = require_auth_user()
     if err:
         return err
-    return _dashboard_payload(user.idUser)
-
-@app.get("/api/dashboard/<int:user_id>")
-def obtener_dashboard(user_id: int):
-    return _dashboard_payload(user_id)
-
-def _dashboard_payload(user_id: int):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "Usuario no encontrado"}), 404
-
-    dinero = Dinero.query.filter_by(idUser=user_id).first()
-    if not dinero:
+    entrada = DashboardService.snapshot(user.idUser)
+    if entrada is None:
         return jsonify({"error": "No se encontró saldo asociado"}), 404
+    return _dashboard_response(*entrada)
 
-    res = (
-        db.session.query(Historial, Pago)
-        .join(Pago, Historial.idPago == Pago.idPago)
-        .filter(Historial.idDinero == dinero.idDinero)
-        .order_by(Pago.pagoFecha.desc(), Pago.idPago.desc())
-        .limit(10).all()
-    )
-    movimientos = [{
-        "motivo": p.motivo,
-        "monto": float(p.monto),
-        "signo": "-" if (p.tipo or "debito") == "debito" else "+",
-        "fecha": p.pagoFecha.isoformat() if p.pagoFecha else None,
-        "tipo": p.tipo or "debito",
-        "categoria": getattr(p, "categoria", None),
-        "metodo": getattr(p, "metodo", None),
-    } for _, p in res]
-
-    moneda = getattr(dinero, "moneda", None) or "MXN"
+@bp.get("/api/dashboard/<int:user_id>")
+@lectura_replica
+def obtener_dashboard(user_id: int):
+    entrada = DashboardService.snapshot(user_id)
+    if entrada is None:
+        return jsonify({"error": "Usuario no encontrado o sin saldo asociado"}), 404
+    return _dashboard_response(*entrada)
 
-    return jsonify({
-        "usuario": f"{user.nombre} {user.apellido}".strip(),
-        "saldo": float(dinero.saldo),
-        "deuda_credito": float(getattr(dinero, "deuda_credito", 0) or 0),
-        "moneda": moneda,
-        "movimientos": movimientos
-    })
+def _dashboard_response(etag: str, cuerpo: str):
+    return no_modificado(etag) or con_etag(Response(cuerpo, mimetype="application/json"), etag)
 
-@app.get("/api/movimientos")
+@bp.get("/api/movimientos")
+@lectura_replica
 def movimientos_sesion():
     user, err = require_auth_user()
     if err:
@@ -519,16 +713,108 @@ def movimientos_sesion():
     except ValueError:
         return jsonify({"error": "Parámetros inválidos"}), 400
 
-    dinero = BalanceService.get_balance_by_user(user.idUser)
-    if not dinero:
+    if user.idDinero is None:
         return jsonify({"error": "No se encontró saldo asociado"}), 404
 
+    # Modo cursor: ?cursor= (vacío para la primera página) y &total=1 opcional
+    if "cursor" in request.args:
+        try:
+            result = PaymentService.get_payments_by_cursor(
+                user.idDinero,
+                request.args.get("cursor") or None,
+                per_page,
+                tipo if tipo else None,
+                with_total=request.args.get("total") == "1",
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(result)
+
     result = PaymentService.get_payments_by_user(
-        user.idUser, dinero.idDinero, page, per_page, tipo if tipo else None
+        user.idUser, user.idDinero, page, per_page, tipo if tipo else None
     )
     return jsonify(result)
 
-@app.post("/api/transferir")
+@bp.get("/api/movimientos/export")
+@lectura_replica
+def exportar_movimientos():
+    """
+    Estado de cuenta completo en streaming.
+    Query: format=csv|ndjson (default csv), desde/hasta=YYYY-MM-DD, tipo opcional.
+    Con Accept-Encoding: gzip se comprime mientras se envía.
+    """
+    user, err = require_auth_user()
+    if err:
+        return err
+    if user.idDinero is None:
+        return jsonify({"error": "No se encontró saldo asociado"}), 404
+
+    formato = (request.args.get("format") or "csv").strip().lower()
+    if formato not in FORMATOS:
+        return jsonify({"error": "format debe ser csv o ndjson"}), 400
+    try:
+        desde = ExportService.parsear_fecha(request.args.get("desde"), "desde")
+        hasta = ExportService.parsear_fecha(request.args.get("hasta"), "hasta")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tipo = (request.args.get("tipo", "") or "").strip().lower() or None
+
+    # El cuerpo corre después de que la vista regresa: la decisión de la
+    # réplica se vuelve a aplicar dentro del generador
+    replica = db.session.info.get("replica", False)
+    con_gzip = request.accept_encodings["gzip"] > 0
+
+    def cuerpo():
+        db.session.info["replica"] = replica
+        try:
+            trozos = ExportService.generar(
+                formato, ExportService.filas(user.idDinero, desde, hasta, tipo)
+            )
+            yield from (ExportService.gzip(trozos) if con_gzip else trozos)
+        finally:
+            db.session.info.pop("replica", None)
+
+    nombre = f"movimientos-{desde or 'inicio'}-{hasta or 'hoy'}.{formato}"
+    resp = Response(stream_with_context(cuerpo()), mimetype=FORMATOS[formato], headers={
+        "Content-Disposition": f'attachment; filename="{nombre}"',
+        "Cache-Control": "private, no-store",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding",
+    })
+    if con_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+@bp.get("/api/analytics")
+@lectura_replica
+def analytics():
+    """
+    Gasto por mes (o por día) y por categoría desde los acumulados.
+    Query: desde/hasta=YYYY-MM o YYYY-MM-DD (default: últimos 12 meses),
+           periodo=mensual|diario (diario: máximo MAX_DIAS días).
+    """
+    user, err = require_auth_user()
+    if err:
+        return err
+
+    periodo = (request.args.get("periodo") or "mensual").strip().lower()
+    if periodo not in ("mensual", "diario"):
+        return jsonify({"error": "periodo debe ser mensual o diario"}), 400
+    try:
+        desde = AnaliticaService.parsear_periodo(request.args.get("desde"), "desde")
+        hasta = AnaliticaService.parsear_periodo(request.args.get("hasta"), "hasta", fin=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    default_desde, default_hasta = AnaliticaService.rango_por_defecto()
+    desde, hasta = desde or default_desde, hasta or default_hasta
+    if desde > hasta:
+        return jsonify({"error": "desde debe ser anterior a hasta"}), 400
+    if periodo == "diario" and (hasta - desde).days >= MAX_DIAS:
+        return jsonify({"error": f"Máximo {MAX_DIAS} días con periodo=diario"}), 400
+
+    return jsonify(AnaliticaService.resumen(user.idUser, desde, hasta, diario=periodo == "diario"))
+
+@bp.post("/api/transferir")
 def transferir():
     user, err = require_auth_user()
     if err:
@@ -582,10 +868,13 @@ def transferir():
 from werkzeug.exceptions import HTTPException
 from sqlalchemy.exc import IntegrityError, OperationalError
 
-@app.errorhandler(Exception)
+@bp.app_errorhandler(Exception)
 def handle_any_error(e):
     if isinstance(e, HTTPException):
         return jsonify({"error": e.description, "status": e.code}), e.code
+    # Se responde en JSON, pero queda en el log y en /metrics
+    current_app.logger.exception("Error no controlado en %s %s", request.method, request.path)
+    instrumentacion.registrar_error(e)
     # Excepciones de base de datos
     if isinstance(e, (IntegrityError, OperationalError)):
         try:
@@ -600,6 +889,12 @@ def handle_any_error(e):
 # ---------------------------------------------------------------------
 # Run
 # ---------------------------------------------------------------------
+app = create_app()
+
 if __name__ == "__main__":
+    # En desarrollo se prepara el esquema antes de levantar el servidor;
+    # los workers de producción (gunicorn app:app) no corren DDL.
+    from bootstrap import bootstrap
+    bootstrap(app)
     port = int(os.getenv("PORT", "5000"))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,286 @@
+# benchmarks/carga.py
+"""
+Carga HTTP de punta a punta: reproduce una mezcla ponderada de rutas y
+reporta throughput y latencias p50/p95/p99 por ruta en JSON.
+
+    # En proceso (sin servidor): SQLite temporal con dataset sintético
+    python -m benchmarks.carga --usuarios 200 --pagos 100 --duracion 30 --hilos 8 --salida run.json
+
+    # Contra un servidor levantado, con un dataset de benchmarks.dataset
+    python -m benchmarks.carga --url http://127.0.0.1:5000 --usuarios 1000 --duracion 60
+
+    # Comparar con una corrida anterior: sale con 1 si alguna ruta empeoró
+    python -m benchmarks.carga --comparar base.json --tolerancia 0.2 ...
+
+La mezcla se ajusta con --mezcla login=2,dashboard=30,... En proceso se
+quita OPENAI_API_KEY para que /api/evaluar use el mensaje local (--gpt lo
+conserva).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+MEZCLA = {
+    "login": 2,
+    "dashboard": 30,
+    "movimientos": 25,
+    "pago": 15,
+    "transferir": 5,
+    "evaluar": 23,
+}
+
+
+class ClienteHTTP:
+    """Sesión de requests contra un servidor real (guarda la cookie)."""
+
+    def __init__(self, url: str):
+        import requests
+        self.url = url.rstrip("/")
+        self._s = requests.Session()
+
+    def get(self, ruta: str) -> int:
+        return self._s.get(self.url + ruta, timeout=30).status_code
+
+    def post(self, ruta: str, cuerpo: dict) -> int:
+        return self._s.post(self.url + ruta, json=cuerpo, timeout=30).status_code
+
+
+class ClienteLocal:
+    """Test client de Flask: la app completa sin sockets."""
+
+    def __init__(self, app):
+        self._c = app.test_client()
+
+    def get(self, ruta: str) -> int:
+        return self._c.get(ruta).status_code
+
+    def post(self, ruta: str, cuerpo: dict) -> int:
+        return self._c.post(ruta, json=cuerpo).status_code
+
+
+class Usuario:
+    def __init__(self, cliente, rnd: random.Random, n_usuarios: int, prefijo: str):
+        self.cliente = cliente
+        self.rnd = rnd
+        self.n_usuarios = n_usuarios
+        self.prefijo = prefijo
+
+    def login(self) -> int:
+        from benchmarks.dataset import CLAVE, correo
+        i = self.rnd.randrange(self.n_usuarios)
+        return self.cliente.post("/api/login", {"correo": correo(self.prefijo, i), "contrasena": CLAVE})
+
+    def dashboard(self) -> int:
+        return self.cliente.get("/api/dashboard")
+
+    def movimientos(self) -> int:
+        if self.rnd.random() < 0.5:
+            return self.cliente.get("/api/movimientos?cursor=&per_page=10")
+        return self.cliente.get(f"/api/movimientos?page={self.rnd.randint(1, 5)}&per_page=10")
+
+    def pago(self) -> int:
+        return self.cliente.post("/api/pago", {
+            "motivo": self.rnd.choice(["Café", "Super", "Uber", "Cine"]),
+            "monto": round(self.rnd.uniform(20, 400), 2),
+            "tipo": "credito" if self.rnd.random() < 0.2 else "debito",
+            "categoria": "bench",
+        })
+
+    def transferir(self) -> int:
+        return self.cliente.post("/api/transferir", {
+            "clabe": "".join(self.rnd.choice("0123456789") for _ in range(18)),
+            "monto": round(self.rnd.uniform(100, 1500), 2),
+            "concepto": "bench",
+        })
+
+    def evaluar(self) -> int:
+        return self.cliente.post("/api/evaluar", {
+            "saldo": round(self.rnd.uniform(1000, 50_000), 2),
+            "suscripciones": self.rnd.randint(0, 6),
+            "esencial": self.rnd.randint(0, 1),
+            "nuevo_gasto": round(self.rnd.uniform(50, 20_000), 2),
+        })
+
+
+def percentil(ordenados: list, q: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def resumir(muestras: dict, errores: dict, segundos: float) -> dict:
+    rutas = {}
+    for ruta, tiempos in sorted(muestras.items()):
+        tiempos.sort()
+        rutas[ruta] = {
+            "peticiones": len(tiempos),
+            "errores": errores.get(ruta, 0),
+            "rps": round(len(tiempos) / segundos, 2),
+            "p50_ms": round(percentil(tiempos, 0.50), 3),
+            "p95_ms": round(percentil(tiempos, 0.95), 3),
+            "p99_ms": round(percentil(tiempos, 0.99), 3),
+            "max_ms": round(tiempos[-1], 3) if tiempos else 0.0,
+        }
+    total = sum(r["peticiones"] for r in rutas.values())
+    return {
+        "total": {
+            "peticiones": total,
+            "errores": sum(r["errores"] for r in rutas.values()),
+            "rps": round(total / segundos, 2),
+        },
+        "rutas": rutas,
+    }
+
+
+def correr(fabrica_cliente, mezcla: dict, n_usuarios: int, hilos: int, duracion: float,
+           prefijo: str = "bench", semilla: int = 11) -> dict:
+    """Corre ``hilos`` usuarios virtuales durante ``duracion`` segundos."""
+    rutas = list(mezcla)
+    pesos = [mezcla[r] for r in rutas]
+    muestras = {r: [] for r in rutas}
+    errores = {}
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def trabajador(n: int) -> None:
+        rnd = random.Random(semilla + n)
+        usuario = Usuario(fabrica_cliente(), rnd, n_usuarios, prefijo)
+        usuario.login()
+        propias = {r: [] for r in rutas}
+        fallidas = {}
+        while time.perf_counter() < fin:
+            ruta = rnd.choices(rutas, weights=pesos)[0]
+            t0 = time.perf_counter()
+            try:
+                status = getattr(usuario, ruta)()
+            except Exception:
+                status = 599
+            propias[ruta].append((time.perf_counter() - t0) * 1000)
+            if status >= 400:
+                fallidas[ruta] = fallidas.get(ruta, 0) + 1
+        with lock:
+            for r in rutas:
+                muestras[r].extend(propias[r])
+            for r, n_err in fallidas.items():
+                errores[r] = errores.get(r, 0) + n_err
+
+    inicio = time.perf_counter()
+    hilos_ = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    for h in hilos_:
+        h.start()
+    for h in hilos_:
+        h.join()
+    return resumir(muestras, errores, time.perf_counter() - inicio)
+
+
+def comparar(actual: dict, base: dict, tolerancia: float, piso_ms: float = 1.0) -> list:
+    """Rutas cuyo p95 o throughput empeoró más que ``tolerancia`` frente a ``base``."""
+    regresiones = []
+    for ruta, a in actual["rutas"].items():
+        b = base.get("rutas", {}).get(ruta)
+        if not b or not a["peticiones"]:
+            continue
+        if a["p95_ms"] > b["p95_ms"] * (1 + tolerancia) and a["p95_ms"] - b["p95_ms"] > piso_ms:
+            regresiones.append({"ruta": ruta, "metrica": "p95_ms", "base": b["p95_ms"], "actual": a["p95_ms"]})
+        if a["rps"] < b["rps"] * (1 - tolerancia):
+            regresiones.append({"ruta": ruta, "metrica": "rps", "base": b["rps"], "actual": a["rps"]})
+    return regresiones
+
+
+def parsear_mezcla(texto: str) -> dict:
+    mezcla = dict(MEZCLA)
+    for parte in filter(None, (texto or "").split(",")):
+        ruta, _, peso = parte.partition("=")
+        if ruta not in MEZCLA:
+            raise SystemExit(f"Ruta desconocida en --mezcla: {ruta}")
+        mezcla[ruta] = float(peso)
+    return {r: p for r, p in mezcla.items() if p > 0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="servidor a probar; sin --url corre en proceso")
+    parser.add_argument("--db", default=None, help="en proceso: URI (default SQLite temporal)")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--pagos", type=int, default=100, help="en proceso: pagos por usuario")
+    parser.add_argument("--prefijo", default="bench")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=20, help="segundos")
+    parser.add_argument("--mezcla", default="", help="p. ej. login=5,evaluar=0")
+    parser.add_argument("--gpt", action="store_true", help="en proceso: no quitar OPENAI_API_KEY")
+    parser.add_argument("--salida", default=None, help="archivo JSON (default: stdout)")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida base")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    mezcla = parsear_mezcla(args.mezcla)
+    meta = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "modo": "http" if args.url else "en_proceso",
+        "url": args.url,
+        "hilos": args.hilos,
+        "duracion_s": args.duracion,
+        "usuarios": args.usuarios,
+        "mezcla": mezcla,
+        "python": platform.python_version(),
+    }
+
+    if args.url:
+        resultado = correr(lambda: ClienteHTTP(args.url), mezcla, args.usuarios, args.hilos,
+                           args.duracion, prefijo=args.prefijo)
+    else:
+        from app import create_app
+        from models import db
+        from benchmarks.dataset import generar
+
+        if not args.gpt:
+            os.environ.pop("OPENAI_API_KEY", None)
+        tmp = tempfile.TemporaryDirectory()
+        uri = args.db or f"sqlite:///{os.path.join(tmp.name, 'carga.db')}"
+        config = {"SQLALCHEMY_DATABASE_URI": uri}
+        if uri.startswith("sqlite"):
+            config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+        app = create_app(config)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            meta["dataset"] = generar(args.usuarios, args.pagos, prefijo=args.prefijo)
+            db.session.remove()
+        meta["db"] = app.config["SQLALCHEMY_DATABASE_URI"].split("@")[-1]
+        resultado = correr(lambda: ClienteLocal(app), mezcla, args.usuarios, args.hilos,
+                           args.duracion, prefijo=args.prefijo)
+
+    reporte = {"meta": meta, **resultado}
+    if args.comparar:
+        with open(args.comparar) as f:
+            reporte["regresiones"] = comparar(resultado, json.load(f), args.tolerancia)
+
+    for ruta, r in reporte["rutas"].items():
+        print(
+            f"{ruta:>12} | {r['peticiones']:>7} pet | {r['rps']:>8} rps | p50 {r['p50_ms']:>8} ms"
+            f" | p95 {r['p95_ms']:>8} ms | p99 {r['p99_ms']:>8} ms | err {r['errores']}",
+            file=sys.stderr,
+        )
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if reporte.get("regresiones"):
+        for reg in reporte["regresiones"]:
+            print(f"REGRESIÓN {reg['ruta']} {reg['metrica']}: {reg['base']} -> {reg['actual']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# bootstrap.py
+"""
+Creación de la base de datos, migraciones, normalización de contraseñas y
+semilla. Se corre de forma explícita (una vez por despliegue), nunca al
+importar la app:
+
+    flask --app app bootstrap
+    python bootstrap.py
+
+Funciona con MySQL y con SQLite (DATABASE_URL=sqlite:///archivo.db): las
+columnas de COLUMNAS_MIGRADAS sólo existen en esquemas MySQL anteriores, en
+otros motores create_all ya crea el esquema completo.
+"""
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from models import db
+from models.user import User
+from models.pago import Pago
+from models.historial import Historial
+from models.dinero import Dinero
+from models.gasto_periodo import GastoMensual
+from services.mantenimiento_service import LOTE_DEFAULT, MantenimientoService
+
+# Índices de Pago que create_all no agrega a una tabla que ya existe
+INDICES_MIGRADOS = ["ix_pagos_dinero_fecha", "ix_pagos_dinero_tipo_fecha"]
+
+# (tabla, columna, DDL) que versiones anteriores del esquema no tenían
+COLUMNAS_MIGRADAS = [
+    # pagos.tipo y dinero.deuda_credito
+    (Pago.__table__.name, "tipo", "`tipo` VARCHAR(10) NOT NULL DEFAULT 'debito'"),
+    (Dinero.__table__.name, "deuda_credito", "`deuda_credito` DECIMAL(12,2) NOT NULL DEFAULT 0"),
+
+    # users: created/updated y last_login_at
+    (User.__table__.name, "created_at", "`created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+    (User.__table__.name, "updated_at", "`updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    (User.__table__.name, "last_login_at", "`last_login_at` DATETIME NULL"),
+
+    # pagos: metadata + auditoría
+    (Pago.__table__.name, "categoria", "`categoria` VARCHAR(60) NULL"),
+    (Pago.__table__.name, "metodo", "`metodo` VARCHAR(20) NULL"),
+    (Pago.__table__.name, "referencia", "`referencia` VARCHAR(80) NULL"),
+    (Pago.__table__.name, "notas", "`notas` TEXT NULL"),
+    (Pago.__table__.name, "created_at", "`created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+    (Pago.__table__.name, "updated_at", "`updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    (Pago.__table__.name, "idDinero", "`idDinero` INT NULL"),
+
+    # dinero: moneda + auditoría
+    (Dinero.__table__.name, "moneda", "`moneda` VARCHAR(3) NOT NULL DEFAULT 'MXN'"),
+    (Dinero.__table__.name, "created_at", "`created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+    (Dinero.__table__.name, "updated_at", "`updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    (Dinero.__table__.name, "version", "`version` BIGINT NOT NULL DEFAULT 1"),
+
+    # historial: auditoría
+    (Historial.__table__.name, "created_at", "`created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+]
+
+
+def crear_base_de_datos(uri: str) -> None:
+    """
+    MySQL: CREATE DATABASE IF NOT EXISTS con una conexión sin esquema.
+    SQLite crea el archivo al conectar, así que no hay nada que hacer.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() != "mysql":
+        return
+    engine = create_engine(url.set(database=None))
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE DATABASE IF NOT EXISTS `{url.database}` "
+                "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+            ))
+    finally:
+        engine.dispose()
+
+
+def columnas_existentes() -> set:
+    """Todas las (tabla, columna) del esquema MySQL en una sola consulta."""
+    rows = db.session.execute(text("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)).all()
+    return {(tbl, col) for tbl, col in rows}
+
+
+def migrar() -> int:
+    """Crea tablas nuevas y agrega las columnas faltantes. Regresa cuántas."""
+    # Sólo el primario; la réplica recibe el esquema por replicación
+    db.create_all(bind_key=None)
+
+    # Esquemas anteriores sólo existieron en MySQL
+    if db.engine.dialect.name != "mysql":
+        return 0
+
+    existentes = columnas_existentes()
+    agregadas = 0
+    for tabla, columna, ddl in COLUMNAS_MIGRADAS:
+        if (tabla, columna) not in existentes:
+            db.session.execute(text(f"ALTER TABLE `{tabla}` ADD COLUMN {ddl}"))
+            agregadas += 1
+
+    # índice (si MySQL < 8.* ignora si falla)
+    try:
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_pagos_user_fecha ON `{Pago.__table__.name}` (idUser, pagoFecha)"
+        ))
+    except Exception:
+        db.session.rollback()
+    db.session.commit()
+
+    indices = {nombre for (nombre,) in db.session.execute(text("""
+        SELECT DISTINCT INDEX_NAME FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla
+    """), {"tabla": Pago.__table__.name})}
+    for indice in Pago.__table__.indexes:
+        if indice.name in INDICES_MIGRADOS and indice.name not in indices:
+            indice.create(db.session.connection())
+    db.session.commit()
+    return agregadas
+
+
+def reportar_progreso(p: dict) -> None:
+    print(
+        f"[{p['trabajo']}] lote {p['lotes']}: {p['revisados']} revisados, "
+        f"{p['actualizados']} actualizados, ultimo_id={p['ultimo_id']} "
+        f"({p['filas_por_segundo']} filas/s)"
+    )
+
+
+def normalizar_contrasenas(lote: int = LOTE_DEFAULT, procesos: int = None,
+                           desde_id: int = 0) -> int:
+    """Normaliza contraseñas antiguas (plano -> hash) por lotes."""
+    return MantenimientoService.rehash_contrasenas(
+        lote=lote, procesos=procesos, desde_id=desde_id, reportar=reportar_progreso
+    )["actualizados"]
+
+
+def copiar_dinero_a_pagos(lote: int = LOTE_DEFAULT, desde_id: int = 0) -> int:
+    """Backfill de pagos.idDinero desde historial (por lotes de idPago)."""
+    return MantenimientoService.copiar_dinero_a_pagos(
+        lote=lote, desde_id=desde_id, reportar=reportar_progreso
+    )["actualizados"]
+
+
+def reconstruir_gastos(lote: int = LOTE_DEFAULT, desde_id: int = 0) -> int:
+    """Recalcula los acumulados de gasto por categoría (pandas, por lotes de usuarios)."""
+    return MantenimientoService.reconstruir_gastos(
+        lote=lote, desde_id=desde_id, reportar=reportar_progreso
+    )["actualizados"]
+
+
+def sembrar() -> bool:
+    """Semilla mínima (si DB vacía)."""
+    if User.query.first():
+        return False
+
+    usuario = User(
+        nombre="Carlos",
+        apellido="Ramírez",
+        correo="carlos@example.com",
+        contrasena="",
+        biometricos="bio1",
+        numeroTelefono="5551234567",
+    )
+    usuario.set_password("1234")
+    db.session.add(usuario)
+    db.session.flush()
+
+    saldo = Dinero(saldo=4200.00, deuda_credito=1200.00, idUser=usuario.idUser)
+    db.session.add(saldo)
+    db.session.flush()
+
+    cuenta = dict(idUser=usuario.idUser, idDinero=saldo.idDinero, pagoFecha=date.today())
+    p1 = Pago(**cuenta, motivo="Netflix",    monto=250.00,  tipo="credito", categoria="entretenimiento")
+    p2 = Pago(**cuenta, motivo="Super",      monto=800.00,  tipo="debito",  categoria="hogar")
+    p3 = Pago(**cuenta, motivo="Transporte", monto=120.50,  tipo="debito",  categoria="movilidad")
+    db.session.add_all([p1, p2, p3]); db.session.flush()
+    for p in (p1, p2, p3):
+        db.session.add(Historial(idDinero=saldo.idDinero, idPago=p.idPago))
+    db.session.commit()
+    return True
+
+
+def crear_saldos_faltantes(lote: int = LOTE_DEFAULT, desde_id: int = 0) -> int:
+    """Verificar usuarios sin saldo y crearles uno (INSERT ... SELECT por lotes)."""
+    return MantenimientoService.crear_saldos_faltantes(
+        lote=lote, desde_id=desde_id, reportar=reportar_progreso
+    )["actualizados"]
+
+
+def bootstrap(app, crear_db: bool = True) -> None:
+    if crear_db:
+        crear_base_de_datos(app.config["SQLALCHEMY_DATABASE_URI"])
+
+    with app.app_context():
+        agregadas = migrar()
+        if agregadas:
+            print(f"[migracion] Columnas agregadas: {agregadas}")
+
+        # Antes de copiar idDinero: los pagos sin historial toman el saldo del usuario
+        creados = crear_saldos_faltantes()
+        if creados:
+            print(f"[migracion] Se creó saldo para {creados} usuario(s) sin registro de saldo")
+
+        copiados = copiar_dinero_a_pagos()
+        if copiados:
+            print(f"[migracion] idDinero copiado a {copiados} pago(s)")
+
+        changed = normalizar_contrasenas()
+        if changed:
+            print(f"[migracion] Contraseñas convertidas a hash: {changed}")
+
+        if sembrar():
+            print("[migracion] Usuario de prueba creado")
+
+        # Tablas de acumulados recién creadas sobre pagos existentes
+        if GastoMensual.query.first() is None and Pago.query.first() is not None:
+            filas = reconstruir_gastos()
+            print(f"[migracion] Acumulados de gasto reconstruidos: {filas} fila(s)")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    bootstrap(create_app())
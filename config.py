@@ -7,14 +7,35 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "127.0.0.1")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_DB   = os.getenv("MYSQL_DB", "bancodigital")
 
-if MYSQL_PASS:
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
-    )
-else:
+
+def mysql_uri(host: str, port: str) -> str:
+    if MYSQL_PASS:
+        return f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{host}:{port}/{MYSQL_DB}?charset=utf8mb4"
     # sin contraseña -> NO pongas ':'
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql+pymysql://{MYSQL_USER}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
-    )
+    return f"mysql+pymysql://{MYSQL_USER}@{host}:{port}/{MYSQL_DB}?charset=utf8mb4"
+
+
+# DATABASE_URL reemplaza la URI de MySQL: sqlite:///archivo.db o sqlite://
+# (en memoria) corren la app completa sin servidor, p. ej. pruebas y benchmarks
+SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or mysql_uri(MYSQL_HOST, MYSQL_PORT)
+
+# Réplica de sólo lectura (opcional): mismas credenciales y base, otro host
+MYSQL_REPLICA_HOST = os.getenv("MYSQL_REPLICA_HOST")
+MYSQL_REPLICA_PORT = os.getenv("MYSQL_REPLICA_PORT", MYSQL_PORT)
+SQLALCHEMY_REPLICA_URI = os.getenv("DATABASE_REPLICA_URL") or (
+    mysql_uri(MYSQL_REPLICA_HOST, MYSQL_REPLICA_PORT) if MYSQL_REPLICA_HOST else None
+)
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Pool de conexiones (sólo MySQL; SQLite usa los defaults de Flask-SQLAlchemy).
+# pool_pre_ping descarta conexiones que MySQL cerró por wait_timeout y
+# pool_recycle las renueva antes de que eso pase.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": bool(int(os.getenv("DB_POOL_PRE_PING", "1"))),
+    "pool_use_lifo": bool(int(os.getenv("DB_POOL_LIFO", "0"))),
+}
@@ -0,0 +1,277 @@
+# instrumentacion.py
+"""
+Instrumentación por petición: número de sentencias SQL y tiempo en la base
+(eventos del engine), tiempo total del handler y tiempo esperando a GPT.
+
+Cada respuesta lleva un header Server-Timing, p. ej.
+
+    Server-Timing: app;dur=18.2, db;dur=4.1;desc="3 consultas", gpt;dur=9.7
+
+y los mismos valores se acumulan por ruta en histogramas que /metrics
+expone en el formato de texto de Prometheus (por proceso: cada worker se
+raspa por separado).
+
+Perfilado opcional: con PROFILE_SAMPLE_RATE (0-1) esa fracción de
+peticiones corre bajo cProfile y deja un .prof en PROFILE_DIR; el nombre
+del archivo llega en el header X-Profile. Sólo cubre el hilo del handler.
+"""
+from __future__ import annotations
+import cProfile
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import request
+from sqlalchemy import event
+
+CUBETAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Medicion:
+    __slots__ = ("inicio", "consultas", "errores_sql", "db_s", "gpt_s", "perfil")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.errores_sql = 0
+        self.db_s = 0.0
+        self.gpt_s = 0.0
+        self.perfil = None
+
+
+_actual: ContextVar[Optional[Medicion]] = ContextVar("medicion", default=None)
+
+
+def medicion_actual() -> Optional[Medicion]:
+    return _actual.get()
+
+
+@contextmanager
+def medir_gpt():
+    """Suma al tiempo GPT de la petición en curso (si hay una)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        m = _actual.get()
+        if m is not None:
+            m.gpt_s += time.perf_counter() - t0
+
+
+# ---------------------------------------------------------------------
+# Métricas en formato Prometheus
+# ---------------------------------------------------------------------
+def _etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    partes = [
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(nombres, valores)
+    ]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(v: float) -> str:
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores: dict = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, cantidad: float = 1) -> None:
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def render(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for valores, total in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(total)}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, cubetas: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.cubetas = cubetas
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores) -> None:
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * len(self.cubetas), 0.0, 0]
+            for i, limite in enumerate(self.cubetas):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def render(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for valores, (conteos, suma, total) in sorted(self._series.items()):
+                for limite, n in zip(self.cubetas, conteos):
+                    le = f'le="{_numero(limite)}"'
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {n}")
+                inf = _etiquetas(self.etiquetas, valores, 'le="+Inf"')
+                lineas.append(f"{self.nombre}_bucket{inf} {total}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(round(suma, 6))}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+DURACION = Histograma(
+    "http_request_duration_seconds", "Tiempo total del handler.",
+    ("ruta", "metodo", "status"), CUBETAS_SEGUNDOS,
+)
+DB_SEGUNDOS = Histograma(
+    "http_request_db_seconds", "Tiempo en la base de datos por petición.", ("ruta",), CUBETAS_SEGUNDOS,
+)
+DB_CONSULTAS = Histograma(
+    "http_request_db_statements", "Sentencias SQL por petición.", ("ruta",), CUBETAS_CONSULTAS,
+)
+GPT_SEGUNDOS = Histograma(
+    "http_request_gpt_seconds", "Tiempo esperando a GPT por petición (sólo si se llamó).",
+    ("ruta",), CUBETAS_SEGUNDOS,
+)
+DB_ERRORES = Contador(
+    "http_request_db_errors_total", "Sentencias SQL que fallaron durante la petición.", ("ruta",),
+)
+ERRORES = Contador(
+    "http_request_errors_total", "Excepciones no controladas convertidas en respuesta JSON.",
+    ("ruta", "tipo"),
+)
+METRICAS = (DURACION, DB_SEGUNDOS, DB_CONSULTAS, DB_ERRORES, GPT_SEGUNDOS, ERRORES)
+
+
+def render_prometheus() -> str:
+    lineas = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.render())
+    return "\n".join(lineas) + "\n"
+
+
+def ruta_actual() -> str:
+    """Plantilla de la ruta (cardinalidad acotada), no la URL concreta."""
+    return request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+
+
+# ---------------------------------------------------------------------
+# Engine (SQL) y Flask (petición)
+# ---------------------------------------------------------------------
+def instalar_engine(engine) -> None:
+    if getattr(engine, "_instrumentado", False):
+        return
+
+    # El inicio va en el contexto de la sentencia, no en la conexión: si la
+    # sentencia falla no hay after_cursor_execute y nada queda colgado del pool
+    def _registrar(context, fallo: bool = False) -> None:
+        inicio = getattr(context, "_inicio_sql", None)
+        if inicio is None:
+            return
+        context._inicio_sql = None
+        m = _actual.get()
+        if m is not None:
+            m.consultas += 1
+            m.errores_sql += fallo
+            m.db_s += time.perf_counter() - inicio
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._inicio_sql = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        _registrar(context)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto_error):
+        # Las sentencias que fallan también cuentan para la petición
+        _registrar(contexto_error.execution_context, fallo=True)
+
+    engine._instrumentado = True
+
+
+def _tasa_perfilado() -> float:
+    return float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+
+def _iniciar() -> None:
+    m = Medicion()
+    tasa = _tasa_perfilado()
+    if tasa > 0 and random.random() < tasa:
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+            m.perfil = perfil
+        except ValueError:
+            pass  # ya hay otro perfilador activo en este hilo
+    _actual.set(m)
+
+
+def _guardar_perfil(perfil: cProfile.Profile, ruta: str) -> str:
+    perfil.disable()
+    carpeta = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "perfiles")
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"{time.time_ns()}-{re.sub(r'[^A-Za-z0-9]+', '_', ruta).strip('_') or 'raiz'}.prof"
+    perfil.dump_stats(os.path.join(carpeta, nombre))
+    return nombre
+
+
+def _terminar(resp):
+    m = _actual.get()
+    if m is None:
+        return resp
+    total = time.perf_counter() - m.inicio
+    ruta = ruta_actual()
+
+    DURACION.observar(total, ruta, request.method, str(resp.status_code))
+    DB_SEGUNDOS.observar(m.db_s, ruta)
+    DB_CONSULTAS.observar(m.consultas, ruta)
+    if m.errores_sql:
+        DB_ERRORES.incrementar(ruta, cantidad=m.errores_sql)
+    timing = [f"app;dur={total * 1000:.1f}", f'db;dur={m.db_s * 1000:.1f};desc="{m.consultas} consultas"']
+    if m.gpt_s:
+        GPT_SEGUNDOS.observar(m.gpt_s, ruta)
+        timing.append(f"gpt;dur={m.gpt_s * 1000:.1f}")
+    resp.headers["Server-Timing"] = ", ".join(timing)
+
+    if m.perfil is not None:
+        resp.headers["X-Profile"] = _guardar_perfil(m.perfil, ruta)
+        m.perfil = None
+    return resp
+
+
+def _limpiar(exc) -> None:
+    m = _actual.get()
+    if m is not None and m.perfil is not None:
+        m.perfil.disable()
+    _actual.set(None)
+
+
+def registrar_error(exc: Exception) -> None:
+    ERRORES.incrementar(ruta_actual(), exc.__class__.__name__)
+
+
+def instalar(app) -> None:
+    """Hooks de petición en ``app``; los engines se instrumentan aparte."""
+    app.before_request(_iniciar)
+    app.after_request(_terminar)
+    app.teardown_request(_limpiar)
@@ -0,0 +1,164 @@
+# ml/cache.py
+from __future__ import annotations
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from ml.model import cubeta_monto
+
+
+def clave_mensaje(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    nuevo_gasto: float,
+    resumen: dict
+) -> str:
+    """
+    Llave normalizada: saldo y gasto en cubetas del 5%, suscripciones,
+    esencial y un hash corto del resumen del historial.
+    """
+    conteo = resumen["conteo"]
+    promedio = resumen["suma"] / conteo if conteo else 0
+    motivos = [p.get("motivo") or "" for p in resumen["ultimos"][-3:]] if conteo >= 3 else []
+    historial = f"{conteo}|{round(promedio)}|{round(resumen['suma'])}|{'/'.join(motivos)}"
+    h = hashlib.sha1(historial.encode()).hexdigest()[:12]
+    return (f"gpt:{_cubeta(saldo)}:{int(suscripciones)}:{int(bool(esencial))}:"
+            f"{_cubeta(nuevo_gasto)}:{h}")
+
+
+def _cubeta(monto: float):
+    # inf haría OverflowError en log() y nan ValueError en floor(): van tal cual
+    if not math.isfinite(monto):
+        return str(monto)
+    return cubeta_monto(monto) if monto > 0 else "0"
+
+
+class LRUTTLCache:
+    """LRU acotado con expiración por entrada; seguro entre hilos."""
+
+    def __init__(self, max_items: int = 1024, ttl: float = 300):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            valor, expira = item
+            if expira < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return valor
+
+    def set(self, key: str, valor: str, ttl: float = None) -> None:
+        with self._lock:
+            self._data[key] = (valor, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """Backend compartido entre workers (requiere el paquete ``redis``)."""
+
+    def __init__(self, url: str, ttl: float = 300):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("GPT_CACHE_URL requiere instalar 'redis'") from e
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str):
+        return self._client.get(key)
+
+    def set(self, key: str, valor: str, ttl: float = None) -> None:
+        self._client.set(key, valor, ex=int(ttl or self.ttl))
+
+    def clear(self) -> None:
+        pass
+
+
+class MensajeCache:
+    """
+    Caché de mensajes generados: LRU local por proceso y, opcionalmente,
+    un backend compartido detrás. Lleva contadores de aciertos y fallos.
+    """
+
+    def __init__(self, local: LRUTTLCache, compartido=None):
+        self.local = local
+        self.compartido = compartido
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _contar(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        valor = self.local.get(key)
+        if valor is None and self.compartido is not None:
+            try:
+                valor = self.compartido.get(key)
+            except Exception:
+                valor = None
+            if valor is not None:
+                self.local.set(key, valor)
+        self._contar(valor is not None)
+        return valor
+
+    def set(self, key: str, valor: str) -> None:
+        self.local.set(key, valor)
+        if self.compartido is not None:
+            try:
+                self.compartido.set(key, valor)
+            except Exception:
+                pass
+
+    def clear(self) -> None:
+        self.local.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self.local),
+            "max_items": self.local.max_items,
+            "ttl": self.local.ttl,
+            "shared": self.compartido is not None,
+        }
+
+
+def crear_cache_desde_env() -> MensajeCache:
+    ttl = float(os.getenv("GPT_CACHE_TTL", "300"))
+    local = LRUTTLCache(max_items=int(os.getenv("GPT_CACHE_MAX", "1024")), ttl=ttl)
+    url = os.getenv("GPT_CACHE_URL")
+    return MensajeCache(local, RedisBackend(url, ttl) if url else None)
@@ -0,0 +1,103 @@
+# ml/circuito.py
+from __future__ import annotations
+import os
+import threading
+import time
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMI_ABIERTO = "semi_abierto"
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas remotas tras ``umbral_fallos`` fallos o timeouts
+    seguidos y las vuelve a intentar (una de prueba) después de
+    ``enfriamiento`` segundos. Seguro entre hilos.
+    """
+
+    def __init__(self, umbral_fallos: int = 5, enfriamiento: float = 30):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos_seguidos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self.exitos = 0
+        self.fallos = 0
+        self.timeouts = 0
+        self.rechazadas = 0
+        self.aperturas = 0
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self._estado == ABIERTO:
+                if time.monotonic() - self._abierto_desde < self.enfriamiento:
+                    self.rechazadas += 1
+                    return False
+                self._estado = SEMI_ABIERTO
+                self._prueba_en_curso = False
+            if self._estado == SEMI_ABIERTO:
+                # Sólo una llamada de prueba a la vez
+                if self._prueba_en_curso:
+                    self.rechazadas += 1
+                    return False
+                self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self.exitos += 1
+            self._fallos_seguidos = 0
+            self._estado = CERRADO
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.fallos += 1
+            self._fallos_seguidos += 1
+            if self._estado == SEMI_ABIERTO or self._fallos_seguidos >= self.umbral_fallos:
+                if self._estado != ABIERTO:
+                    self.aperturas += 1
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+    def cancelar_prueba(self) -> None:
+        """La llamada permitida se abandonó sin resultado (p. ej. el cliente se fue)."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._estado = CERRADO
+            self._fallos_seguidos = 0
+            self._prueba_en_curso = False
+            self.exitos = self.fallos = self.timeouts = self.rechazadas = self.aperturas = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            reabre_en = 0.0
+            if self._estado == ABIERTO:
+                reabre_en = max(0.0, self.enfriamiento - (time.monotonic() - self._abierto_desde))
+            return {
+                "estado": self._estado,
+                "fallos_seguidos": self._fallos_seguidos,
+                "exitos": self.exitos,
+                "fallos": self.fallos,
+                "timeouts": self.timeouts,
+                "rechazadas": self.rechazadas,
+                "aperturas": self.aperturas,
+                "reintento_en": round(reabre_en, 2),
+            }
+
+
+def crear_breaker_desde_env() -> CircuitBreaker:
+    return CircuitBreaker(
+        umbral_fallos=int(os.getenv("GPT_CB_FALLOS", "5")),
+        enfriamiento=float(os.getenv("GPT_CB_ENFRIAMIENTO", "30")),
+    )
@@ -0,0 +1,100 @@
+# ml/cliente_openai.py
+"""
+Cliente de OpenAI compartido por todo el proceso.
+
+Crear ``OpenAI()`` en cada petición repite el handshake TLS y el pool de
+conexiones. Aquí se crea una sola vez (por proceso, también después de un
+fork) con keep-alive y timeouts explícitos. El cliente asíncrono vive en un
+event loop propio en un hilo de fondo, así cualquier código (con o sin
+event loop) puede esperar una respuesta, con un plazo máximo, sin amarrar
+su propio loop al pool.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+import httpx
+
+_lock = threading.Lock()
+_pid = None
+_cliente_async = None
+_loop = None
+
+
+# La configuración se lee al crear el cliente (después de load_dotenv)
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("OPENAI_TIMEOUT", "15")),
+        connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "3")),
+    )
+
+
+def _limits() -> httpx.Limits:
+    max_conn = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    return httpx.Limits(
+        max_connections=max_conn,
+        max_keepalive_connections=max_conn,
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE", "30")),
+    )
+
+
+def _max_retries() -> int:
+    return int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+
+def _revisar_fork() -> None:
+    # Tras un fork (gunicorn --preload) el pool y el hilo del loop no se heredan
+    global _pid, _cliente_async, _loop
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _cliente_async = _loop = None
+
+
+def _obtener_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        _revisar_fork()
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            hilo = threading.Thread(
+                target=loop.run_forever, name="openai-loop", daemon=True
+            )
+            hilo.start()
+            _loop = loop
+        return _loop
+
+
+def obtener_cliente_async():
+    """Cliente asíncrono; sólo debe usarse dentro del loop de fondo."""
+    global _cliente_async
+    if _cliente_async is None:
+        from openai import AsyncOpenAI
+        _cliente_async = AsyncOpenAI(
+            timeout=_timeout(),
+            max_retries=_max_retries(),
+            http_client=httpx.AsyncClient(timeout=_timeout(), limits=_limits()),
+        )
+    return _cliente_async
+
+
+def ejecutar(coro) -> Future:
+    """Programa ``coro`` en el loop de fondo y regresa un Future de hilos."""
+    return asyncio.run_coroutine_threadsafe(coro, _obtener_loop())
+
+
+async def esperar(coro):
+    """Espera ``coro`` (ejecutado en el loop de fondo) desde cualquier event loop."""
+    return await asyncio.wrap_future(ejecutar(coro))
+
+
+def cerrar_clientes() -> None:
+    """Cierra los pools (útil en pruebas o al apagar el proceso)."""
+    global _cliente_async, _loop
+    with _lock:
+        if _loop is not None:
+            if _cliente_async is not None:
+                asyncio.run_coroutine_threadsafe(_cliente_async.close(), _loop).result(5)
+            _loop.call_soon_threadsafe(_loop.stop)
+        _cliente_async = _loop = None
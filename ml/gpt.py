@@ -1,6 +1,110 @@
 # ml/gpt.py
 from __future__ import annotations
+import asyncio
 import os
+import queue
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from ml.model import resumen_historial
+from ml.cache import MensajeCache, clave_mensaje, crear_cache_desde_env
+from ml.circuito import CircuitBreaker, crear_breaker_desde_env
+from ml.cliente_openai import obtener_cliente_async, ejecutar, esperar
+from instrumentacion import medir_gpt
+
+_cache: MensajeCache = None
+_breaker: CircuitBreaker = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache() -> MensajeCache:
+    """Caché de mensajes del proceso (se configura con GPT_CACHE_*)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = crear_cache_desde_env()
+    return _cache
+
+
+def obtener_breaker() -> CircuitBreaker:
+    """Circuit breaker de las llamadas a OpenAI (GPT_CB_*)."""
+    global _breaker
+    if _breaker is None:
+        with _cache_lock:
+            if _breaker is None:
+                _breaker = crear_breaker_desde_env()
+    return _breaker
+
+
+def presupuesto_latencia() -> float:
+    """Segundos máximos que esperamos al modelo antes de usar el respaldo."""
+    return float(os.getenv("GPT_LATENCY_BUDGET", "2.5"))
+
+
+def _construir_prompt(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    nuevo_gasto: float,
+    resumen: dict
+) -> str:
+    # Análisis del historial
+    contexto_historial = ""
+    if resumen["conteo"] > 0:
+        total_pagos = resumen["conteo"]
+        total_gastado = resumen["suma"]
+        promedio = total_gastado / total_pagos
+
+        contexto_historial = (
+            f"\n\nHistorial del usuario:\n"
+            f"- Total de pagos realizados: {total_pagos}\n"
+            f"- Gasto promedio: ${promedio:,.2f}\n"
+            f"- Total gastado: ${total_gastado:,.2f}\n"
+        )
+
+        if total_pagos >= 3:
+            ultimos_3 = resumen["ultimos"][-3:]
+            motivos = [p.get("motivo") or "Sin motivo" for p in ultimos_3]
+            contexto_historial += f"- Últimos gastos: {', '.join(motivos)}\n"
+
+    return (
+        "Eres un asesor financiero personal y empático. Genera un mensaje de alerta que:\n"
+        "1. En 1-2 líneas: Explica el riesgo principal de este gasto basándote en el saldo y patrones\n"
+        "2. Agrega una sección 'Recomendaciones:' con 2-3 puntos concretos y accionables\n"
+        "3. Usa un tono cercano pero profesional\n"
+        "4. Sé conciso (máximo 200 palabras)\n"
+        "5. Usa números y datos específicos del usuario\n\n"
+        f"Situación actual:\n"
+        f"- Saldo disponible: ${saldo:,.2f}\n"
+        f"- Suscripciones activas: {suscripciones}\n"
+        f"- Gasto esencial: {'Sí' if esencial else 'No'}\n"
+        f"- Nuevo gasto propuesto: ${nuevo_gasto:,.2f}\n"
+        f"{contexto_historial}"
+    )
+
+
+def _parametros_completion(prompt: str) -> dict:
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "system",
+                "content": "Eres un asesor financiero personal. Responde en español de forma cercana y personalizada."
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.6,
+        "max_tokens": 280,
+    }
+
+
+def _contenido(resp, cache: MensajeCache, clave: str) -> str:
+    mensaje = (resp.choices[0].message.content or "").strip()
+    if mensaje:
+        cache.set(clave, mensaje)
+    return mensaje
+
 
 def generar_mensaje_gpt(
     *,
@@ -8,82 +112,200 @@ def generar_mensaje_gpt(
     suscripciones: int,
     esencial: bool,
     nuevo_gasto: float,
-    historial_pagos: list[dict] = None
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
 ) -> str:
     """
     Genera un mensaje personalizado con OpenAI basado en el historial del usuario.
+    Si el modelo no responde dentro de GPT_LATENCY_BUDGET segundos, o el
+    circuit breaker está abierto, regresa el mensaje de respaldo.
     """
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+    datos = dict(saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+                 nuevo_gasto=nuevo_gasto, resumen=resumen)
+
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        return _generar_mensaje_fallback(
-            saldo=saldo,
-            suscripciones=suscripciones,
-            esencial=esencial,
-            nuevo_gasto=nuevo_gasto,
-            historial_pagos=historial_pagos
-        )
+        return _generar_mensaje_fallback(**datos)
+
+    # Sólo se cachean respuestas del modelo, nunca el texto de respaldo
+    cache = obtener_cache()
+    clave = clave_mensaje(**datos)
+    cached = cache.get(clave)
+    if cached is not None:
+        return cached
+
+    breaker = obtener_breaker()
+    if not breaker.permitir():
+        return _generar_mensaje_fallback(**datos)
 
+    params = _parametros_completion(_construir_prompt(**datos))
+    futuro = ejecutar(_completion_async(params))
     try:
-        from openai import OpenAI
-        client = OpenAI()
-
-        # Análisis del historial
-        contexto_historial = ""
-        if historial_pagos and len(historial_pagos) > 0:
-            total_pagos = len(historial_pagos)
-            montos = [p.get("monto", 0) for p in historial_pagos]
-            promedio = sum(montos) / len(montos) if montos else 0
-            total_gastado = sum(montos)
-
-            contexto_historial = (
-                f"\n\nHistorial del usuario:\n"
-                f"- Total de pagos realizados: {total_pagos}\n"
-                f"- Gasto promedio: ${promedio:,.2f}\n"
-                f"- Total gastado: ${total_gastado:,.2f}\n"
-            )
-
-            if total_pagos >= 3:
-                ultimos_3 = historial_pagos[-3:]
-                motivos = [p.get("motivo", "Sin motivo") for p in ultimos_3]
-                contexto_historial += f"- Últimos gastos: {', '.join(motivos)}\n"
-
-        prompt = (
-            "Eres un asesor financiero personal y empático. Genera un mensaje de alerta que:\n"
-            "1. En 1-2 líneas: Explica el riesgo principal de este gasto basándote en el saldo y patrones\n"
-            "2. Agrega una sección 'Recomendaciones:' con 2-3 puntos concretos y accionables\n"
-            "3. Usa un tono cercano pero profesional\n"
-            "4. Sé conciso (máximo 200 palabras)\n"
-            "5. Usa números y datos específicos del usuario\n\n"
-            f"Situación actual:\n"
-            f"- Saldo disponible: ${saldo:,.2f}\n"
-            f"- Suscripciones activas: {suscripciones}\n"
-            f"- Gasto esencial: {'Sí' if esencial else 'No'}\n"
-            f"- Nuevo gasto propuesto: ${nuevo_gasto:,.2f}\n"
-            f"{contexto_historial}"
-        )
+        with medir_gpt():
+            resp = futuro.result(timeout=presupuesto_latencia())
+    except FutureTimeout:
+        futuro.cancel()
+        breaker.registrar_fallo(timeout=True)
+        return _generar_mensaje_fallback(**datos)
+    except Exception:
+        breaker.registrar_fallo()
+        return _generar_mensaje_fallback(**datos)
 
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un asesor financiero personal. Responde en español de forma cercana y personalizada."
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.6,
-            max_tokens=280,
-        )
-        return resp.choices[0].message.content.strip()
+    breaker.registrar_exito()
+    return _contenido(resp, cache, clave) or _generar_mensaje_fallback(**datos)
 
+
+async def _completion_async(params: dict):
+    return await obtener_cliente_async().chat.completions.create(**params)
+
+
+async def generar_mensaje_gpt_async(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    nuevo_gasto: float,
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
+) -> str:
+    """
+    Igual que generar_mensaje_gpt, pero espera la respuesta sin bloquear el
+    hilo: la petición corre en el cliente asíncrono compartido.
+    """
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+    datos = dict(saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+                 nuevo_gasto=nuevo_gasto, resumen=resumen)
+
+    if not os.getenv("OPENAI_API_KEY"):
+        return _generar_mensaje_fallback(**datos)
+
+    cache = obtener_cache()
+    clave = clave_mensaje(**datos)
+    cached = cache.get(clave)
+    if cached is not None:
+        return cached
+
+    breaker = obtener_breaker()
+    if not breaker.permitir():
+        return _generar_mensaje_fallback(**datos)
+
+    params = _parametros_completion(_construir_prompt(**datos))
+    try:
+        with medir_gpt():
+            resp = await asyncio.wait_for(esperar(_completion_async(params)), presupuesto_latencia())
+    except asyncio.TimeoutError:
+        breaker.registrar_fallo(timeout=True)
+        return _generar_mensaje_fallback(**datos)
+    except Exception:
+        breaker.registrar_fallo()
+        return _generar_mensaje_fallback(**datos)
+
+    breaker.registrar_exito()
+    return _contenido(resp, cache, clave) or _generar_mensaje_fallback(**datos)
+
+
+_FIN_STREAM = object()
+
+
+async def _stream_a_cola(params: dict, cola: queue.Queue) -> None:
+    """Corre en el loop de fondo y pasa cada fragmento del modelo a la cola."""
+    try:
+        stream = await obtener_cliente_async().chat.completions.create(stream=True, **params)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                cola.put(chunk.choices[0].delta.content)
+        cola.put(_FIN_STREAM)
     except Exception as e:
-        return _generar_mensaje_fallback(
-            saldo=saldo,
-            suscripciones=suscripciones,
-            esencial=esencial,
-            nuevo_gasto=nuevo_gasto,
-            historial_pagos=historial_pagos
-        )
+        cola.put(e)
+
+
+def generar_mensaje_gpt_stream(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    nuevo_gasto: float,
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
+):
+    """
+    Genera el mensaje como eventos: {"tipo": "token", "texto": ...} por cada
+    fragmento y al final {"tipo": "fin", "mensaje": ..., "fuente": ...}.
+    El mensaje de "fin" es el definitivo: si el modelo falla a la mitad, ahí
+    llega el texto de respaldo para reemplazar lo ya mostrado.
+    """
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+    datos = dict(saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+                 nuevo_gasto=nuevo_gasto, resumen=resumen)
+
+    def respaldo():
+        texto = _generar_mensaje_fallback(**datos)
+        return [{"tipo": "token", "texto": texto},
+                {"tipo": "fin", "mensaje": texto, "fuente": "local"}]
+
+    if not os.getenv("OPENAI_API_KEY"):
+        yield from respaldo()
+        return
+
+    cache = obtener_cache()
+    clave = clave_mensaje(**datos)
+    cached = cache.get(clave)
+    if cached is not None:
+        yield {"tipo": "token", "texto": cached}
+        yield {"tipo": "fin", "mensaje": cached, "fuente": "cache"}
+        return
+
+    breaker = obtener_breaker()
+    if not breaker.permitir():
+        yield from respaldo()
+        return
+
+    cola = queue.Queue()
+    futuro = ejecutar(_stream_a_cola(_parametros_completion(_construir_prompt(**datos)), cola))
+    # El primer fragmento debe llegar dentro del presupuesto de latencia
+    espera = presupuesto_latencia()
+    partes = []
+    # Si este stream es la llamada de prueba del breaker (semi-abierto), hay
+    # que liberarla pase lo que pase, también si el cliente se desconecta
+    reportado = False
+    try:
+        while True:
+            try:
+                item = cola.get(timeout=espera)
+            except queue.Empty:
+                futuro.cancel()
+                breaker.registrar_fallo(timeout=True)
+                reportado = True
+                yield from respaldo()
+                return
+            if item is _FIN_STREAM:
+                break
+            if isinstance(item, Exception):
+                breaker.registrar_fallo()
+                reportado = True
+                yield from respaldo()
+                return
+            partes.append(item)
+            espera = float(os.getenv("OPENAI_TIMEOUT", "15"))
+            yield {"tipo": "token", "texto": item}
+        breaker.registrar_exito()
+        reportado = True
+    finally:
+        if not reportado:
+            # El cliente cerró la conexión: no dice nada del modelo
+            futuro.cancel()
+            breaker.cancelar_prueba()
+
+    mensaje = "".join(partes).strip()
+    if not mensaje:
+        yield from respaldo()
+        return
+    cache.set(clave, mensaje)
+    yield {"tipo": "fin", "mensaje": mensaje, "fuente": "gpt"}
 
 
 def _generar_mensaje_fallback(
@@ -92,18 +314,21 @@ def _generar_mensaje_fallback(
     suscripciones: int,
     esencial: bool,
     nuevo_gasto: float,
-    historial_pagos: list[dict] = None
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
 ) -> str:
     """Genera un mensaje personalizado sin usar GPT"""
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+
     porcentaje = (nuevo_gasto / saldo * 100) if saldo > 0 else 100
     saldo_restante = saldo - nuevo_gasto
 
     # Análisis del historial
     patron = ""
-    if historial_pagos and len(historial_pagos) > 0:
-        montos = [p.get("monto", 0) for p in historial_pagos]
-        promedio = sum(montos) / len(montos)
-        total_pagos = len(historial_pagos)
+    if resumen["conteo"] > 0:
+        total_pagos = resumen["conteo"]
+        promedio = resumen["suma"] / total_pagos
 
         if nuevo_gasto > promedio * 1.5:
             patron = f"Este gasto de ${nuevo_gasto:,.2f} supera tu promedio habitual (${promedio:,.2f}). "
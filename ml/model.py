@@ -1,41 +1,98 @@
 # ml/model.py
 from __future__ import annotations
+import math
 
-def evaluar_gasto(
+import numpy as np
+
+# Tamaño del anillo de últimos pagos y base de las cubetas logarítmicas del
+# histograma de montos (cada cubeta abarca un 5% de variación).
+ULTIMOS_N = 5
+HISTOGRAMA_BASE = 1.05
+SIMILAR_TOLERANCIA = 0.2
+
+
+def cubeta_monto(monto: float) -> int:
+    return math.floor(math.log(monto) / math.log(HISTOGRAMA_BASE))
+
+
+def resumen_vacio() -> dict:
+    return {"conteo": 0, "suma": 0.0, "suma_cuadrados": 0.0, "ultimos": [], "histograma": {}}
+
+
+def acumular_resumen(resumen: dict, monto: float, motivo: str = None) -> dict:
+    """Agrega un pago al resumen (tamaño constante) y lo regresa."""
+    if not monto or monto <= 0:
+        return resumen
+    resumen["conteo"] += 1
+    resumen["suma"] += monto
+    resumen["suma_cuadrados"] += monto * monto
+    resumen["ultimos"] = (resumen["ultimos"] + [{"monto": monto, "motivo": motivo}])[-ULTIMOS_N:]
+    key = str(cubeta_monto(monto))
+    resumen["histograma"][key] = resumen["histograma"].get(key, 0) + 1
+    return resumen
+
+
+def resumen_historial(historial_pagos: list[dict] = None) -> dict:
+    """Construye el resumen a partir de una lista de pagos ordenada por fecha."""
+    resumen = resumen_vacio()
+    for p in historial_pagos or []:
+        acumular_resumen(resumen, p.get("monto", 0), p.get("motivo"))
+    return resumen
+
+
+def _centro_cubeta(b):
+    return (HISTOGRAMA_BASE ** b + HISTOGRAMA_BASE ** (b + 1)) / 2
+
+
+def indice_montos(histograma: dict) -> tuple:
+    """
+    Índice ordenado de montos: centros de cubeta ascendentes y conteos
+    acumulados (con 0 al inicio) para contar rangos con búsqueda binaria.
+    """
+    if not histograma:
+        return np.empty(0), np.zeros(1, dtype=np.int64)
+    cubetas = np.array(sorted(int(k) for k in histograma), dtype=np.int64)
+    conteos = np.array([histograma[str(b)] for b in cubetas], dtype=np.int64)
+    return _centro_cubeta(cubetas.astype(float)), np.concatenate(([0], np.cumsum(conteos)))
+
+
+def contar_similares_vector(indice: tuple, gastos: np.ndarray) -> np.ndarray:
+    """Pagos con monto a menos de ±20% de cada gasto (lo < monto < hi)."""
+    centros, acumulados = indice
+    margen = SIMILAR_TOLERANCIA * np.maximum(gastos, 1)
+    desde = np.searchsorted(centros, gastos - margen, side="right")
+    hasta = np.searchsorted(centros, gastos + margen, side="left")
+    return np.maximum(acumulados[hasta] - acumulados[desde], 0)
+
+
+def contar_similares(histograma: dict, nuevo_gasto: float) -> int:
+    """Pagos con monto a menos de ±20% de nuevo_gasto, según el histograma."""
+    return int(contar_similares_vector(indice_montos(histograma), np.array([nuevo_gasto]))[0])
+
+
+def umbrales_gasto(
     *,
     saldo: float,
     suscripciones: int,
     esencial: bool,
-    nuevo_gasto: float,
-    historial_pagos: list[dict] = None
-) -> int:
-    """
-    Regresa 1 si el gasto es riesgoso, 0 si no.
-    Ahora considera el historial de pagos del usuario para evaluar mejor.
-    """
-    if saldo is None or nuevo_gasto is None:
-        return 1
-
-    if saldo <= 0:
-        return 1
+    gastos: np.ndarray,
+    resumen: dict
+) -> np.ndarray:
+    """Umbral de riesgo (fracción del saldo) para cada gasto candidato."""
+    gastos = np.asarray(gastos, dtype=float)
 
     # Análisis del historial
     gasto_promedio = 0
     gasto_total_ultimos = 0
-    gastos_similares = []
+    gastos_similares = np.zeros(gastos.shape, dtype=np.int64)
 
-    if historial_pagos:
-        montos = [p.get("monto", 0) for p in historial_pagos if p.get("monto")]
-        if montos:
-            gasto_promedio = sum(montos) / len(montos)
-            # Últimos 5 pagos
-            ultimos_pagos = montos[-5:]
-            gasto_total_ultimos = sum(ultimos_pagos)
+    if resumen["conteo"]:
+        gasto_promedio = resumen["suma"] / resumen["conteo"]
+        # Últimos 5 pagos
+        gasto_total_ultimos = sum(p["monto"] for p in resumen["ultimos"])
 
-            # Gastos similares (mismo motivo o monto parecido)
-            for pago in historial_pagos:
-                if abs(pago.get("monto", 0) - nuevo_gasto) / max(nuevo_gasto, 1) < 0.2:
-                    gastos_similares.append(pago.get("monto", 0))
+        # Gastos similares (monto parecido)
+        gastos_similares = contar_similares_vector(indice_montos(resumen["histograma"]), gastos)
 
     # Umbral base
     umbral = 0.35
@@ -48,26 +105,128 @@ def evaluar_gasto(
     extra_subs = max(0, suscripciones - 5)
     umbral -= 0.02 * extra_subs
 
+    # Si ha gastado mucho recientemente, más estricto
+    if gasto_total_ultimos > saldo * 0.6:
+        umbral -= 0.10
+
+    umbral = np.full(gastos.shape, umbral)
+
     # Ajustes por historial
     if gasto_promedio > 0:
         # Si el nuevo gasto es mucho mayor al promedio, más riesgo
-        if nuevo_gasto > gasto_promedio * 2:
-            umbral -= 0.08
+        umbral -= np.where(gastos > gasto_promedio * 2, 0.08, 0)
         # Si es menor al promedio, menos riesgo
-        elif nuevo_gasto < gasto_promedio * 0.5:
-            umbral += 0.05
+        umbral += np.where(gastos < gasto_promedio * 0.5, 0.05, 0)
 
     # Si hay gastos similares previos, es menos riesgoso
-    if len(gastos_similares) >= 2:
-        umbral += 0.05
-
-    # Si ha gastado mucho recientemente, más estricto
-    if gasto_total_ultimos > saldo * 0.6:
-        umbral -= 0.10
+    umbral += np.where(gastos_similares >= 2, 0.05, 0)
 
     # Límites
-    umbral = max(0.08, min(0.45, umbral))
+    return np.clip(umbral, 0.08, 0.45)
+
+
+def evaluar_gastos(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    gastos,
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
+) -> np.ndarray:
+    """Evalúa un vector de gastos candidatos en una sola pasada (1 = riesgoso)."""
+    gastos = np.asarray(gastos, dtype=float)
+    if saldo is None or saldo <= 0:
+        return np.ones(gastos.shape, dtype=np.int64)
 
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+
+    umbral = umbrales_gasto(
+        saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+        gastos=gastos, resumen=resumen,
+    )
     # Decisión
-    ratio = nuevo_gasto / saldo
-    return 1 if ratio >= umbral else 0
+    ratio = gastos / saldo
+    return (ratio >= umbral).astype(np.int64)
+
+
+def evaluar_gasto(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    nuevo_gasto: float,
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
+) -> int:
+    """
+    Regresa 1 si el gasto es riesgoso, 0 si no.
+    Ahora considera el historial de pagos del usuario para evaluar mejor.
+    Acepta el historial completo o su ``resumen`` incremental (ver
+    services.estadistica_service), que tiene tamaño constante.
+    """
+    if saldo is None or nuevo_gasto is None:
+        return 1
+
+    return int(evaluar_gastos(
+        saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+        gastos=[nuevo_gasto], historial_pagos=historial_pagos, resumen=resumen,
+    )[0])
+
+
+def limite_gasto_seguro(
+    *,
+    saldo: float,
+    suscripciones: int,
+    esencial: bool,
+    historial_pagos: list[dict] = None,
+    resumen: dict = None
+) -> float:
+    """
+    Mayor gasto (en pesos, truncado a centavos) que evaluar_gasto todavía
+    considera no riesgoso; 0.0 si ninguno lo es.
+
+    El umbral es constante por tramos: sólo cambia al cruzar 0.5x y 2x el
+    promedio o los bordes de "montos similares" de cada cubeta. Dentro de un
+    tramo el máximo seguro es el borde derecho o saldo * umbral, así que basta
+    con evaluar esos candidatos.
+    """
+    if saldo is None or saldo <= 0:
+        return 0.0
+
+    if resumen is None:
+        resumen = resumen_historial(historial_pagos)
+
+    bordes = [saldo]
+    if resumen["conteo"]:
+        promedio = resumen["suma"] / resumen["conteo"]
+        bordes += [promedio * 0.5, promedio * 2]
+        centros, _ = indice_montos(resumen["histograma"])
+        for c in centros:
+            bordes += [c / (1 + SIMILAR_TOLERANCIA), c / (1 - SIMILAR_TOLERANCIA),
+                       c - SIMILAR_TOLERANCIA, c + SIMILAR_TOLERANCIA]
+    bordes = np.asarray(bordes, dtype=float)
+
+    # Umbral vigente justo antes y después de cada borde
+    muestras = np.concatenate((bordes - 0.005, bordes + 0.005))
+    umbrales = np.unique(umbrales_gasto(
+        saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+        gastos=muestras, resumen=resumen,
+    ))
+
+    candidatos = np.concatenate((bordes, saldo * umbrales))
+    # Centavos hacia abajo, y un centavo menos: en saldo * umbral exacto la
+    # decisión (ratio >= umbral) ya es riesgosa, en un borde exacto no
+    centavos = np.floor(np.round(candidatos * 100, 6))
+    candidatos = np.concatenate((centavos, centavos - 1)) / 100
+    candidatos = np.unique(candidatos[candidatos > 0])
+    if candidatos.size == 0:
+        return 0.0
+
+    riesgo = evaluar_gastos(
+        saldo=saldo, suscripciones=suscripciones, esencial=esencial,
+        gastos=candidatos, resumen=resumen,
+    )
+    seguros = candidatos[riesgo == 0]
+    return float(seguros.max()) if seguros.size else 0.0
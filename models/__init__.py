@@ -1,8 +1,32 @@
-# models/__init__.py
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+
+def _es_lectura(clause) -> bool:
+    return not getattr(clause, "is_dml", False) and getattr(clause, "_for_update_arg", None) is None
+
+
+class SesionEnrutada(Session):
+    """
+    Si la petición lo pidió con ``session.info["replica"]``, los SELECT van al
+    bind "replica". Flush, INSERT/UPDATE/DELETE y SELECT ... FOR UPDATE van
+    al primario y marcan ``info["escritura"]``: desde ahí la transacción
+    también lee del primario para ver sus propios cambios.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not _es_lectura(clause)):
+                self.info["escritura"] = True
+            elif clause is not None and self.info.get("replica") and not self.info.get("escritura"):
+                engine = self._db.engines.get("replica")
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": SesionEnrutada})
 
 class TimeStampedMixin:
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
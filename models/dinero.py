@@ -16,6 +16,9 @@ class Dinero(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
     updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
+    # Crece con cada cambio de saldo o deuda; se usa como ETag
+    version = db.Column(db.BigInteger, nullable=False, default=1, server_default="1")
+
     __table_args__ = (
         db.Index("idx_dinero_user", "idUser"),
     )
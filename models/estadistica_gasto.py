@@ -0,0 +1,36 @@
+# models/estadistica_gasto.py
+from . import db
+from sqlalchemy.sql import func
+
+class EstadisticaGasto(db.Model):
+    """
+    Estadísticas de gasto por usuario, actualizadas con cada pago para que
+    la evaluación de riesgo no tenga que leer todo el historial.
+    """
+    __tablename__ = "estadisticas_gasto"
+    idUser = db.Column(db.Integer, db.ForeignKey("users.idUser"), primary_key=True)
+    conteo = db.Column(db.Integer, nullable=False, default=0)
+    suma = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    suma_cuadrados = db.Column(db.Float, nullable=False, default=0)
+    # últimos N pagos [{monto, motivo}] y cubetas {cubeta: conteo}
+    ultimos = db.Column(db.JSON, nullable=False, default=list)
+    histograma = db.Column(db.JSON, nullable=False, default=dict)
+
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    def to_resumen(self) -> dict:
+        return {
+            "conteo": int(self.conteo or 0),
+            "suma": float(self.suma or 0),
+            "suma_cuadrados": float(self.suma_cuadrados or 0),
+            "ultimos": list(self.ultimos or []),
+            "histograma": dict(self.histograma or {}),
+        }
+
+    def from_resumen(self, resumen: dict) -> None:
+        self.conteo = resumen["conteo"]
+        self.suma = round(resumen["suma"], 2)
+        self.suma_cuadrados = resumen["suma_cuadrados"]
+        # objetos nuevos para que SQLAlchemy detecte el cambio del JSON
+        self.ultimos = list(resumen["ultimos"])
+        self.histograma = dict(resumen["histograma"])
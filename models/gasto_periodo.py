@@ -0,0 +1,34 @@
+# models/gasto_periodo.py
+from . import db
+
+# Los pagos sin categoría se acumulan con categoria = "" (es parte de la llave)
+SIN_CATEGORIA = ""
+
+
+class _Acumulado:
+    """Total y conteo de pagos del periodo, categoría y tipo."""
+    idUser = db.Column(db.Integer, db.ForeignKey("users.idUser"), nullable=False)
+    categoria = db.Column(db.String(60), nullable=False, default=SIN_CATEGORIA)
+    tipo = db.Column(db.String(10), nullable=False)
+    total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    conteo = db.Column(db.Integer, nullable=False, default=0)
+
+
+class GastoDiario(_Acumulado, db.Model):
+    __tablename__ = "gasto_diario"
+    dia = db.Column(db.Date, nullable=False)
+
+    # La llave (idUser, dia, ...) sirve un rango de fechas de un usuario
+    __table_args__ = (
+        db.PrimaryKeyConstraint("idUser", "dia", "categoria", "tipo", name="pk_gasto_diario"),
+    )
+
+
+class GastoMensual(_Acumulado, db.Model):
+    __tablename__ = "gasto_mensual"
+    # Primer día del mes
+    mes = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.PrimaryKeyConstraint("idUser", "mes", "categoria", "tipo", name="pk_gasto_mensual"),
+    )
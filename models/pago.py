@@ -8,6 +8,9 @@ class Pago(db.Model, TimeStampedMixin):
     __tablename__ = "pagos"
     idPago = db.Column(db.Integer, primary_key=True)
     idUser = db.Column(db.Integer, db.ForeignKey("users.idUser"), nullable=False)
+    # Copia de historial.idDinero: el historial de una cuenta se lee sólo de
+    # pagos, en orden, con ix_pagos_dinero_fecha. NULL hasta el backfill.
+    idDinero = db.Column(db.Integer, db.ForeignKey("dinero.idDinero"), nullable=True)
     motivo = db.Column(db.String(200), nullable=False)
     # Use a Python-side default to avoid emitting a MySQL-incompatible
     # DDL like `DEFAULT CURRENT_DATE` on some MySQL versions.
@@ -27,4 +30,7 @@ class Pago(db.Model, TimeStampedMixin):
         CheckConstraint("tipo IN ('debito','credito')", name="ck_pagos_tipo"),
         Index("ix_pagos_user_fecha", "idUser", "pagoFecha"),
         Index("ix_pagos_tipo", "tipo"),
+        # Top-N y páginas del historial (con y sin filtro de tipo)
+        Index("ix_pagos_dinero_fecha", "idDinero", "pagoFecha", "idPago"),
+        Index("ix_pagos_dinero_tipo_fecha", "idDinero", "tipo", "pagoFecha", "idPago"),
     )
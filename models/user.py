@@ -1,6 +1,6 @@
 # models/user.py
 from . import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from sqlalchemy.sql import func
 
 class User(db.Model):
@@ -24,9 +24,9 @@ class User(db.Model):
 
     # Helpers de contraseña
     def set_password(self, plain: str) -> None:
-        self.contrasena = generate_password_hash(
-            plain, method="pbkdf2:sha256", salt_length=16
-        )
+        # En línea (semilla, scripts); las rutas usan PasswordService
+        from services.password_service import generar_hash
+        self.contrasena = generar_hash(plain)
 
     def check_password(self, plain: str) -> bool:
         return check_password_hash(self.contrasena, plain)
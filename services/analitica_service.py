@@ -0,0 +1,179 @@
+# services/analitica_service.py
+"""
+Gasto por categoría ya acumulado: gasto_diario y gasto_mensual guardan
+total y conteo por (idUser, periodo, categoria, tipo).
+
+PaymentService llama ``registrar(user_id, pagos)`` en la misma transacción
+que inserta los pagos. Se suma en Python por llave y se hace un
+INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE por tabla, así dos pagos
+simultáneos del mismo usuario no se pisan. ``reconstruir`` (en
+MantenimientoService) recalcula todo desde pagos con pandas.
+
+/api/analytics lee sólo gasto_mensual (o gasto_diario) con un rango de la
+llave primaria de un usuario.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Optional
+
+import numpy as np
+
+from models import db
+from models.gasto_periodo import SIN_CATEGORIA, GastoDiario, GastoMensual
+
+MESES_DEFAULT = 12
+MAX_DIAS = 366
+
+
+def inicio_de_mes(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _upsert(modelo, filas: list) -> None:
+    """Suma total y conteo a las filas existentes (o las crea)."""
+    if not filas:
+        return
+    tabla = modelo.__table__
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as insert_mysql
+        stmt = insert_mysql(tabla).values(filas)
+        stmt = stmt.on_duplicate_key_update(
+            total=tabla.c.total + stmt.inserted.total,
+            conteo=tabla.c.conteo + stmt.inserted.conteo,
+        )
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+        stmt = insert_sqlite(tabla).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in tabla.primary_key.columns],
+            set_={
+                "total": tabla.c.total + stmt.excluded.total,
+                "conteo": tabla.c.conteo + stmt.excluded.conteo,
+            },
+        )
+    db.session.execute(stmt)
+
+
+def agregar(df) -> tuple:
+    """
+    Agrupa un DataFrame de pagos (idUser, pagoFecha, categoria, tipo, monto)
+    en filas de gasto_diario y gasto_mensual. Vectorizado: los montos se
+    suman como centavos enteros (int64), sin redondeos de float.
+    """
+    import pandas as pd  # sólo la reconstrucción lo necesita
+
+    if df.empty:
+        return [], []
+    fechas = pd.to_datetime(df["pagoFecha"])
+    base = pd.DataFrame({
+        "idUser": df["idUser"].to_numpy(dtype=np.int64),
+        "dia": fechas.dt.normalize(),
+        "mes": fechas.dt.to_period("M").dt.to_timestamp(),
+        "categoria": df["categoria"].fillna(SIN_CATEGORIA).to_numpy(),
+        "tipo": df["tipo"].to_numpy(),
+        "centavos": np.rint(df["monto"].astype(float).to_numpy() * 100).astype(np.int64),
+    })
+
+    def por(periodo: str) -> list:
+        g = (
+            base.groupby(["idUser", periodo, "categoria", "tipo"], sort=False)["centavos"]
+            .agg(["sum", "size"])
+            .reset_index()
+        )
+        return [
+            {
+                "idUser": int(uid), periodo: ts.date(), "categoria": cat, "tipo": tipo,
+                "total": Decimal(int(suma)).scaleb(-2), "conteo": int(n),
+            }
+            for uid, ts, cat, tipo, suma, n in g.itertuples(index=False, name=None)
+        ]
+
+    return por("dia"), por("mes")
+
+
+class AnaliticaService:
+    @staticmethod
+    def registrar(user_id: int, pagos: Iterable[dict]) -> None:
+        """
+        Acumula pagos recién insertados.
+        pagos: [{"pagoFecha": date, "categoria": str|None, "tipo": str, "monto": ...}, ...]
+        """
+        diario = defaultdict(lambda: [Decimal(0), 0])
+        mensual = defaultdict(lambda: [Decimal(0), 0])
+        for p in pagos:
+            fecha = p["pagoFecha"]
+            categoria = (p.get("categoria") or SIN_CATEGORIA)[:60]
+            monto = Decimal(str(p["monto"])).quantize(Decimal("0.01"))
+            for acumulado, periodo in ((diario, fecha), (mensual, inicio_de_mes(fecha))):
+                a = acumulado[(periodo, categoria, p["tipo"])]
+                a[0] += monto
+                a[1] += 1
+
+        for modelo, campo, acumulado in ((GastoDiario, "dia", diario), (GastoMensual, "mes", mensual)):
+            _upsert(modelo, [
+                {"idUser": user_id, campo: periodo, "categoria": categoria, "tipo": tipo,
+                 "total": total, "conteo": conteo}
+                for (periodo, categoria, tipo), (total, conteo) in acumulado.items()
+            ])
+
+    @staticmethod
+    def rango_por_defecto(hoy: date = None) -> tuple:
+        """Los últimos MESES_DEFAULT meses, incluido el actual."""
+        hoy = hoy or date.today()
+        indice = hoy.year * 12 + hoy.month - 1 - (MESES_DEFAULT - 1)
+        return date(indice // 12, indice % 12 + 1, 1), hoy
+
+    @staticmethod
+    def resumen(user_id: int, desde: date, hasta: date, diario: bool = False) -> dict:
+        """Totales por periodo (débito/crédito y por categoría) y por categoría en el rango."""
+        modelo, campo = (GastoDiario, "dia") if diario else (GastoMensual, "mes")
+        columna = getattr(modelo, campo)
+        if not diario:
+            desde = inicio_de_mes(desde)
+        filas = db.session.execute(
+            db.select(columna, modelo.categoria, modelo.tipo, modelo.total, modelo.conteo)
+            .where(modelo.idUser == user_id, columna.between(desde, hasta))
+            .order_by(columna)
+        ).all()
+
+        periodos, categorias = {}, {}
+        for periodo, categoria, tipo, total, conteo in filas:
+            total = float(total)
+            p = periodos.setdefault(periodo, {
+                "periodo": periodo.isoformat() if diario else periodo.strftime("%Y-%m"),
+                "debito": 0.0, "credito": 0.0, "conteo": 0, "categorias": {},
+            })
+            p[tipo] = round(p[tipo] + total, 2)
+            p["conteo"] += conteo
+            clave = categoria or "sin_categoria"
+            p["categorias"][clave] = round(p["categorias"].get(clave, 0.0) + total, 2)
+            c = categorias.setdefault(clave, {"categoria": clave, "total": 0.0, "conteo": 0})
+            c["total"] = round(c["total"] + total, 2)
+            c["conteo"] += conteo
+
+        return {
+            "periodo": "diario" if diario else "mensual",
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "periodos": list(periodos.values()),
+            "categorias": sorted(categorias.values(), key=lambda c: -c["total"]),
+        }
+
+    @staticmethod
+    def parsear_periodo(valor: Optional[str], campo: str, fin: bool = False) -> Optional[date]:
+        """YYYY-MM (primer o último día del mes) o YYYY-MM-DD."""
+        if not valor:
+            return None
+        try:
+            if len(valor) == 7:
+                anio, mes = (int(x) for x in valor.split("-"))
+                if not fin:
+                    return date(anio, mes, 1)
+                siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+                return date.fromordinal(siguiente.toordinal() - 1)
+            return date.fromisoformat(valor)
+        except ValueError:
+            raise ValueError(f"{campo} inválido (usa YYYY-MM o YYYY-MM-DD)")
@@ -1,8 +1,18 @@
 from decimal import Decimal
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
 from models import db
 from models.dinero import Dinero
 from models.user import User
 
+# Reintentos del pago de tarjeta cuando otra petición cambió el saldo entre
+# la lectura y el UPDATE condicional.
+PAY_CARD_MAX_RETRIES = 3
+
+
+def _to_decimal(monto) -> Decimal:
+    return Decimal(str(monto)).quantize(Decimal("0.01"))
+
 
 class BalanceService:
     @staticmethod
@@ -19,43 +29,128 @@ class BalanceService:
         db.session.add(dinero)
         return dinero
 
+    # -----------------------------------------------------------------
+    # UPDATEs condicionales de una sola sentencia: la base de datos aplica
+    # la resta sobre el valor vigente, así que dos peticiones simultáneas
+    # nunca se pisan. El número de filas afectadas dice si hubo fondos.
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _apply_update(dinero: Dinero, stmt) -> bool:
+        dialect = db.session.get_bind().dialect
+        if dialect.update_returning:
+            stmt = stmt.returning(Dinero.saldo, Dinero.deuda_credito, Dinero.version)
+            row = db.session.execute(stmt, execution_options={"synchronize_session": False}).first()
+            if row is None:
+                return False
+            set_committed_value(dinero, "saldo", row.saldo)
+            set_committed_value(dinero, "deuda_credito", row.deuda_credito)
+            set_committed_value(dinero, "version", row.version)
+            return True
+
+        res = db.session.execute(stmt, execution_options={"synchronize_session": False})
+        if res.rowcount == 0:
+            return False
+        # Sin RETURNING (MySQL): se recargan sólo si alguien los lee
+        db.session.expire(dinero, ["saldo", "deuda_credito", "version"])
+        return True
+
+    @staticmethod
+    def debit(dinero: Dinero, monto: float) -> bool:
+        """
+        UPDATE dinero SET saldo = saldo - :m, version = version + 1
+        WHERE idDinero = :id AND saldo >= :m
+        """
+        m = _to_decimal(monto)
+        stmt = (
+            update(Dinero)
+            .where(Dinero.idDinero == dinero.idDinero, Dinero.saldo >= m)
+            .values(saldo=Dinero.saldo - m, version=Dinero.version + 1)
+        )
+        return BalanceService._apply_update(dinero, stmt)
+
+    @staticmethod
+    def add_debt(dinero: Dinero, monto: float) -> bool:
+        """
+        UPDATE dinero SET deuda_credito = deuda_credito + :m, version = version + 1
+        WHERE idDinero = :id
+        """
+        m = _to_decimal(monto)
+        stmt = (
+            update(Dinero)
+            .where(Dinero.idDinero == dinero.idDinero)
+            .values(deuda_credito=Dinero.deuda_credito + m, version=Dinero.version + 1)
+        )
+        return BalanceService._apply_update(dinero, stmt)
+
+    @staticmethod
+    def settle_debt(dinero: Dinero, monto: float) -> bool:
+        """
+        UPDATE dinero SET saldo = saldo - :m, deuda_credito = deuda_credito - :m,
+                          version = version + 1
+        WHERE idDinero = :id AND saldo >= :m AND deuda_credito >= :m
+        """
+        m = _to_decimal(monto)
+        stmt = (
+            update(Dinero)
+            .where(
+                Dinero.idDinero == dinero.idDinero,
+                Dinero.saldo >= m,
+                Dinero.deuda_credito >= m,
+            )
+            .values(
+                saldo=Dinero.saldo - m,
+                deuda_credito=Dinero.deuda_credito - m,
+                version=Dinero.version + 1,
+            )
+        )
+        return BalanceService._apply_update(dinero, stmt)
+
+    @staticmethod
+    def set_totals(dinero: Dinero, saldo: Decimal, deuda: Decimal) -> None:
+        """Asigna saldo y deuda ya calculados (fila bloqueada con FOR UPDATE)."""
+        dinero.saldo = saldo
+        dinero.deuda_credito = deuda
+        dinero.version = Dinero.version + 1
+        db.session.flush()
+
     @staticmethod
     def update_balance(dinero: Dinero, monto: float, tipo: str) -> None:
         if tipo == "debito":
-            current_saldo = float(dinero.saldo or 0)
-            if current_saldo < monto:
+            if not BalanceService.debit(dinero, monto):
                 raise ValueError("Saldo insuficiente")
-            nuevo_saldo = current_saldo - monto
-            dinero.saldo = Decimal(str(nuevo_saldo))
         elif tipo == "credito":
-            current_deuda = float(dinero.deuda_credito or 0)
-            nueva_deuda = current_deuda + monto
-            dinero.deuda_credito = Decimal(str(nueva_deuda))
-
-        db.session.flush()
+            if not BalanceService.add_debt(dinero, monto):
+                raise ValueError("No hay saldo asociado")
 
     @staticmethod
     def pay_credit_card(dinero: Dinero, monto: float) -> dict:
-        saldo_actual = float(dinero.saldo or 0)
-        deuda_actual = float(dinero.deuda_credito or 0)
+        for _ in range(PAY_CARD_MAX_RETRIES):
+            saldo_actual = float(dinero.saldo or 0)
+            deuda_actual = float(dinero.deuda_credito or 0)
 
-        if deuda_actual <= 0:
-            raise ValueError("No hay deuda de tarjeta")
-        if saldo_actual <= 0:
-            raise ValueError("Saldo insuficiente")
+            if deuda_actual <= 0:
+                raise ValueError("No hay deuda de tarjeta")
+            if saldo_actual <= 0:
+                raise ValueError("Saldo insuficiente")
 
-        pagable = min(monto, saldo_actual, deuda_actual)
-        ajustado = pagable < monto
+            pagable = min(monto, saldo_actual, deuda_actual)
+            ajustado = pagable < monto
 
-        dinero.saldo = Decimal(str(saldo_actual - pagable))
-        dinero.deuda_credito = Decimal(str(deuda_actual - pagable))
+            if BalanceService.settle_debt(dinero, pagable):
+                return {
+                    "pagable": pagable,
+                    "ajustado": ajustado,
+                    "nuevo_saldo": float(dinero.saldo),
+                    "nueva_deuda": float(dinero.deuda_credito)
+                }
+            # Otra petición movió el saldo o la deuda: releer y recalcular.
+            # Con FOR UPDATE: en REPEATABLE READ (MySQL) una lectura normal
+            # regresa la misma foto de la transacción y el UPDATE fallaría
+            # otra vez; la lectura con bloqueo ve lo confirmado y el
+            # siguiente intento ya no compite.
+            db.session.refresh(dinero, ["saldo", "deuda_credito"], with_for_update=True)
 
-        return {
-            "pagable": pagable,
-            "ajustado": ajustado,
-            "nuevo_saldo": float(dinero.saldo),
-            "nueva_deuda": float(dinero.deuda_credito)
-        }
+        raise ValueError("El saldo cambió durante la operación, intenta de nuevo")
 
     @staticmethod
     def get_balance_info(user_id: int) -> dict:
@@ -67,5 +162,13 @@ class BalanceService:
             "idUser": user_id,
             "saldo": float(dinero.saldo or 0),
             "deuda_credito": float(dinero.deuda_credito or 0),
-            "moneda": getattr(dinero, "moneda", "MXN") or "MXN"
+            "moneda": getattr(dinero, "moneda", "MXN") or "MXN",
+            "version": dinero.version,
         }
+
+    # -----------------------------------------------------------------
+    # Versión del saldo (ETag)
+    # -----------------------------------------------------------------
+    @staticmethod
+    def etag(user_id: int, version: int) -> str:
+        return f"s{user_id}.{version}"
@@ -0,0 +1,182 @@
+# services/dashboard_service.py
+"""
+Payload del dashboard: usuario, saldo y últimos movimientos en una sola
+consulta, guardado ya serializado (con su ETag) en una caché por usuario.
+
+Antes de servir una entrada se lee el ETag vigente (dinero.version y el
+nombre, una fila por llave): un pago atendido por otro worker cambia la
+versión y la entrada se vuelve a armar. Además, los servicios que escriben
+movimientos llaman ``marcar_cambio(user_id)``: la entrada de este proceso
+se borra en ese momento y otra vez cuando la transacción hace commit. Un
+rollback sólo descarta los pendientes.
+
+Configuración:
+    DASHBOARD_CACHE_TTL   segundos (60; 0 desactiva la caché)
+    DASHBOARD_CACHE_MAX   entradas máximas por proceso (10000)
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import zlib
+from typing import Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from ml.cache import LRUTTLCache
+from models import db
+from models.user import User
+from models.dinero import Dinero
+from models.pago import Pago
+from services.replica_service import ReplicaService
+
+ULTIMOS_MOVIMIENTOS = 10
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_dashboard() -> Optional[LRUTTLCache]:
+    global _cache
+    ttl = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+    if ttl <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUTTLCache(
+                    max_items=int(os.getenv("DASHBOARD_CACHE_MAX", "10000")), ttl=ttl
+                )
+    return _cache
+
+
+class DashboardService:
+    @staticmethod
+    def _consultar(user_id: int) -> Optional[dict]:
+        """users ⋈ dinero ⟕ (top-N pagos por ix_pagos_dinero_fecha) en un solo viaje."""
+        ultimos = (
+            db.select(
+                Pago.idDinero, Pago.idPago, Pago.motivo, Pago.monto, Pago.tipo,
+                Pago.pagoFecha, Pago.categoria, Pago.metodo,
+            )
+            .where(Pago.idDinero == (
+                db.select(Dinero.idDinero)
+                .where(Dinero.idUser == user_id)
+                .limit(1)
+                .scalar_subquery()
+            ))
+            .order_by(Pago.pagoFecha.desc(), Pago.idPago.desc())
+            .limit(ULTIMOS_MOVIMIENTOS)
+            .subquery("ultimos")
+        )
+        rows = db.session.execute(
+            db.select(
+                User.nombre, User.apellido,
+                Dinero.idDinero, Dinero.version,
+                Dinero.saldo, Dinero.deuda_credito, Dinero.moneda,
+                ultimos.c.idPago, ultimos.c.motivo, ultimos.c.monto, ultimos.c.tipo,
+                ultimos.c.pagoFecha, ultimos.c.categoria, ultimos.c.metodo,
+            )
+            .join(Dinero, Dinero.idUser == User.idUser)
+            .outerjoin(ultimos, ultimos.c.idDinero == Dinero.idDinero)
+            .where(User.idUser == user_id)
+            .order_by(ultimos.c.pagoFecha.desc(), ultimos.c.idPago.desc())
+        ).all()
+        if not rows:
+            return None
+
+        from services.payment_service import PaymentService
+        primera = rows[0]
+        usuario = DashboardService._usuario(primera.nombre, primera.apellido)
+        return {
+            "etag": DashboardService.etag(primera.idDinero, primera.version, usuario),
+            "usuario": usuario,
+            "saldo": float(primera.saldo),
+            "deuda_credito": float(primera.deuda_credito or 0),
+            "moneda": primera.moneda or "MXN",
+            "movimientos": [
+                PaymentService.serialize_movement(r) for r in rows if r.idPago is not None
+            ],
+        }
+
+    @staticmethod
+    def _usuario(nombre: str, apellido: str) -> str:
+        return f"{nombre} {apellido}".strip()
+
+    @staticmethod
+    def _etag_vigente(user_id: int) -> Optional[str]:
+        """ETag según la base, sin movimientos: users ⋈ dinero por llave."""
+        fila = db.session.execute(
+            db.select(Dinero.idDinero, Dinero.version, User.nombre, User.apellido)
+            .join(User, User.idUser == Dinero.idUser)
+            .where(Dinero.idUser == user_id)
+            .limit(1)
+        ).first()
+        if fila is None:
+            return None
+        return DashboardService.etag(
+            fila.idDinero, fila.version, DashboardService._usuario(fila.nombre, fila.apellido)
+        )
+
+    @staticmethod
+    def etag(id_dinero: int, version: int, usuario: str) -> str:
+        """Cambia con la versión del saldo (pagos, deuda) o con el nombre."""
+        return f"d{id_dinero}.{version}.{zlib.crc32(usuario.encode()):08x}"
+
+    @staticmethod
+    def snapshot(user_id: int) -> Optional[Tuple[str, str]]:
+        """(ETag, JSON) del dashboard; None si el usuario no existe o no tiene saldo."""
+        cache = obtener_cache_dashboard()
+        entrada = cache.get(user_id) if cache is not None else None
+        if entrada is not None:
+            # Otro worker pudo haber escrito: sólo sirve si su ETag sigue vigente
+            if DashboardService._etag_vigente(user_id) == entrada[0]:
+                return entrada
+            cache.delete(user_id)
+
+        payload = DashboardService._consultar(user_id)
+        if payload is None:
+            return None
+        etag = payload.pop("etag")
+        entrada = (etag, json.dumps(payload, ensure_ascii=False))
+        # Lo leído de la réplica puede ir atrasado: no se guarda
+        if (cache is not None and not db.session.info.get("dashboard_pendientes")
+                and not ReplicaService.en_replica()):
+            cache.set(user_id, entrada)
+        return entrada
+
+    @staticmethod
+    def payload_json(user_id: int) -> Optional[str]:
+        entrada = DashboardService.snapshot(user_id)
+        return entrada[1] if entrada else None
+
+    @staticmethod
+    def invalidar(user_id: int) -> None:
+        cache = obtener_cache_dashboard()
+        if cache is not None:
+            cache.delete(user_id)
+
+    @staticmethod
+    def marcar_cambio(user_id: int) -> None:
+        """Llamar desde cualquier escritura que cambie saldo o movimientos."""
+        DashboardService.invalidar(user_id)
+        db.session.info.setdefault("dashboard_pendientes", set()).add(user_id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidar_al_commit(session) -> None:
+    for user_id in session.info.pop("dashboard_pendientes", ()):
+        DashboardService.invalidar(user_id)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop("dashboard_pendientes", None)
+
+
+@event.listens_for(User, "after_update")
+def _invalidar_por_nombre(mapper, connection, target) -> None:
+    estado = inspect(target)
+    if estado.attrs.nombre.history.has_changes() or estado.attrs.apellido.history.has_changes():
+        DashboardService.invalidar(target.idUser)
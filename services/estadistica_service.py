@@ -0,0 +1,78 @@
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.pago import Pago
+from models.user import User
+from models.estadistica_gasto import EstadisticaGasto
+from ml.model import acumular_resumen, resumen_historial
+
+
+class EstadisticaService:
+    @staticmethod
+    def _historial_completo(user_id: int) -> list:
+        rows = (
+            db.session.query(Pago.monto, Pago.motivo)
+            .filter(Pago.idUser == user_id)
+            .order_by(Pago.pagoFecha, Pago.idPago)
+            .all()
+        )
+        return [{"monto": float(m), "motivo": motivo} for m, motivo in rows]
+
+    @staticmethod
+    def _crear_desde_historial(user_id: int) -> dict:
+        """
+        Backfill único para usuarios que aún no tienen estadísticas; regresa
+        el resumen. Si el usuario no existe no se crea la fila.
+        """
+        historial = EstadisticaService._historial_completo(user_id)
+        # Con pagos el usuario existe (FK); sin ellos hay que confirmarlo: en
+        # MySQL el INSERT fallaría y en SQLite quedaría una fila huérfana
+        if not historial and db.session.get(User, user_id) is None:
+            return resumen_historial([])
+        resumen = resumen_historial(historial)
+        stats = EstadisticaGasto(idUser=user_id)
+        stats.from_resumen(resumen)
+        try:
+            with db.session.begin_nested():
+                db.session.add(stats)
+        except IntegrityError:
+            # Otra petición lo creó al mismo tiempo (o el usuario se borró)
+            stats = (
+                EstadisticaGasto.query.filter_by(idUser=user_id)
+                .with_for_update()
+                .first()
+            )
+            if stats is None:
+                return resumen
+        return stats.to_resumen()
+
+    @staticmethod
+    def registrar_pagos(user_id: int, pagos: list) -> None:
+        """
+        Acumula pagos ya insertados (flush) en las estadísticas del usuario.
+        pagos: [{"monto": float, "motivo": str}, ...] en orden de registro.
+        """
+        stats = (
+            EstadisticaGasto.query.filter_by(idUser=user_id)
+            .with_for_update()
+            .first()
+        )
+        if stats is None:
+            # El backfill ya incluye los pagos recién insertados
+            EstadisticaService._crear_desde_historial(user_id)
+            return
+
+        resumen = stats.to_resumen()
+        for p in pagos:
+            acumular_resumen(resumen, float(p["monto"]), p.get("motivo"))
+        stats.from_resumen(resumen)
+
+    @staticmethod
+    def registrar_pago(user_id: int, monto: float, motivo: str = None) -> None:
+        EstadisticaService.registrar_pagos(user_id, [{"monto": monto, "motivo": motivo}])
+
+    @staticmethod
+    def obtener_resumen(user_id: int) -> dict:
+        stats = db.session.get(EstadisticaGasto, user_id)
+        if stats is None:
+            return EstadisticaService._crear_desde_historial(user_id)
+        return stats.to_resumen()
@@ -0,0 +1,194 @@
+"""
+Canal de eventos de saldo por usuario (Server-Sent Events en /api/eventos).
+
+PaymentService encola ``{saldo, deuda_credito, version, movimiento}`` con
+``publicar_al_commit``; el evento sale sólo si la transacción hace commit y
+se descarta con un rollback.
+
+El bus por defecto vive en el proceso. Con EVENTOS_BUS_URL=redis://... los
+eventos se publican en Redis y un solo hilo por proceso los reparte a las
+conexiones locales, así todos los workers ven los cambios de todos.
+
+Cada conexión abierta es una ``Suscripcion``: una cola acotada y un Event;
+mientras no hay cambios no guarda nada más.
+
+Cada conexión ocupa un hilo (o greenlet) del worker mientras está abierta:
+el canal sólo se activa con EVENTOS_SSE=1, para despliegues con
+``gunicorn -k gthread`` o ``-k gevent``. Apagado, /api/eventos responde 404
+y el dashboard consulta /api/saldo periódicamente.
+
+Configuración:
+    EVENTOS_SSE         1 activa /api/eventos (0)
+    EVENTOS_BUS_URL     redis://host:6379/0 (opcional; requiere ``redis``)
+    EVENTOS_COLA_MAX    eventos sin leer por conexión; se tiran los viejos (16)
+    EVENTOS_HEARTBEAT   segundos entre comentarios keep-alive (15)
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+from models import db
+
+CANAL = "saldo:"
+
+
+class Suscripcion:
+    __slots__ = ("user_id", "_cola", "_aviso")
+
+    def __init__(self, user_id: int, max_eventos: int):
+        self.user_id = user_id
+        self._cola = deque(maxlen=max_eventos)
+        self._aviso = threading.Event()
+
+    def entregar(self, evento: dict) -> None:
+        self._cola.append(evento)
+        self._aviso.set()
+
+    def esperar(self, timeout: float) -> list:
+        """Eventos pendientes; lista vacía si pasó ``timeout`` sin cambios."""
+        if not self._cola:
+            self._aviso.wait(timeout)
+        self._aviso.clear()
+        eventos = []
+        while self._cola:
+            eventos.append(self._cola.popleft())
+        return eventos
+
+
+class BusLocal:
+    """Pub/sub dentro del proceso: idUser -> conexiones abiertas."""
+
+    nombre = "local"
+
+    def __init__(self, max_eventos: int = 16):
+        self.max_eventos = max_eventos
+        self._subs: dict = {}
+        self._lock = threading.Lock()
+
+    def suscribir(self, user_id: int) -> Suscripcion:
+        sus = Suscripcion(user_id, self.max_eventos)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(sus)
+        return sus
+
+    def cancelar(self, sus: Suscripcion) -> None:
+        with self._lock:
+            subs = self._subs.get(sus.user_id)
+            if subs is not None:
+                subs.discard(sus)
+                if not subs:
+                    del self._subs[sus.user_id]
+
+    def publicar(self, user_id: int, evento: dict) -> None:
+        self.repartir(user_id, evento)
+
+    def repartir(self, user_id: int, evento: dict) -> None:
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for sus in subs:
+            sus.entregar(evento)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.nombre,
+                "usuarios": len(self._subs),
+                "conexiones": sum(len(s) for s in self._subs.values()),
+            }
+
+
+class BusRedis(BusLocal):
+    """Publica en Redis; un hilo por proceso escucha y reparte localmente."""
+
+    nombre = "redis"
+
+    def __init__(self, url: str, max_eventos: int = 16):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("EVENTOS_BUS_URL requiere instalar 'redis'") from e
+        super().__init__(max_eventos)
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._hilo = None
+
+    def publicar(self, user_id: int, evento: dict) -> None:
+        self._client.publish(f"{CANAL}{user_id}", json.dumps(evento, ensure_ascii=False))
+
+    def suscribir(self, user_id: int) -> Suscripcion:
+        self._arrancar()
+        return super().suscribir(user_id)
+
+    def _arrancar(self) -> None:
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escuchar, name="eventos-redis", daemon=True)
+                self._hilo.start()
+
+    def _escuchar(self) -> None:
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{CANAL}*")
+                for msg in pubsub.listen():
+                    user_id = int(msg["channel"][len(CANAL):])
+                    self.repartir(user_id, json.loads(msg["data"]))
+            except Exception:
+                # Redis caído o reiniciado: reintentar sin tumbar al worker
+                time.sleep(1)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def obtener_bus() -> BusLocal:
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                max_eventos = int(os.getenv("EVENTOS_COLA_MAX", "16"))
+                url = os.getenv("EVENTOS_BUS_URL")
+                _bus = BusRedis(url, max_eventos) if url else BusLocal(max_eventos)
+    return _bus
+
+
+def sse_habilitado() -> bool:
+    return bool(int(os.getenv("EVENTOS_SSE", "0")))
+
+
+def heartbeat() -> float:
+    return float(os.getenv("EVENTOS_HEARTBEAT", "15"))
+
+
+class EventosService:
+    @staticmethod
+    def publicar_al_commit(user_id: int, evento: dict) -> None:
+        """Encola ``evento`` para ``user_id``; sale cuando la transacción hace commit."""
+        db.session.info.setdefault("eventos_pendientes", []).append((user_id, evento))
+
+
+@event.listens_for(db.session, "after_commit")
+def _publicar_al_commit(session) -> None:
+    pendientes = session.info.pop("eventos_pendientes", ())
+    if not pendientes:
+        return
+    bus = obtener_bus()
+    for user_id, evento in pendientes:
+        try:
+            bus.publicar(user_id, evento)
+        except Exception:
+            # El cambio ya está confirmado; el cliente se entera en su siguiente lectura
+            pass
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _descartar_eventos(session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop("eventos_pendientes", None)
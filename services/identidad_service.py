@@ -0,0 +1,102 @@
+# services/identidad_service.py
+"""
+Identidad del usuario autenticado: los campos que se muestran y su idDinero.
+
+Se resuelve una vez por petición (``flask.g``) y, si IDENTIDAD_CACHE_TTL > 0,
+se guarda unos segundos en una caché LRU del proceso, así las rutas que sólo
+necesitan ``idUser``/``idDinero`` no consultan ``users`` en cada llamada.
+La entrada se invalida al cerrar sesión y en cualquier UPDATE/DELETE de
+User o Dinero hecho por este proceso; en otros workers vence con el TTL.
+
+Configuración:
+    IDENTIDAD_CACHE_TTL   segundos (30; 0 desactiva la caché)
+    IDENTIDAD_CACHE_MAX   entradas máximas por proceso (10000)
+"""
+from __future__ import annotations
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+from ml.cache import LRUTTLCache
+from models import db
+from models.user import User
+from models.dinero import Dinero
+
+
+@dataclass(frozen=True)
+class Identidad:
+    idUser: int
+    nombre: str
+    apellido: Optional[str]
+    correo: str
+    idDinero: Optional[int]
+
+    @property
+    def nombre_completo(self) -> str:
+        return f"{self.nombre} {self.apellido}".strip()
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.pop("idDinero")
+        return d
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_identidad() -> Optional[LRUTTLCache]:
+    global _cache
+    ttl = float(os.getenv("IDENTIDAD_CACHE_TTL", "30"))
+    if ttl <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUTTLCache(
+                    max_items=int(os.getenv("IDENTIDAD_CACHE_MAX", "10000")), ttl=ttl
+                )
+    return _cache
+
+
+class IdentidadService:
+    @staticmethod
+    def cargar(user_id: int) -> Optional[Identidad]:
+        """Identidad desde la caché o con una sola consulta (users LEFT JOIN dinero)."""
+        cache = obtener_cache_identidad()
+        if cache is not None:
+            identidad = cache.get(user_id)
+            if identidad is not None:
+                return identidad
+
+        row = db.session.execute(
+            db.select(User.idUser, User.nombre, User.apellido, User.correo, Dinero.idDinero)
+            .outerjoin(Dinero, Dinero.idUser == User.idUser)
+            .where(User.idUser == user_id)
+            .order_by(Dinero.idDinero)
+            .limit(1)
+        ).first()
+        if row is None:
+            return None
+
+        identidad = Identidad(*row)
+        # Sin saldo todavía: no se guarda para no ocultar el que se cree después
+        if cache is not None and identidad.idDinero is not None:
+            cache.set(user_id, identidad)
+        return identidad
+
+    @staticmethod
+    def invalidar(user_id: int) -> None:
+        cache = obtener_cache_identidad()
+        if cache is not None and user_id is not None:
+            cache.delete(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+@event.listens_for(Dinero, "after_delete")
+def _invalidar_por_cambio(mapper, connection, target) -> None:
+    IdentidadService.invalidar(target.idUser)
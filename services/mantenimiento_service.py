@@ -0,0 +1,281 @@
+# services/mantenimiento_service.py
+"""
+Trabajos de mantenimiento por lotes (se corren desde bootstrap o la CLI).
+
+Recorren ``users`` (o ``pagos``) por llave primaria (keyset: ``id > ultimo_id``) en
+lotes de tamaño fijo y confirman cada lote, así la memoria no crece con el
+número de usuarios y un trabajo interrumpido se reanuda con ``desde_id`` (el
+``ultimo_id`` del último progreso reportado). Volver a correrlos completos
+también es seguro: sólo tocan filas pendientes.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from sqlalchemy import bindparam, delete, func, insert, literal, not_, or_, select, update
+from models import db
+from models.user import User
+from models.dinero import Dinero
+from models.pago import Pago
+from models.historial import Historial
+from models.gasto_periodo import GastoDiario, GastoMensual
+from services.analitica_service import agregar
+from services.password_service import METODOS_HASH, es_hash, generar_hash, parametros_hash
+LOTE_DEFAULT = 1000
+
+
+class _Progreso:
+    def __init__(self, trabajo: str, reportar=None):
+        self.trabajo = trabajo
+        self.reportar = reportar
+        self.inicio = time.perf_counter()
+        self.lotes = 0
+        self.revisados = 0
+        self.actualizados = 0
+        self.ultimo_id = None
+
+    def lote(self, revisados: int, actualizados: int, ultimo_id: int) -> None:
+        self.lotes += 1
+        self.revisados += revisados
+        self.actualizados += actualizados
+        self.ultimo_id = ultimo_id
+        if self.reportar:
+            self.reportar(self.resumen())
+
+    def resumen(self) -> dict:
+        segundos = time.perf_counter() - self.inicio
+        return {
+            "trabajo": self.trabajo,
+            "lotes": self.lotes,
+            "revisados": self.revisados,
+            "actualizados": self.actualizados,
+            "ultimo_id": self.ultimo_id,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(self.revisados / segundos, 1) if segundos > 0 else 0.0,
+        }
+
+
+class MantenimientoService:
+    @staticmethod
+    def rehash_contrasenas(lote: int = LOTE_DEFAULT, procesos: int = None,
+                           desde_id: int = 0, reportar=None) -> dict:
+        """
+        Convierte contraseñas en texto plano al método configurado. Un valor
+        con la forma ``method$salt$hash`` de werkzeug y un método conocido
+        (pbkdf2:*, scrypt:*) ya es un hash y no se toca, aunque sea de otro
+        método: ese lo actualiza el login. Sólo se leen (idUser, contrasena)
+        de las filas pendientes y el hash de cada lote se reparte en un pool
+        de procesos (``procesos=1`` lo hace en línea).
+        """
+        users = User.__table__
+        # Filtro grueso en SQL; es_hash decide por fila
+        ya_hasheada = or_(*(
+            users.c.contrasena.like(f"{m}:%$%$%") for m in METODOS_HASH
+        ))
+        pendientes = (
+            select(users.c.idUser, users.c.contrasena)
+            .where(
+                users.c.idUser > bindparam("ultimo"),
+                users.c.contrasena != "",
+                not_(ya_hasheada),
+            )
+            .order_by(users.c.idUser)
+            .limit(lote)
+        )
+        guardar = (
+            update(users)
+            .where(users.c.idUser == bindparam("_id"))
+            .values(contrasena=bindparam("_hash"))
+        )
+
+        method, salt_length = parametros_hash()
+        hashear = partial(generar_hash, method=method, salt_length=salt_length)
+        procesos = procesos or os.cpu_count() or 1
+        progreso = _Progreso("rehash_contrasenas", reportar)
+        pool = ProcessPoolExecutor(max_workers=procesos) if procesos > 1 else None
+        try:
+            ultimo = desde_id
+            while True:
+                filas = db.session.execute(pendientes, {"ultimo": ultimo}).all()
+                if not filas:
+                    break
+                ultimo = filas[-1][0]
+                leidas = len(filas)
+                filas = [(uid, c) for uid, c in filas if not es_hash(c)]
+                planos = [c for _, c in filas]
+                if pool is not None:
+                    por_proceso = max(1, len(planos) // (procesos * 4))
+                    hashes = list(pool.map(hashear, planos, chunksize=por_proceso))
+                else:
+                    hashes = [hashear(p) for p in planos]
+
+                if filas:
+                    db.session.execute(guardar, [
+                        {"_id": uid, "_hash": h} for (uid, _), h in zip(filas, hashes)
+                    ])
+                db.session.commit()
+                progreso.lote(leidas, len(filas), ultimo)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return progreso.resumen()
+
+    @staticmethod
+    def crear_saldos_faltantes(lote: int = LOTE_DEFAULT, desde_id: int = 0,
+                               reportar=None) -> dict:
+        """
+        Crea un Dinero en cero para cada usuario que no tiene, con un
+        INSERT ... SELECT por rango de idUser (nada pasa por Python).
+        """
+        users = User.__table__
+        dinero = Dinero.__table__
+
+        progreso = _Progreso("crear_saldos_faltantes", reportar)
+        ultimo = desde_id
+        while True:
+            # Límite superior del rango: el idUser número ``lote`` después de ``ultimo``
+            tope = db.session.execute(
+                select(users.c.idUser)
+                .where(users.c.idUser > ultimo)
+                .order_by(users.c.idUser)
+                .offset(lote - 1)
+                .limit(1)
+            ).scalar()
+            if tope is None:
+                tope = db.session.execute(
+                    select(func.max(users.c.idUser)).where(users.c.idUser > ultimo)
+                ).scalar()
+                if tope is None:
+                    break
+
+            en_rango = users.c.idUser.between(ultimo + 1, tope)
+            sin_saldo = (
+                select(users.c.idUser, literal(0), literal(0), literal("MXN"))
+                .select_from(users.outerjoin(dinero, dinero.c.idUser == users.c.idUser))
+                .where(en_rango, dinero.c.idDinero.is_(None))
+            )
+            creados = db.session.execute(
+                insert(dinero).from_select(
+                    ["idUser", "saldo", "deuda_credito", "moneda"], sin_saldo
+                )
+            ).rowcount
+            revisados = db.session.execute(
+                select(func.count()).select_from(users).where(en_rango)
+            ).scalar()
+            db.session.commit()
+            ultimo = tope
+            progreso.lote(revisados, max(creados, 0), ultimo)
+        return progreso.resumen()
+
+    @staticmethod
+    def copiar_dinero_a_pagos(lote: int = LOTE_DEFAULT, desde_id: int = 0,
+                              reportar=None) -> dict:
+        """
+        Llena pagos.idDinero desde historial para los pagos anteriores a la
+        columna: un UPDATE con subconsulta correlacionada por rango de idPago.
+        Los pagos sin historial toman el saldo de su usuario (pagos.idUser),
+        para que no queden pendientes y la siguiente corrida no los vuelva a
+        recorrer.
+        """
+        pagos = Pago.__table__
+        historial = Historial.__table__
+        dinero = Dinero.__table__
+
+        progreso = _Progreso("copiar_dinero_a_pagos", reportar)
+        # Los pagos nuevos ya traen idDinero: se empieza en el primer pendiente
+        primero = db.session.execute(
+            select(func.min(pagos.c.idPago))
+            .where(pagos.c.idPago > desde_id, pagos.c.idDinero.is_(None))
+        ).scalar()
+        if primero is None:
+            return progreso.resumen()
+        ultimo = primero - 1
+        while True:
+            tope = db.session.execute(
+                select(pagos.c.idPago)
+                .where(pagos.c.idPago > ultimo)
+                .order_by(pagos.c.idPago)
+                .offset(lote - 1)
+                .limit(1)
+            ).scalar()
+            if tope is None:
+                tope = db.session.execute(
+                    select(func.max(pagos.c.idPago)).where(pagos.c.idPago > ultimo)
+                ).scalar()
+                if tope is None:
+                    break
+
+            en_rango = pagos.c.idPago.between(ultimo + 1, tope)
+            en_historial = select(historial.c.idDinero).where(historial.c.idPago == pagos.c.idPago)
+            del_usuario = (
+                select(dinero.c.idDinero)
+                .where(dinero.c.idUser == pagos.c.idUser)
+                .order_by(dinero.c.idDinero)
+            )
+            copiados = db.session.execute(
+                update(pagos)
+                .where(
+                    en_rango,
+                    pagos.c.idDinero.is_(None),
+                    or_(en_historial.exists(), del_usuario.exists()),
+                )
+                .values(idDinero=func.coalesce(
+                    en_historial.limit(1).scalar_subquery(),
+                    del_usuario.limit(1).scalar_subquery(),
+                ))
+            ).rowcount
+            revisados = db.session.execute(
+                select(func.count()).select_from(pagos).where(en_rango)
+            ).scalar()
+            db.session.commit()
+            ultimo = tope
+            progreso.lote(revisados, max(copiados, 0), ultimo)
+        return progreso.resumen()
+
+    @staticmethod
+    def reconstruir_gastos(lote: int = LOTE_DEFAULT, desde_id: int = 0,
+                           reportar=None) -> dict:
+        """
+        Recalcula gasto_diario y gasto_mensual desde pagos para ``lote``
+        usuarios a la vez: los pagos del rango se leen en un DataFrame, se
+        agrupan con pandas y reemplazan los acumulados de esos usuarios en la
+        misma transacción. Conviene correrlo con poco tráfico: un pago de un
+        usuario del lote que llegue a la mitad puede requerir otra corrida.
+        """
+        import pandas as pd
+
+        users = User.__table__
+        pagos = Pago.__table__
+
+        progreso = _Progreso("reconstruir_gastos", reportar)
+        ultimo = desde_id
+        while True:
+            tope = db.session.execute(
+                select(users.c.idUser)
+                .where(users.c.idUser > ultimo)
+                .order_by(users.c.idUser)
+                .offset(lote - 1)
+                .limit(1)
+            ).scalar()
+            if tope is None:
+                tope = db.session.execute(
+                    select(func.max(users.c.idUser)).where(users.c.idUser > ultimo)
+                ).scalar()
+                if tope is None:
+                    break
+
+            df = pd.read_sql(
+                select(pagos.c.idUser, pagos.c.pagoFecha, pagos.c.categoria, pagos.c.tipo, pagos.c.monto)
+                .where(pagos.c.idUser.between(ultimo + 1, tope)),
+                db.session.connection(),
+            )
+            diario, mensual = agregar(df)
+            for modelo, filas in ((GastoDiario, diario), (GastoMensual, mensual)):
+                db.session.execute(delete(modelo).where(modelo.idUser.between(ultimo + 1, tope)))
+                for inicio in range(0, len(filas), lote):
+                    db.session.execute(insert(modelo), filas[inicio:inicio + lote])
+            db.session.commit()
+            ultimo = tope
+            progreso.lote(len(df), len(diario) + len(mensual), ultimo)
+        return progreso.resumen()
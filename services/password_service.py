@@ -0,0 +1,278 @@
+# services/password_service.py
+"""
+Hash y verificación de contraseñas fuera del hilo de la petición.
+
+pbkdf2 es CPU pura: hecho en línea, una ráfaga de logins ocupa todos los
+hilos del worker y /api/saldo se forma detrás. Aquí se manda a un pool de
+procesos de tamaño fijo (uno por worker, recreado tras un fork) con un
+límite de peticiones en vuelo; si está lleno se rechaza de inmediato con
+``PoolSaturado`` para que la ruta responda 503 + Retry-After en lugar de
+acumular cola. Si una operación pasa de PASSWORD_TIMEOUT también se
+responde ``PoolSaturado``: el worker sigue ocupado con ella.
+
+Los procesos se arrancan con "spawn": un fork desde un worker con hilos
+(gunicorn gthread) puede heredar locks tomados por otros hilos y colgarse.
+
+Configuración (se lee al crear el pool, después de load_dotenv):
+    PASSWORD_HASH_METHOD     método de werkzeug, p. ej. pbkdf2:sha256:600000
+    PASSWORD_SALT_LENGTH     longitud de la sal (16)
+    PASSWORD_POOL_PROCESOS   procesos del pool (mitad de los CPUs, mínimo 1)
+    PASSWORD_POOL_COLA       máximo de hashes en vuelo (procesos * 4)
+    PASSWORD_TIMEOUT         segundos máximos por operación (10)
+    PASSWORD_RETRY_AFTER     segundos sugeridos en el 503 (1)
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash,
+)
+
+MUESTRAS_MAX = 512
+# Métodos que entiende check_password_hash (werkzeug)
+METODOS_HASH = ("pbkdf2", "scrypt")
+
+
+class PoolSaturado(RuntimeError):
+    def __init__(self, retry_after: int):
+        super().__init__("Demasiadas operaciones de contraseña en curso")
+        self.retry_after = retry_after
+
+
+def parametros_hash() -> tuple:
+    """(method, salt_length) configurados, con las iteraciones explícitas."""
+    method = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+    if method.startswith("pbkdf2:") and method.count(":") == 1:
+        method = f"{method}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method, int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+
+
+def _partes(valor) -> tuple:
+    """(method, salt, hash) de un hash de werkzeug; ValueError si no tiene esa forma."""
+    try:
+        metodo, sal, resumen = valor.split("$", 2)
+    except (AttributeError, ValueError):
+        raise ValueError("No es un hash de werkzeug")
+    if not sal or not resumen or metodo.split(":", 1)[0] not in METODOS_HASH:
+        raise ValueError("No es un hash de werkzeug")
+    return metodo, sal, resumen
+
+
+def es_hash(valor) -> bool:
+    """True si ``valor`` ya es un hash (cualquier método conocido), no texto plano."""
+    try:
+        _partes(valor)
+    except ValueError:
+        return False
+    return True
+
+
+# Funciones de nivel de módulo para poder correr en otro proceso
+def generar_hash(plano: str, method: str = None, salt_length: int = None) -> str:
+    if method is None:
+        method, salt_length = parametros_hash()
+    return generate_password_hash(plano, method=method, salt_length=salt_length)
+
+
+# Regresan también el tiempo de cómputo dentro del worker
+def _generar(plano: str, method: str, salt_length: int) -> tuple:
+    t0 = time.perf_counter()
+    return generar_hash(plano, method, salt_length), time.perf_counter() - t0
+
+
+def _verificar(hash_: str, plano: str) -> tuple:
+    t0 = time.perf_counter()
+    return check_password_hash(hash_, plano), time.perf_counter() - t0
+
+
+def _percentil(ordenados: list, q: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+class MetricasHash:
+    """Tiempos por operación: espera en cola y cómputo en el worker (ms)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self.operaciones = {"hash": 0, "verificar": 0}
+            self.rechazadas = 0
+            self.errores = 0
+            self.rehashes = 0
+            self._total = deque(maxlen=MUESTRAS_MAX)
+            self._espera = deque(maxlen=MUESTRAS_MAX)
+
+    def registrar(self, tipo: str, total: float, computo: float) -> None:
+        with self._lock:
+            self.operaciones[tipo] += 1
+            self._total.append(total * 1000)
+            self._espera.append(max(0.0, total - computo) * 1000)
+
+    def incrementar(self, campo: str) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sorted(self._total)
+            espera = sorted(self._espera)
+            return {
+                "operaciones": dict(self.operaciones),
+                "rechazadas": self.rechazadas,
+                "errores": self.errores,
+                "rehashes": self.rehashes,
+                "ms": {
+                    "p50": round(_percentil(total, 0.50), 2),
+                    "p95": round(_percentil(total, 0.95), 2),
+                    "p99": round(_percentil(total, 0.99), 2),
+                    "max": round(total[-1], 2) if total else 0.0,
+                },
+                "espera_ms": {
+                    "p50": round(_percentil(espera, 0.50), 2),
+                    "p95": round(_percentil(espera, 0.95), 2),
+                },
+            }
+
+
+class PoolHash:
+    def __init__(self, procesos: int, cola: int, timeout: float, retry_after: int):
+        self.procesos = procesos
+        self.cola = cola
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._cupos = threading.BoundedSemaphore(cola)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._en_vuelo = 0
+        self.metricas = MetricasHash()
+
+    def _obtener_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # Tras un fork (gunicorn --preload) el pool del padre no sirve
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos, mp_context=get_context("spawn"),
+                )
+            return self._executor
+
+    def _liberar(self, _futuro=None) -> None:
+        with self._lock:
+            self._en_vuelo -= 1
+        self._cupos.release()
+
+    def ejecutar(self, tipo: str, fn, *args):
+        if not self._cupos.acquire(blocking=False):
+            self.metricas.incrementar("rechazadas")
+            raise PoolSaturado(self.retry_after)
+        t0 = time.perf_counter()
+        with self._lock:
+            self._en_vuelo += 1
+        try:
+            futuro = self._obtener_executor().submit(fn, *args)
+        except Exception:
+            self._liberar()
+            self.metricas.incrementar("errores")
+            raise
+        # El cupo se libera cuando el worker termina, aunque aquí se haya
+        # agotado el timeout: así el límite refleja el trabajo real en el pool
+        futuro.add_done_callback(self._liberar)
+        try:
+            resultado, computo = futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            # El cupo sigue tomado hasta que el worker termine: para quien
+            # llama es lo mismo que un pool lleno
+            self.metricas.incrementar("errores")
+            raise PoolSaturado(self.retry_after)
+        except Exception:
+            self.metricas.incrementar("errores")
+            raise
+        self.metricas.registrar(tipo, time.perf_counter() - t0, computo)
+        return resultado
+
+    def cerrar(self) -> None:
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        # Fuera del lock: al terminar, los futuros pendientes llaman a _liberar
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            en_vuelo = self._en_vuelo
+        return {
+            "procesos": self.procesos,
+            "cola_max": self.cola,
+            "en_vuelo": en_vuelo,
+            "metodo": parametros_hash()[0],
+            **self.metricas.stats(),
+        }
+
+
+def crear_pool_desde_env() -> PoolHash:
+    procesos = int(os.getenv("PASSWORD_POOL_PROCESOS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+    return PoolHash(
+        procesos=procesos,
+        cola=int(os.getenv("PASSWORD_POOL_COLA", "0")) or procesos * 4,
+        timeout=float(os.getenv("PASSWORD_TIMEOUT", "10")),
+        retry_after=int(os.getenv("PASSWORD_RETRY_AFTER", "1")),
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool() -> PoolHash:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = crear_pool_desde_env()
+    return _pool
+
+
+class PasswordService:
+    @staticmethod
+    def hashear(plano: str) -> str:
+        """
+        Hash con los parámetros configurados. Lanza PoolSaturado si no hay
+        cupo o se agota PASSWORD_TIMEOUT.
+        """
+        method, salt_length = parametros_hash()
+        return obtener_pool().ejecutar("hash", _generar, plano, method, salt_length)
+
+    @staticmethod
+    def verificar(hash_: str, plano: str) -> bool:
+        """Lanza PoolSaturado si no hay cupo o se agota PASSWORD_TIMEOUT."""
+        if not hash_:
+            return False
+        return obtener_pool().ejecutar("verificar", _verificar, hash_, plano)
+
+    @staticmethod
+    def necesita_rehash(hash_: str) -> bool:
+        """True si el hash se hizo con otro método/iteraciones o sal que los configurados."""
+        method, salt_length = parametros_hash()
+        try:
+            metodo_actual, sal, _ = _partes(hash_)
+        except ValueError:
+            return True
+        return metodo_actual != method or len(sal) != salt_length
+
+    @staticmethod
+    def registrar_rehash() -> None:
+        obtener_pool().metricas.incrementar("rehashes")
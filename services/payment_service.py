@@ -1,9 +1,23 @@
+import base64
 from datetime import date
+from types import SimpleNamespace
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import and_, or_, insert, text
 from models import db
 from models.pago import Pago
 from models.historial import Historial
 from models.dinero import Dinero
 from services.balance_service import BalanceService
+from services.estadistica_service import EstadisticaService
+from services.analitica_service import AnaliticaService
+from services.dashboard_service import DashboardService
+from services.eventos_service import EventosService
+
+
+BATCH_MAX_ROWS = 5000
+BATCH_CHUNK_ROWS = 500
+# pagos.monto es Numeric(12, 2)
+MONTO_MAX = Decimal(10) ** 10
 
 
 class PaymentService:
@@ -30,6 +44,7 @@ class PaymentService:
         try:
             pago = Pago(
                 idUser=user_id,
+                idDinero=dinero.idDinero,
                 motivo=motivo,
                 pagoFecha=date.today(),
                 monto=monto,
@@ -45,6 +60,7 @@ class PaymentService:
             db.session.rollback()
             pago = Pago(
                 idUser=user_id,
+                idDinero=dinero.idDinero,
                 motivo=motivo,
                 pagoFecha=date.today(),
                 monto=monto,
@@ -54,6 +70,10 @@ class PaymentService:
             db.session.flush()
 
         db.session.add(Historial(idDinero=dinero.idDinero, idPago=pago.idPago))
+        EstadisticaService.registrar_pago(user_id, monto, motivo)
+        AnaliticaService.registrar(user_id, [PaymentService._acumulable(pago)])
+        DashboardService.marcar_cambio(user_id)
+        PaymentService._publicar_cambio(user_id, dinero, pago)
 
         return {
             "pago_id": pago.idPago,
@@ -64,6 +84,178 @@ class PaymentService:
             "nueva_deuda_credito": float(dinero.deuda_credito or 0)
         }
 
+    @staticmethod
+    def _batch_text(row: dict, campo: str, default: str = None) -> str:
+        """Texto opcional del renglón: debe ser str y caber en la columna."""
+        valor = row.get(campo)
+        if valor is None or valor == "":
+            return default
+        if not isinstance(valor, str):
+            raise ValueError(f"{campo} debe ser texto")
+        valor = valor.strip()
+        largo = Pago.__table__.c[campo].type.length
+        if largo and len(valor) > largo:
+            raise ValueError(f"{campo} excede {largo} caracteres")
+        return valor or default
+
+    @staticmethod
+    def _validate_batch_row(row) -> dict:
+        if not isinstance(row, dict):
+            raise ValueError("Cada movimiento debe ser un objeto")
+
+        motivo = PaymentService._batch_text(row, "motivo")
+        tipo = PaymentService._batch_text(row, "tipo", "debito").lower()
+        if not motivo or row.get("monto") is None:
+            raise ValueError("Faltan datos requeridos (motivo, monto)")
+        if isinstance(row.get("monto"), (bool, dict, list)):
+            raise ValueError("Monto inválido")
+        try:
+            monto = Decimal(str(row.get("monto"))).quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            raise ValueError("Monto inválido")
+        # NaN pasa quantize pero no se puede comparar; Infinity no cabe
+        if not monto.is_finite() or monto >= MONTO_MAX:
+            raise ValueError("Monto inválido")
+        if monto <= 0:
+            raise ValueError("Monto debe ser mayor a 0")
+        if tipo not in ("debito", "credito"):
+            raise ValueError("tipo debe ser 'debito' o 'credito'")
+
+        fecha = row.get("fecha")
+        try:
+            fecha = date.fromisoformat(str(fecha)[:10]) if fecha else date.today()
+        except ValueError:
+            raise ValueError("Fecha inválida (usa YYYY-MM-DD)")
+
+        notas = row.get("notas") or None
+        if notas is not None and not isinstance(notas, str):
+            raise ValueError("notas debe ser texto")
+
+        return {
+            "motivo": motivo,
+            "monto": monto,
+            "tipo": tipo,
+            "pagoFecha": fecha,
+            "categoria": PaymentService._batch_text(row, "categoria"),
+            "metodo": PaymentService._batch_text(row, "metodo"),
+            "referencia": PaymentService._batch_text(row, "referencia"),
+            "notas": notas,
+        }
+
+    @staticmethod
+    def _ids_consecutivos() -> bool:
+        """
+        True si MySQL garantiza ids consecutivos (paso 1) a un INSERT
+        multi-fila: auto_increment_increment = 1 y innodb_autoinc_lock_mode
+        0 o 1. Con paso > 1 (Galera, multi-primario) o modo 2 (intercalado,
+        el default de MySQL 8) otros INSERT concurrentes pueden meterse en
+        medio. Se pregunta una vez por conexión.
+        """
+        conn = db.session.connection()
+        if "ids_consecutivos" not in conn.info:
+            paso, modo = conn.execute(
+                text("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")
+            ).one()
+            conn.info["ids_consecutivos"] = int(paso) == 1 and int(modo) in (0, 1)
+        return conn.info["ids_consecutivos"]
+
+    @staticmethod
+    def _bulk_insert_pagos(rows: list) -> list:
+        """Inserta pagos con INSERTs multi-fila y regresa sus ids en orden."""
+        dialect = db.session.get_bind().dialect
+        table = Pago.__table__
+        if dialect.insert_returning:
+            ids = []
+            for start in range(0, len(rows), BATCH_CHUNK_ROWS):
+                chunk = rows[start:start + BATCH_CHUNK_ROWS]
+                # Los autoincrementos de un mismo INSERT multi-fila crecen
+                # en el orden de los VALUES.
+                res = db.session.execute(insert(table).values(chunk).returning(table.c.idPago))
+                ids.extend(sorted(res.scalars().all()))
+            return ids
+
+        if not PaymentService._ids_consecutivos():
+            # Sin garantía de ids seguidos, lastrowid sólo es exacto fila por fila
+            return [db.session.execute(insert(table).values(row)).lastrowid for row in rows]
+
+        ids = []
+        for start in range(0, len(rows), BATCH_CHUNK_ROWS):
+            chunk = rows[start:start + BATCH_CHUNK_ROWS]
+            # Un solo INSERT ... VALUES (...), (...) reserva ids consecutivos
+            # y lastrowid apunta al primero.
+            res = db.session.execute(insert(table).values(chunk))
+            ids.extend(range(res.lastrowid, res.lastrowid + len(chunk)))
+        return ids
+
+    @staticmethod
+    def register_payments_batch(user_id: int, movimientos: list) -> dict:
+        """
+        Registra un lote de movimientos en una sola transacción. Los renglones
+        inválidos (o sin saldo suficiente) se reportan en ``errores`` y no
+        impiden que el resto del lote se aplique.
+        """
+        if not isinstance(movimientos, list) or not movimientos:
+            raise ValueError("Se requiere una lista de movimientos")
+        if len(movimientos) > BATCH_MAX_ROWS:
+            raise ValueError(f"Máximo {BATCH_MAX_ROWS} movimientos por lote")
+
+        dinero = (
+            Dinero.query.filter_by(idUser=user_id)
+            .with_for_update()
+            .first()
+        )
+        if not dinero:
+            raise ValueError("No hay saldo asociado")
+
+        saldo = Decimal(dinero.saldo or 0)
+        deuda = Decimal(dinero.deuda_credito or 0)
+
+        validos, indices, errores = [], [], []
+        for i, row in enumerate(movimientos):
+            try:
+                pago = PaymentService._validate_batch_row(row)
+                if pago["tipo"] == "debito":
+                    if saldo < pago["monto"]:
+                        raise ValueError("Saldo insuficiente")
+                    saldo -= pago["monto"]
+                else:
+                    deuda += pago["monto"]
+            except ValueError as e:
+                errores.append({"indice": i, "error": str(e)})
+                continue
+            pago["idUser"] = user_id
+            pago["idDinero"] = dinero.idDinero
+            validos.append(pago)
+            indices.append(i)
+
+        pago_ids = []
+        if validos:
+            # Un solo cambio neto por cuenta
+            BalanceService.set_totals(dinero, saldo, deuda)
+
+            pago_ids = PaymentService._bulk_insert_pagos(validos)
+            hist_rows = [{"idDinero": dinero.idDinero, "idPago": pid} for pid in pago_ids]
+            for start in range(0, len(hist_rows), BATCH_CHUNK_ROWS):
+                db.session.execute(
+                    insert(Historial.__table__).values(hist_rows[start:start + BATCH_CHUNK_ROWS])
+                )
+            EstadisticaService.registrar_pagos(user_id, validos)
+            AnaliticaService.registrar(user_id, validos)
+            DashboardService.marcar_cambio(user_id)
+            _, pid, ultimo = max(
+                (p["pagoFecha"], pid, p) for pid, p in zip(pago_ids, validos)
+            )
+            PaymentService._publicar_cambio(user_id, dinero, SimpleNamespace(idPago=pid, **ultimo))
+
+        return {
+            "insertados": len(pago_ids),
+            "rechazados": len(errores),
+            "pagos": [{"indice": i, "pago_id": pid} for i, pid in zip(indices, pago_ids)],
+            "errores": errores,
+            "nuevo_saldo": float(saldo),
+            "nueva_deuda_credito": float(deuda)
+        }
+
     @staticmethod
     def pay_credit_card(user_id: int, monto: float) -> dict:
         if monto <= 0:
@@ -77,6 +269,7 @@ class PaymentService:
 
         pago = Pago(
             idUser=user_id,
+            idDinero=dinero.idDinero,
             motivo="Pago tarjeta",
             pagoFecha=date.today(),
             monto=result["pagable"],
@@ -86,6 +279,10 @@ class PaymentService:
         db.session.flush()
 
         db.session.add(Historial(idDinero=dinero.idDinero, idPago=pago.idPago))
+        EstadisticaService.registrar_pago(user_id, result["pagable"], pago.motivo)
+        AnaliticaService.registrar(user_id, [PaymentService._acumulable(pago)])
+        DashboardService.marcar_cambio(user_id)
+        PaymentService._publicar_cambio(user_id, dinero, pago)
 
         return {
             "mensaje": "Pago de tarjeta aplicado" + (" (ajustado)" if result["ajustado"] else ""),
@@ -97,16 +294,59 @@ class PaymentService:
         }
 
     @staticmethod
-    def get_payments_by_user(user_id: int, dinero_id: int, page: int = 1,
-                            per_page: int = 10, tipo: str = None) -> dict:
-        base_q = (
-            db.session.query(Pago)
-            .join(Historial, Historial.idPago == Pago.idPago)
-            .filter(Historial.idDinero == dinero_id)
-        )
+    def _acumulable(pago: Pago) -> dict:
+        return {"pagoFecha": pago.pagoFecha, "categoria": pago.categoria,
+                "tipo": pago.tipo, "monto": pago.monto}
+
+    @staticmethod
+    def _publicar_cambio(user_id: int, dinero: Dinero, pago) -> None:
+        """Evento para /api/eventos; se publica cuando la transacción hace commit."""
+        EventosService.publicar_al_commit(user_id, {
+            "saldo": float(dinero.saldo),
+            "deuda_credito": float(dinero.deuda_credito or 0),
+            "version": dinero.version,
+            "movimiento": PaymentService.serialize_movement(pago),
+        })
 
+    @staticmethod
+    def serialize_movement(p: Pago) -> dict:
+        return {
+            "motivo": p.motivo,
+            "monto": float(p.monto),
+            "signo": "-" if (p.tipo or "debito") == "debito" else "+",
+            "fecha": p.pagoFecha.isoformat() if p.pagoFecha else None,
+            "tipo": p.tipo or "debito",
+            "categoria": getattr(p, "categoria", None),
+            "metodo": getattr(p, "metodo", None),
+        }
+
+    @staticmethod
+    def encode_cursor(p: Pago) -> str:
+        raw = f"{p.pagoFecha.isoformat()}|{p.idPago}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            fecha_raw, id_raw = base64.urlsafe_b64decode(padded).decode().split("|")
+            return date.fromisoformat(fecha_raw), int(id_raw)
+        except Exception:
+            raise ValueError("Cursor inválido")
+
+    @staticmethod
+    def _movements_query(dinero_id: int, tipo: str = None):
+        # Sin join a historial: (idDinero[, tipo], pagoFecha, idPago) es un
+        # rango de índice ya ordenado, sin filesort
+        base_q = db.session.query(Pago).filter(Pago.idDinero == dinero_id)
         if tipo in ("debito", "credito"):
             base_q = base_q.filter(Pago.tipo == tipo)
+        return base_q
+
+    @staticmethod
+    def get_payments_by_user(user_id: int, dinero_id: int, page: int = 1,
+                            per_page: int = 10, tipo: str = None) -> dict:
+        base_q = PaymentService._movements_query(dinero_id, tipo)
 
         total = base_q.count()
         items = (
@@ -116,15 +356,7 @@ class PaymentService:
             .all()
         )
 
-        movimientos = [{
-            "motivo": p.motivo,
-            "monto": float(p.monto),
-            "signo": "-" if (p.tipo or "debito") == "debito" else "+",
-            "fecha": p.pagoFecha.isoformat() if p.pagoFecha else None,
-            "tipo": p.tipo or "debito",
-            "categoria": getattr(p, "categoria", None),
-            "metodo": getattr(p, "metodo", None),
-        } for p in items]
+        movimientos = [PaymentService.serialize_movement(p) for p in items]
 
         return {
             "page": page,
@@ -135,3 +367,41 @@ class PaymentService:
             "has_next": page * per_page < total,
             "movimientos": movimientos
         }
+
+    @staticmethod
+    def get_payments_by_cursor(dinero_id: int, cursor: str = None, per_page: int = 10,
+                               tipo: str = None, with_total: bool = False) -> dict:
+        """
+        Paginación por llave (pagoFecha, idPago): el costo de cada página no
+        depende de qué tan profundo esté el cliente. El total exacto sólo se
+        calcula si se pide con ``with_total``.
+        """
+        base_q = PaymentService._movements_query(dinero_id, tipo)
+        page_q = base_q
+
+        if cursor:
+            fecha, id_pago = PaymentService.decode_cursor(cursor)
+            page_q = page_q.filter(or_(
+                Pago.pagoFecha < fecha,
+                and_(Pago.pagoFecha == fecha, Pago.idPago < id_pago),
+            ))
+
+        # Pedimos uno extra para saber si hay más sin contar
+        items = (
+            page_q.order_by(Pago.pagoFecha.desc(), Pago.idPago.desc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_next = len(items) > per_page
+        items = items[:per_page]
+
+        result = {
+            "per_page": per_page,
+            "cursor": cursor or None,
+            "next_cursor": PaymentService.encode_cursor(items[-1]) if has_next else None,
+            "has_next": has_next,
+            "movimientos": [PaymentService.serialize_movement(p) for p in items]
+        }
+        if with_total:
+            result["total"] = base_q.count()
+        return result
@@ -0,0 +1,139 @@
+# services/pool_service.py
+"""
+Pool de conexiones de SQLAlchemy con métricas.
+
+``QueuePoolMedido`` es un QueuePool que mide cuánto tarda cada checkout
+(espera en la cola + pre-ping o conexión nueva) y cuenta los timeouts; las
+invalidaciones (p. ej. "MySQL server has gone away" detectado por el
+pre-ping) y conexiones nuevas se cuentan con eventos del pool. Las métricas
+sobreviven a ``engine.dispose()``.
+
+Las opciones del engine salen de config.SQLALCHEMY_ENGINE_OPTIONS (DB_POOL_*).
+"""
+from __future__ import annotations
+import threading
+import time
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.pool import QueuePool
+
+# Límites superiores de las cubetas del histograma de espera (ms)
+CUBETAS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class MetricasPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.conexiones = 0
+            self.invalidaciones = 0
+            self.invalidaciones_suaves = 0
+            self._cubetas = [0] * (len(CUBETAS_MS) + 1)
+            self._espera_total = 0.0
+            self._espera_max = 0.0
+
+    def registrar_espera(self, segundos: float) -> None:
+        ms = segundos * 1000
+        i = next((i for i, limite in enumerate(CUBETAS_MS) if ms <= limite), len(CUBETAS_MS))
+        with self._lock:
+            self.checkouts += 1
+            self._cubetas[i] += 1
+            self._espera_total += ms
+            self._espera_max = max(self._espera_max, ms)
+
+    def incrementar(self, campo: str) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            etiquetas = [f"<={limite}" for limite in CUBETAS_MS] + ["+inf"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "conexiones_nuevas": self.conexiones,
+                "invalidaciones": self.invalidaciones,
+                "invalidaciones_suaves": self.invalidaciones_suaves,
+                "espera_ms": {
+                    "promedio": round(self._espera_total / self.checkouts, 3) if self.checkouts else 0.0,
+                    "max": round(self._espera_max, 3),
+                    "histograma": dict(zip(etiquetas, self._cubetas)),
+                },
+            }
+
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que registra el tiempo de cada checkout en ``self.metricas``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metricas = MetricasPool()
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metricas.incrementar("timeouts")
+            raise
+        finally:
+            self.metricas.registrar_espera(time.perf_counter() - t0)
+
+    def recreate(self) -> "QueuePoolMedido":
+        # engine.dispose() crea un pool nuevo; las métricas siguen acumulando
+        nuevo = super().recreate()
+        nuevo.metricas = self.metricas
+        return nuevo
+
+
+def instalar_metricas(engine) -> None:
+    """Eventos de conexión/invalidación; se registran una vez por engine."""
+    if not isinstance(engine.pool, QueuePoolMedido) or getattr(engine, "_metricas_pool", False):
+        return
+
+    def contar(campo):
+        def listener(*_args):
+            engine.pool.metricas.incrementar(campo)
+        return listener
+
+    event.listen(engine, "connect", contar("conexiones"))
+    event.listen(engine, "invalidate", contar("invalidaciones"))
+    event.listen(engine, "soft_invalidate", contar("invalidaciones_suaves"))
+    engine._metricas_pool = True
+
+
+def estado_pool(engine) -> dict:
+    pool = engine.pool
+    estado = {"clase": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        estado.update({
+            "tamano": pool.size(),
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if isinstance(pool, QueuePoolMedido):
+        estado.update(pool.metricas.stats())
+    return estado
+
+
+def ping(engine) -> dict:
+    """SELECT 1 con una conexión del pool; nunca lanza."""
+    t0 = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        ok, error = True, None
+    except Exception as e:
+        ok, error = False, e.__class__.__name__
+    resultado = {"ok": ok, "ping_ms": round((time.perf_counter() - t0) * 1000, 3)}
+    if error:
+        resultado["error"] = error
+    return resultado
@@ -0,0 +1,185 @@
+# services/replica_service.py
+"""
+Lecturas en la réplica (bind "replica" de SQLALCHEMY_BINDS).
+
+Una ruta de sólo lectura pide la réplica con ``ReplicaService.decidir``; la
+petición se queda en el primario si:
+
+- no hay réplica configurada,
+- el usuario confirmó una escritura hace menos de REPLICA_PIN segundos
+  (read-your-writes: la app guarda ``primario_hasta`` en la sesión), o
+- la réplica va más de REPLICA_MAX_LAG segundos atrás o no se puede medir.
+
+El retraso se mide con SHOW REPLICA STATUS como mucho cada
+REPLICA_LAG_CHECK segundos por proceso, por un solo hilo a la vez y sin
+bloquear a los demás, que usan la última medición. La consulta tiene un
+timeout de lectura corto (REPLICA_LAG_TIMEOUT): si la réplica no contesta
+cuenta como retraso desconocido. Si el servidor no reporta estado
+de réplica (no es réplica, o se reconfiguró) el retraso no se puede medir y
+se lee del primario.
+
+Configuración:
+    MYSQL_REPLICA_HOST / MYSQL_REPLICA_PORT   ver config.py
+    REPLICA_MAX_LAG     segundos (2)
+    REPLICA_PIN         segundos en el primario tras escribir (5)
+    REPLICA_LAG_CHECK   segundos entre mediciones (2)
+    REPLICA_LAG_TIMEOUT segundos máximos de la medición (1)
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event, exc, text
+
+from models import db
+
+
+def timeout_medicion() -> float:
+    return float(os.getenv("REPLICA_LAG_TIMEOUT", "1"))
+
+
+@contextmanager
+def _timeout_lectura(conn, segundos: float):
+    """
+    Timeout de lectura del socket de PyMySQL sólo para esta consulta
+    (max_execution_time no aplica a SHOW). Con otro driver no hace nada.
+    """
+    dbapi = getattr(getattr(conn, "connection", None), "dbapi_connection", None)
+    if not hasattr(dbapi, "_read_timeout"):
+        yield
+        return
+    anterior = dbapi._read_timeout
+    dbapi._read_timeout = segundos
+    try:
+        yield
+    finally:
+        dbapi._read_timeout = anterior
+
+
+def medir_retraso(engine) -> Optional[float]:
+    """Segundos de retraso de la réplica; None si no se puede saber."""
+    if engine.dialect.name != "mysql":
+        return 0.0
+    try:
+        with engine.connect() as conn, _timeout_lectura(conn, timeout_medicion()):
+            try:
+                row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            except exc.ProgrammingError:
+                # MySQL < 8.0.22
+                row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+    except Exception:
+        return None
+    if row is None:
+        # Sin estado de réplica no hay forma de saber qué tan al día está
+        return None
+    retraso = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    # NULL: la replicación está detenida
+    return float(retraso) if retraso is not None else None
+
+
+class MonitorReplica:
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._medido_en = float("-inf")
+        self._retraso = None
+        self._midiendo = False
+        self.lecturas = {"replica": 0, "pin": 0, "retraso": 0}
+
+    def retraso(self, engine) -> Optional[float]:
+        with self._lock:
+            if self._midiendo or time.monotonic() - self._medido_en < self.intervalo:
+                return self._retraso
+            # Una sola medición aunque lleguen muchas peticiones; las demás
+            # siguen con el valor anterior mientras tanto
+            self._midiendo = True
+        retraso = None
+        try:
+            # Fuera del lock: es una vuelta de red a la réplica
+            retraso = medir_retraso(engine)
+        finally:
+            with self._lock:
+                self._retraso = retraso
+                self._medido_en = time.monotonic()
+                self._midiendo = False
+        return retraso
+
+    def contar(self, motivo: str) -> None:
+        with self._lock:
+            self.lecturas[motivo] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "retraso_s": self._retraso,
+                "max_lag": max_lag(),
+                "lecturas": dict(self.lecturas),
+            }
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def obtener_monitor() -> MonitorReplica:
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = MonitorReplica(float(os.getenv("REPLICA_LAG_CHECK", "2")))
+    return _monitor
+
+
+def max_lag() -> float:
+    return float(os.getenv("REPLICA_MAX_LAG", "2"))
+
+
+def pin_segundos() -> float:
+    return float(os.getenv("REPLICA_PIN", "5"))
+
+
+class ReplicaService:
+    @staticmethod
+    def configurada() -> bool:
+        return "replica" in db.engines
+
+    @staticmethod
+    def decidir(primario_hasta: float = 0) -> bool:
+        """True si esta petición puede leer de la réplica."""
+        if not ReplicaService.configurada():
+            return False
+        monitor = obtener_monitor()
+        if time.time() < primario_hasta:
+            monitor.contar("pin")
+            return False
+        retraso = monitor.retraso(db.engines["replica"])
+        if retraso is None or retraso > max_lag():
+            monitor.contar("retraso")
+            return False
+        monitor.contar("replica")
+        return True
+
+    @staticmethod
+    def en_replica() -> bool:
+        """Las lecturas de esta transacción pueden venir de la réplica."""
+        return bool(db.session.info.get("replica")) and not db.session.info.get("escritura")
+
+    @staticmethod
+    def escritura_confirmada() -> bool:
+        """True (una vez) si la petición hizo commit de alguna escritura."""
+        return db.session.info.pop("escritura_confirmada", False)
+
+
+@event.listens_for(db.session, "after_commit")
+def _confirmar_escritura(session) -> None:
+    if session.info.pop("escritura", False):
+        session.info["escritura_confirmada"] = True
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _descartar_escritura(session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop("escritura", None)
@@ -0,0 +1,138 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models import db  # noqa: E402
+from models.user import User  # noqa: E402,F401
+from models.pago import Pago  # noqa: E402,F401
+from models.historial import Historial  # noqa: E402,F401
+from models.dinero import Dinero  # noqa: E402,F401
+
+
+@pytest.fixture()
+def app(tmp_path):
+    """
+    App mínima con los modelos. Usa TEST_DATABASE_URL (p. ej. un MySQL de
+    pruebas) o, si no se define, un archivo SQLite temporal.
+    """
+    uri = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'test.db'}"
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if uri.startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def limpiar_caches() -> None:
+    """Vacía las cachés de proceso (identidad, dashboard)."""
+    from services.identidad_service import obtener_cache_identidad
+    from services.dashboard_service import obtener_cache_dashboard
+
+    for cache in (obtener_cache_identidad(), obtener_cache_dashboard()):
+        if cache is not None:
+            cache.clear()
+
+
+@pytest.fixture()
+def caches_limpias():
+    """
+    Los ids se repiten entre bases de prueba: las cachés de proceso no deben
+    sobrevivir. Regresa la función, para vaciarlas otra vez dentro de la prueba.
+    """
+    limpiar_caches()
+    return limpiar_caches
+
+
+@pytest.fixture()
+def api_app(tmp_path, caches_limpias):
+    """La app completa (create_app) sobre la misma base de pruebas."""
+    from app import create_app
+
+    uri = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'api.db'}"
+    config = {"SQLALCHEMY_DATABASE_URI": uri, "TESTING": True}
+    if uri.startswith("sqlite"):
+        config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    app = create_app(config)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def client(api_app):
+    return api_app.test_client()
+
+
+@pytest.fixture()
+def sentencias(api_app):
+    """Lista de las sentencias SQL ejecutadas mientras dura la prueba."""
+    from sqlalchemy import event
+
+    capturadas = []
+
+    def antes(conn, cursor, statement, params, context, executemany):
+        capturadas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", antes)
+    yield capturadas
+    event.remove(db.engine, "before_cursor_execute", antes)
+
+
+CORREO, CLAVE = "ana@example.com", "clave"
+
+
+@pytest.fixture()
+def crear_cuenta(monkeypatch):
+    """
+    Fábrica de la cuenta de pruebas (Ana Ruiz, ana@example.com / clave) con
+    su Dinero y un hash barato. Necesita un app context; regresa
+    (idUser, idDinero).
+    """
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+
+    def crear(saldo=500, deuda_credito=0) -> tuple:
+        u = User(nombre="Ana", apellido="Ruiz", correo=CORREO, contrasena="")
+        u.set_password(CLAVE)
+        db.session.add(u)
+        db.session.flush()
+        dinero = Dinero(saldo=saldo, deuda_credito=deuda_credito, idUser=u.idUser)
+        db.session.add(dinero)
+        db.session.commit()
+        return u.idUser, dinero.idDinero
+
+    return crear
+
+
+@pytest.fixture()
+def saldo_inicial():
+    """(saldo, deuda_credito) de ``cuenta``; un módulo de pruebas lo puede redefinir."""
+    return 500, 0
+
+
+@pytest.fixture()
+def cuenta(api_app, crear_cuenta, saldo_inicial):
+    """La cuenta de pruebas en la app completa: (idUser, idDinero)."""
+    return crear_cuenta(*saldo_inicial)
+
+
+@pytest.fixture()
+def sesion(client, cuenta):
+    """``client`` con la sesión de la cuenta de pruebas iniciada; regresa su idUser."""
+    r = client.post("/api/login", json={"correo": CORREO, "contrasena": CLAVE})
+    assert r.status_code == 200
+    return cuenta[0]
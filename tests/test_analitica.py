@@ -0,0 +1,114 @@
+# tests/test_analitica.py
+from datetime import date
+
+import pytest
+
+from models import db
+from models.pago import Pago
+from models.gasto_periodo import GastoDiario, GastoMensual
+from services.mantenimiento_service import MantenimientoService
+
+MOVIMIENTOS = [
+    {"motivo": "Súper", "monto": 100.10, "fecha": "2024-01-05", "categoria": "comida"},
+    {"motivo": "Café", "monto": 20.20, "fecha": "2024-01-05", "categoria": "comida"},
+    {"motivo": "Renta", "monto": 500, "fecha": "2024-01-31", "categoria": "hogar"},
+    {"motivo": "Nómina", "monto": 1000, "fecha": "2024-02-01", "tipo": "credito"},
+    {"motivo": "Cine", "monto": 80.05, "fecha": "2024-02-14"},
+    {"motivo": "Taxi", "monto": 0.10, "fecha": "2024-02-14"},
+]
+
+
+@pytest.fixture()
+def saldo_inicial():
+    return 10_000, 0
+
+
+@pytest.fixture()
+def movimientos(client, sesion):
+    # Dos lotes: el segundo suma sobre llaves que ya existen
+    assert client.post("/api/pagos/batch", json=MOVIMIENTOS[:2]).status_code < 400
+    assert client.post("/api/pagos/batch", json=MOVIMIENTOS[2:]).status_code < 400
+
+
+def _acumulados(user_id: int) -> dict:
+    db.session.expire_all()
+    return {
+        modelo.__tablename__: sorted(
+            (getattr(f, campo), f.categoria, f.tipo, f.total, f.conteo)
+            for f in db.session.query(modelo).filter_by(idUser=user_id)
+        )
+        for modelo, campo in ((GastoDiario, "dia"), (GastoMensual, "mes"))
+    }
+
+
+def test_pagos_acumulan_en_linea(sesion, movimientos):
+    mensual = _acumulados(sesion)["gasto_mensual"]
+    assert [(m, c, t, str(total), n) for m, c, t, total, n in mensual] == [
+        (date(2024, 1, 1), "comida", "debito", "120.30", 2),
+        (date(2024, 1, 1), "hogar", "debito", "500.00", 1),
+        (date(2024, 2, 1), "", "credito", "1000.00", 1),
+        (date(2024, 2, 1), "", "debito", "80.15", 2),
+    ]
+    diario = _acumulados(sesion)["gasto_diario"]
+    assert (date(2024, 1, 5), "comida", "debito") in {f[:3] for f in diario}
+    assert sum(f[4] for f in diario) == len(MOVIMIENTOS)
+
+
+def test_reconstruir_coincide_con_lo_incremental(client, sesion, movimientos):
+    client.post("/api/pago", json={"motivo": "Hoy", "monto": 12.34, "categoria": "comida"})
+    client.post("/api/pagar_tarjeta", json={"monto": 1})
+    esperado = _acumulados(sesion)
+
+    db.session.execute(db.delete(GastoDiario))
+    db.session.execute(db.update(GastoMensual).values(total=0, conteo=0))
+    db.session.commit()
+
+    progresos = []
+    res = MantenimientoService.reconstruir_gastos(lote=1, reportar=progresos.append)
+
+    assert res["revisados"] == db.session.query(Pago).count()
+    assert progresos[-1]["ultimo_id"] == sesion
+    assert _acumulados(sesion) == esperado
+
+
+def test_analytics_mensual(client, movimientos):
+    r = client.get("/api/analytics?desde=2024-01&hasta=2024-02")
+    assert r.status_code == 200
+    assert r.json["periodo"] == "mensual"
+    assert (r.json["desde"], r.json["hasta"]) == ("2024-01-01", "2024-02-29")
+
+    enero, febrero = r.json["periodos"]
+    assert enero == {"periodo": "2024-01", "debito": 620.3, "credito": 0.0, "conteo": 3,
+                     "categorias": {"comida": 120.3, "hogar": 500.0}}
+    assert febrero["credito"] == 1000.0 and febrero["debito"] == 80.15
+    assert [c["categoria"] for c in r.json["categorias"]] == ["sin_categoria", "hogar", "comida"]
+
+
+def test_analytics_diario(client, movimientos):
+    r = client.get("/api/analytics?periodo=diario&desde=2024-02-01&hasta=2024-02-14")
+    assert [p["periodo"] for p in r.json["periodos"]] == ["2024-02-01", "2024-02-14"]
+    assert r.json["periodos"][1]["conteo"] == 2
+
+    assert client.get("/api/analytics").json["periodos"] == []  # últimos 12 meses
+
+
+@pytest.mark.parametrize("query", [
+    "periodo=semanal",
+    "desde=2024/01",
+    "desde=2024-13",
+    "desde=2024-03&hasta=2024-01",
+    "periodo=diario&desde=2023-01-01&hasta=2024-01-02",  # 367 días
+])
+def test_analytics_parametros_invalidos(client, movimientos, query):
+    assert client.get(f"/api/analytics?{query}").status_code == 400
+
+
+def test_analytics_lee_solo_los_acumulados(client, movimientos, sentencias):
+    sentencias.clear()
+    client.get("/api/analytics?desde=2024-01")
+    assert not any("pagos" in s for s in sentencias)
+    assert sum("gasto_mensual" in s for s in sentencias) == 1
+
+
+def test_analytics_requiere_sesion(client):
+    assert client.get("/api/analytics").status_code == 401
@@ -0,0 +1,87 @@
+import pytest
+
+from models import db
+
+
+@pytest.fixture()
+def app_memoria(monkeypatch, caches_limpias):
+    """App completa sobre SQLite en memoria, preparada con bootstrap()."""
+    from app import create_app
+    from bootstrap import bootstrap
+
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "TESTING": True})
+    bootstrap(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_flujo_completo_en_memoria(app_memoria):
+    client = app_memoria.test_client()
+    assert client.get("/health").json["db"]["ok"] is True
+
+    # Usuario sembrado por bootstrap
+    r = client.post("/api/login", json={"correo": "carlos@example.com", "contrasena": "1234"})
+    assert r.status_code == 200
+    assert client.get("/api/saldo").json["saldo"] == 4200
+
+    r = client.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    assert r.json["nuevo_saldo"] == 4150
+    r = client.post("/api/pagar_tarjeta", json={"monto": 200})
+    assert r.json["nueva_deuda_credito"] == 1000
+    r = client.post("/api/pagos/batch", json=[{"motivo": "Lote", "monto": 10}, {"motivo": "", "monto": 1}])
+    assert r.json["insertados"] == 1 and r.json["rechazados"] == 1
+
+    data = client.get("/api/dashboard").json
+    assert data["saldo"] == 3940
+    assert data["movimientos"][0]["motivo"] == "Lote"
+    assert len(client.get("/api/movimientos?per_page=50").json["movimientos"]) == 6
+
+    r = client.post("/api/register", json={
+        "nombre": "Bea", "apellido": "Sol", "correo": "bea@example.com", "contrasena": "clave",
+    })
+    assert r.status_code == 201
+
+
+def test_bootstrap_es_idempotente(app_memoria):
+    from bootstrap import migrar, sembrar
+    assert migrar() == 0
+    assert sembrar() is False
+
+
+@pytest.mark.parametrize("metodo", ["scrypt", "pbkdf2:sha512:1000"])
+def test_bootstrap_no_rehashea_otros_metodos(monkeypatch, caches_limpias, metodo):
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from bootstrap import bootstrap
+    from models.user import User
+
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", metodo)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "TESTING": True})
+    bootstrap(app)
+    client = app.test_client()
+    with app.app_context():
+        db.session.add_all([
+            User(nombre="Leo", correo="leo@example.com", contrasena="plano"),
+            User(nombre="Eva", correo="eva@example.com",
+                 contrasena=generate_password_hash("otra", method="pbkdf2:sha256:1000")),
+        ])
+        db.session.commit()
+        hash_semilla = User.query.filter_by(correo="carlos@example.com").one().contrasena
+        assert hash_semilla.startswith(metodo.split(":")[0])
+
+    try:
+        bootstrap(app)
+        with app.app_context():
+            assert User.query.filter_by(correo="carlos@example.com").one().contrasena == hash_semilla
+            assert User.query.filter_by(correo="leo@example.com").one().contrasena.startswith(metodo)
+        for correo, clave in (("carlos@example.com", "1234"), ("leo@example.com", "plano"),
+                              ("eva@example.com", "otra")):
+            r = client.post("/api/login", json={"correo": correo, "contrasena": clave})
+            assert r.status_code == 200, correo
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
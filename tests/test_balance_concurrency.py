@@ -0,0 +1,121 @@
+# tests/test_balance_concurrency.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from models import db
+from models.dinero import Dinero
+from models.user import User
+from services.balance_service import BalanceService
+
+DEBITOS = 300
+WORKERS = 16
+
+# SQLite en memoria comparte una sola conexión entre hilos: no hay concurrencia real
+pytestmark = pytest.mark.skipif(
+    os.getenv("TEST_DATABASE_URL", "").rstrip("/") in ("sqlite:", "sqlite:///:memory:"),
+    reason="requiere una base con conexiones independientes",
+)
+
+
+def _crear_cuenta(saldo, deuda=0):
+    user = User(nombre="Stress", correo="stress@example.com", contrasena="x")
+    db.session.add(user)
+    db.session.flush()
+    dinero = Dinero(saldo=saldo, deuda_credito=deuda, idUser=user.idUser)
+    db.session.add(dinero)
+    db.session.commit()
+    return dinero.idDinero
+
+
+def _en_paralelo(app, fn, veces):
+    def tarea(_):
+        with app.app_context():
+            try:
+                return fn()
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(tarea, range(veces)))
+
+
+def test_debitos_paralelos_no_se_pisan(app):
+    # Alcanza para 200 de los 300 débitos de 1.00
+    id_dinero = _crear_cuenta(saldo=200)
+
+    def debitar():
+        dinero = db.session.get(Dinero, id_dinero)
+        try:
+            BalanceService.update_balance(dinero, 1.0, "debito")
+            db.session.commit()
+            return True
+        except ValueError:
+            db.session.rollback()
+            return False
+
+    resultados = _en_paralelo(app, debitar, DEBITOS)
+
+    db.session.expire_all()
+    final = db.session.get(Dinero, id_dinero)
+    assert sum(resultados) == 200
+    assert final.saldo == Decimal("0.00")
+
+
+def test_pagos_de_tarjeta_paralelos_son_exactos(app):
+    id_dinero = _crear_cuenta(saldo=1000, deuda=150)
+
+    def pagar():
+        dinero = db.session.get(Dinero, id_dinero)
+        try:
+            result = BalanceService.pay_credit_card(dinero, 1.0)
+            db.session.commit()
+            return result["pagable"]
+        except ValueError:
+            db.session.rollback()
+            return 0
+
+    pagado = sum(_en_paralelo(app, pagar, DEBITOS))
+
+    db.session.expire_all()
+    final = db.session.get(Dinero, id_dinero)
+    assert pagado == 150
+    assert final.deuda_credito == Decimal("0.00")
+    assert final.saldo == Decimal("850.00")
+
+
+def test_pago_de_tarjeta_con_lectura_vieja_reintenta(app):
+    """Dos pagos compiten: el primero leyó la deuda antes de que el otro la bajara."""
+    id_dinero = _crear_cuenta(saldo=1000, deuda=150)
+    dinero = db.session.get(Dinero, id_dinero)
+    assert dinero.deuda_credito == Decimal("150.00")  # foto de esta transacción
+
+    def otro_pago():
+        otra = db.session.get(Dinero, id_dinero)
+        BalanceService.pay_credit_card(otra, 100)
+        db.session.commit()
+
+    _en_paralelo(app, otro_pago, 1)
+
+    result = BalanceService.pay_credit_card(dinero, 100)
+    db.session.commit()
+    assert result["pagable"] == 50 and result["ajustado"] is True
+
+    db.session.expire_all()
+    final = db.session.get(Dinero, id_dinero)
+    assert final.deuda_credito == Decimal("0.00")
+    assert final.saldo == Decimal("850.00")
+
+
+def test_debito_sin_fondos_no_modifica_saldo(app):
+    id_dinero = _crear_cuenta(saldo=10)
+    dinero = db.session.get(Dinero, id_dinero)
+
+    with pytest.raises(ValueError, match="Saldo insuficiente"):
+        BalanceService.update_balance(dinero, 10.01, "debito")
+
+    BalanceService.update_balance(dinero, 10, "debito")
+    db.session.commit()
+    assert dinero.saldo == Decimal("0.00")
@@ -0,0 +1,63 @@
+# tests/test_batch.py
+import pytest
+
+from models import db
+from models.dinero import Dinero
+from models.pago import Pago
+
+INVALIDOS = {
+    "monto_nan": {"motivo": "NaN", "monto": float("nan")},
+    "monto_inf": {"motivo": "Infinito", "monto": float("inf")},
+    "monto_enorme": {"motivo": "Enorme", "monto": 10**12},
+    "monto_bool": {"motivo": "Booleano", "monto": True},
+    "motivo_objeto": {"motivo": {"a": 1}, "monto": 5},
+    "motivo_largo": {"motivo": "x" * 201, "monto": 5},
+    "categoria_objeto": {"motivo": "Categoría", "monto": 5, "categoria": {"a": 1}},
+    "categoria_larga": {"motivo": "Categoría", "monto": 5, "categoria": "c" * 61},
+    "tipo_lista": {"motivo": "Tipo", "monto": 5, "tipo": ["debito"]},
+    "referencia_larga": {"motivo": "Referencia", "monto": 5, "referencia": "r" * 81},
+    "notas_numero": {"motivo": "Notas", "monto": 5, "notas": 7},
+    "fecha": {"motivo": "Fecha", "monto": 5, "fecha": "ayer"},
+}
+
+
+@pytest.mark.parametrize("invalido", list(INVALIDOS.values()), ids=list(INVALIDOS))
+def test_un_renglon_invalido_no_tumba_el_lote(client, sesion, invalido):
+    r = client.post("/api/pagos/batch", json=[
+        {"motivo": "Antes", "monto": 10, "categoria": "comida"},
+        invalido,
+        {"motivo": "Después", "monto": 20, "tipo": "credito"},
+    ])
+    assert r.status_code == 200, r.get_data(as_text=True)
+    assert r.json["insertados"] == 2
+    assert [e["indice"] for e in r.json["errores"]] == [1]
+    assert r.json["nuevo_saldo"] == 490
+
+    db.session.expire_all()
+    assert {p.motivo for p in Pago.query.all()} == {"Antes", "Después"}
+    assert Dinero.query.filter_by(idUser=sesion).one().saldo == 490
+
+
+def test_textos_se_recortan_y_caben(client, sesion):
+    r = client.post("/api/pagos/batch", json=[
+        {"motivo": "  " + "m" * 200 + "  ", "monto": "1.005", "tipo": " CREDITO ", "categoria": ""},
+    ])
+    assert r.json["insertados"] == 1
+    pago = Pago.query.one()
+    assert len(pago.motivo) == 200 and pago.tipo == "credito" and pago.categoria is None
+
+
+def test_sin_ids_consecutivos_inserta_fila_por_fila(client, sesion, monkeypatch):
+    # Como MySQL con auto_increment_increment > 1 o innodb_autoinc_lock_mode = 2
+    from services.payment_service import PaymentService
+    from models.historial import Historial
+
+    monkeypatch.setattr(db.engine.dialect, "insert_returning", False)
+    monkeypatch.setattr(PaymentService, "_ids_consecutivos", staticmethod(lambda: False))
+    r = client.post("/api/pagos/batch", json=[{"motivo": f"L{i}", "monto": 1 + i} for i in range(4)])
+    assert r.json["insertados"] == 4
+
+    db.session.expire_all()
+    por_id = {p.idPago: p.motivo for p in Pago.query.all()}
+    historial = [por_id[h.idPago] for h in Historial.query.order_by(Historial.idPago)]
+    assert historial == ["L0", "L1", "L2", "L3"]
@@ -0,0 +1,29 @@
+from benchmarks.carga import ClienteLocal, comparar, correr
+from benchmarks.dataset import generar
+from models.pago import Pago
+from models.estadistica_gasto import EstadisticaGasto
+
+
+def test_dataset_y_carga_en_proceso(api_app, monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    resumen = generar(5, 20, usuarios_por_lote=2)
+    assert resumen["pagos"] == 100
+    assert Pago.query.count() == 100
+    assert EstadisticaGasto.query.count() == 5
+
+    resultado = correr(lambda: ClienteLocal(api_app), {"dashboard": 1, "movimientos": 1, "pago": 1},
+                       n_usuarios=5, hilos=2, duracion=0.3)
+    assert resultado["total"]["peticiones"] > 0
+    assert resultado["total"]["errores"] == 0
+    assert set(resultado["rutas"]) == {"dashboard", "movimientos", "pago"}
+    assert {"rps", "p50_ms", "p95_ms", "p99_ms"} <= set(resultado["rutas"]["dashboard"])
+
+
+def test_comparar_detecta_regresiones():
+    base = {"rutas": {"dashboard": {"peticiones": 10, "p95_ms": 10.0, "rps": 100.0}}}
+    igual = {"rutas": {"dashboard": {"peticiones": 10, "p95_ms": 11.0, "rps": 95.0}}}
+    peor = {"rutas": {"dashboard": {"peticiones": 10, "p95_ms": 20.0, "rps": 50.0}}}
+    assert comparar(igual, base, 0.2) == []
+    assert [r["metrica"] for r in comparar(peor, base, 0.2)] == ["p95_ms", "rps"]
@@ -0,0 +1,150 @@
+# tests/test_consultas.py
+"""
+Presupuesto de sentencias SQL por ruta, con las cachés de proceso frías.
+
+Cada ruta corre contra un usuario con pocos y con muchos movimientos: el
+número de sentencias debe ser el mismo en ambos casos (sin N+1) y no pasar
+del máximo de la tabla. Si una ruta se sale, el error lista las sentencias.
+
+Los máximos incluyen el backfill de EstadisticaGasto en la primera
+evaluación o pago del usuario. Si una ruta baja, se baja su máximo. Hay
+una segunda columna para bases sin RETURNING (MySQL), donde el UPDATE de
+saldo relee la fila; en SQLite se comprueba apagando RETURNING.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from models import db
+from models.pago import Pago
+from models.historial import Historial
+from models.user import User
+
+EVALUAR = {"saldo": 5000, "suscripciones": 1, "esencial": 1, "nuevo_gasto": 100}
+
+# (método, ruta, cuerpo, máximo de sentencias, máximo sin RETURNING)
+RUTAS = [
+    ("GET", "/", None, 0, 0),
+    ("GET", "/dashboard.html", None, 0, 0),
+    ("GET", "/health", None, 1, 1),
+    ("GET", "/health/db", None, 0, 0),
+    ("GET", "/health/gpt", None, 0, 0),
+    ("GET", "/health/replica", None, 0, 0),
+    ("GET", "/health/hash", None, 0, 0),
+    ("GET", "/health/eventos", None, 0, 0),
+    ("GET", "/metrics", None, 0, 0),
+    ("POST", "/api/login", {"correo": "ana@example.com", "contrasena": "clave"}, 4, 4),
+    ("POST", "/api/register", {"nombre": "Luis", "apellido": "Paz", "correo": "luis@example.com",
+                               "contrasena": "clave", "saldo_inicial": 10}, 5, 5),
+    ("POST", "/api/logout", None, 0, 0),
+    ("GET", "/api/me", None, 1, 1),
+    ("POST", "/api/evaluar", EVALUAR, 6, 6),
+    ("POST", "/api/evaluar/stream", EVALUAR, 6, 6),
+    ("POST", "/api/evaluar/limite", {**EVALUAR, "candidatos": [10, 100, 1000]}, 6, 6),
+    ("POST", "/api/pago", {"motivo": "Café", "monto": 45, "tipo": "debito", "categoria": "comida"}, 12, 13),
+    ("POST", "/api/pago", {"motivo": "Cine", "monto": 120, "tipo": "credito"}, 12, 13),
+    ("POST", "/api/pagos/batch", [{"motivo": f"L{i}", "monto": 5 + i} for i in range(5)], 13, 17),
+    ("POST", "/api/pagar_tarjeta", {"monto": 10}, 12, 13),
+    ("GET", "/api/saldo", None, 2, 2),
+    ("GET", "/api/eventos", None, 2, 2),
+    ("GET", "/api/dashboard", None, 2, 2),
+    ("GET", "/api/dashboard/{user_id}", None, 1, 1),
+    ("GET", "/api/movimientos?page=2&per_page=10", None, 3, 3),
+    ("GET", "/api/movimientos?page=1&per_page=10&tipo=credito", None, 3, 3),
+    ("GET", "/api/movimientos?cursor=&per_page=10", None, 2, 2),
+    ("GET", "/api/movimientos?cursor=&per_page=10&total=1", None, 3, 3),
+    ("GET", "/api/movimientos/export?format=csv", None, 2, 2),
+    ("GET", "/api/movimientos/export?format=ndjson&desde=2000-01-01", None, 2, 2),
+    ("GET", "/api/analytics", None, 2, 2),
+    ("GET", "/api/analytics?periodo=diario&desde=2000-01-01&hasta=2000-06-30", None, 2, 2),
+    ("POST", "/api/transferir", {"clabe": "0" * 18, "monto": 100, "concepto": "renta"}, 12, 13),
+]
+
+
+def _sembrar(crear_cuenta, n_movimientos: int) -> int:
+    user_id, dinero_id = crear_cuenta(saldo=100_000, deuda_credito=500)
+    hoy = date.today()
+    for i in range(n_movimientos):
+        p = Pago(idUser=user_id, idDinero=dinero_id, motivo=f"m{i}", monto=10 + i, tipo="credito" if i % 4 == 0 else "debito",
+                 pagoFecha=hoy - timedelta(days=n_movimientos - i), categoria="hogar")
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Historial(idDinero=dinero_id, idPago=p.idPago))
+    db.session.commit()
+    return user_id
+
+
+def _contar(client, sentencias, limpiar_caches, metodo: str, ruta: str, cuerpo) -> list:
+    limpiar_caches()
+    db.session.remove()
+    sentencias.clear()
+    if metodo == "GET":
+        r = client.get(ruta)
+    else:
+        r = client.post(ruta, json=cuerpo)
+    if r.mimetype != "text/event-stream":
+        r.get_data()  # los streams de eventos no terminan; basta con los headers
+    r.close()
+    assert r.status_code < 400, (ruta, r.status_code, r.get_data(as_text=True)[:200])
+    return list(sentencias)
+
+
+@pytest.fixture(params=["returning", "sin_returning"])
+def con_returning(request, api_app, monkeypatch) -> bool:
+    """
+    Corre cada ruta con y sin RETURNING. Sin RETURNING (MySQL) cada UPDATE
+    de saldo relee la fila; en SQLite se simula apagándolo en el dialecto.
+    """
+    dialecto = db.engine.dialect
+    if request.param == "returning":
+        if not dialecto.update_returning:
+            pytest.skip("el dialecto no tiene RETURNING")
+        return True
+    if dialecto.update_returning:
+        monkeypatch.setattr(dialecto, "update_returning", False)
+        monkeypatch.setattr(dialecto, "insert_returning", False)
+        # El peor caso de MySQL: sin ids consecutivos el lote inserta fila por fila
+        from services.payment_service import PaymentService
+        monkeypatch.setattr(PaymentService, "_ids_consecutivos", staticmethod(lambda: False))
+    return False
+
+
+@pytest.mark.parametrize(
+    "metodo,ruta,cuerpo,maximo,maximo_sin_returning", RUTAS,
+    ids=[f"{m} {r}" for m, r, *_ in RUTAS],
+)
+def test_presupuesto_de_sentencias(api_app, sentencias, crear_cuenta, caches_limpias, monkeypatch,
+                                   con_returning, metodo, ruta, cuerpo, maximo, maximo_sin_returning):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("EVENTOS_SSE", "1")
+    if not con_returning:
+        maximo = maximo_sin_returning
+
+    conteos = {}
+    for n in (3, 40):
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        user_id = _sembrar(crear_cuenta, n)
+        client = api_app.test_client()
+        client.post("/api/login", json={"correo": "ana@example.com", "contrasena": "clave"})
+        # last_login_at tiene resolución de segundos: si el segundo login cae
+        # en el mismo segundo no hay UPDATE y el conteo dependería del reloj
+        db.session.execute(db.update(User).values(last_login_at=None))
+        db.session.commit()
+        conteos[n] = _contar(client, sentencias, caches_limpias, metodo, ruta.format(user_id=user_id), cuerpo)
+
+    pocos, muchos = conteos[3], conteos[40]
+    listado = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(muchos))
+    assert len(pocos) == len(muchos), (
+        f"{metodo} {ruta}: {len(pocos)} sentencias con 3 movimientos y {len(muchos)} con 40 "
+        f"(¿N+1?):\n{listado}"
+    )
+    assert len(muchos) <= maximo, (
+        f"{metodo} {ruta}: {len(muchos)} sentencias, presupuesto {maximo}:\n{listado}"
+    )
+
+
+def test_todas_las_rutas_tienen_presupuesto(api_app):
+    cubiertas = {ruta.split("?")[0].replace("{user_id}", "<int:user_id>") for _, ruta, *_ in RUTAS}
+    rutas = {r.rule for r in api_app.url_map.iter_rules() if r.endpoint.startswith("api.")}
+    assert rutas - cubiertas == set(), "rutas nuevas sin presupuesto de sentencias en RUTAS"
@@ -0,0 +1,102 @@
+# tests/test_dashboard.py
+from datetime import date, timedelta
+
+import pytest
+
+from models import db
+from models.user import User
+from models.dinero import Dinero
+from models.pago import Pago
+from models.historial import Historial
+
+
+@pytest.fixture()
+def saldo_inicial():
+    return 1000, 50
+
+
+@pytest.fixture()
+def usuario(client, cuenta, sesion):
+    user_id, dinero_id = cuenta
+    hoy = date.today()
+    for i in range(15):
+        p = Pago(idUser=user_id, idDinero=dinero_id, motivo=f"m{i}", monto=10 + i, tipo="debito",
+                 pagoFecha=hoy - timedelta(days=15 - i), categoria="hogar")
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(Historial(idDinero=dinero_id, idPago=p.idPago))
+    db.session.commit()
+    client.get("/api/me")  # identidad en caché
+    return user_id
+
+
+def test_dashboard_en_una_consulta_y_luego_desde_cache(client, usuario, sentencias):
+    sentencias.clear()
+    r = client.get("/api/dashboard")
+    assert r.status_code == 200
+    assert len(sentencias) == 1
+
+    data = r.json
+    assert data["usuario"] == "Ana Ruiz"
+    assert data["saldo"] == 1000 and data["deuda_credito"] == 50
+    assert [m["motivo"] for m in data["movimientos"]] == [f"m{i}" for i in range(14, 4, -1)]
+    assert data["movimientos"][0]["signo"] == "-"
+
+    # Repetido: sólo se confirma la versión, sin leer movimientos
+    sentencias.clear()
+    assert client.get("/api/dashboard").json == data
+    assert len(sentencias) == 1 and "pagos" not in sentencias[0]
+
+
+def test_pago_en_otro_worker_rearma_el_snapshot(client, usuario):
+    client.get("/api/dashboard")
+
+    # Otro worker: escribe sin pasar por las cachés de este proceso
+    dinero = Dinero.query.filter_by(idUser=usuario).one()
+    with db.engine.begin() as conn:
+        conn.execute(db.insert(Pago).values(
+            idUser=usuario, idDinero=dinero.idDinero, motivo="Otro worker", monto=1,
+            tipo="debito", pagoFecha=date.today(),
+        ))
+        conn.execute(
+            db.update(Dinero).where(Dinero.idUser == usuario)
+            .values(saldo=Dinero.saldo - 1, version=Dinero.version + 1)
+        )
+
+    data = client.get("/api/dashboard").json
+    assert data["saldo"] == 999
+    assert data["movimientos"][0]["motivo"] == "Otro worker"
+
+
+def test_escrituras_invalidan_el_snapshot(client, usuario):
+    client.get("/api/dashboard")
+
+    client.post("/api/pago", json={"motivo": "Nuevo", "monto": 100, "tipo": "debito"})
+    data = client.get("/api/dashboard").json
+    assert data["saldo"] == 900
+    assert data["movimientos"][0]["motivo"] == "Nuevo"
+
+    client.post("/api/pagar_tarjeta", json={"monto": 50})
+    data = client.get("/api/dashboard").json
+    assert data["saldo"] == 850 and data["deuda_credito"] == 0
+
+    client.post("/api/pagos/batch", json=[{"motivo": "Lote", "monto": 5, "tipo": "credito"}])
+    assert client.get("/api/dashboard").json["movimientos"][0]["motivo"] == "Lote"
+
+    # Un pago rechazado no deja la caché sin llenar para siempre
+    assert client.post("/api/pago", json={"motivo": "X", "monto": 10**6}).status_code == 400
+    client.get("/api/dashboard")
+    assert client.get("/api/dashboard").json["saldo"] == 850
+
+
+def test_dashboard_sin_movimientos_y_usuario_inexistente(client):
+    u = User(nombre="Beto", apellido="", correo="b@example.com", contrasena="x")
+    db.session.add(u)
+    db.session.flush()
+    db.session.add(Dinero(saldo=0, deuda_credito=0, idUser=u.idUser))
+    db.session.commit()
+
+    data = client.get(f"/api/dashboard/{u.idUser}").json
+    assert data["usuario"] == "Beto"
+    assert data["movimientos"] == []
+    assert client.get("/api/dashboard/999").status_code == 404
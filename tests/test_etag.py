@@ -0,0 +1,94 @@
+import pytest
+
+from models import db
+from models.dinero import Dinero
+
+
+@pytest.fixture()
+def sesion(sesion, client):
+    client.get("/api/me")  # identidad en caché
+    return sesion
+
+
+def _pago_de_otro_worker(user_id: int, monto: int) -> None:
+    """Cambia el saldo sin pasar por este proceso (sin invalidar sus cachés)."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            db.update(Dinero)
+            .where(Dinero.idUser == user_id)
+            .values(saldo=Dinero.saldo - monto, version=Dinero.version + 1)
+        )
+
+
+def test_saldo_304_con_una_consulta(client, sesion, sentencias):
+    r = client.get("/api/saldo")
+    etag = r.headers["ETag"]
+    assert r.json["version"] == 1
+    assert r.headers["Cache-Control"] == "private, no-cache"
+
+    sentencias.clear()
+    r = client.get("/api/saldo", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+    assert len(sentencias) == 1 and "FROM dinero" in sentencias[0]
+
+
+def test_saldo_cambiado_en_otro_worker(client, sesion):
+    etag = client.get("/api/saldo").headers["ETag"]
+    _pago_de_otro_worker(sesion, 100)
+
+    r = client.get("/api/saldo", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json["saldo"] == 400 and r.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("ruta", ["/api/saldo", "/api/dashboard"])
+def test_cada_escritura_cambia_el_etag(client, sesion, ruta):
+    etags = [client.get(ruta).headers["ETag"]]
+
+    client.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    etags.append(client.get(ruta, headers={"If-None-Match": etags[-1]}).headers["ETag"])
+
+    client.post("/api/pago", json={"motivo": "Tienda", "monto": 30, "tipo": "credito"})
+    etags.append(client.get(ruta, headers={"If-None-Match": etags[-1]}).headers["ETag"])
+
+    client.post("/api/pagar_tarjeta", json={"monto": 30})
+    etags.append(client.get(ruta, headers={"If-None-Match": etags[-1]}).headers["ETag"])
+
+    client.post("/api/pagos/batch", json=[{"motivo": "Lote", "monto": 5}])
+    r = client.get(ruta, headers={"If-None-Match": etags[-1]})
+    assert r.status_code == 200
+    etags.append(r.headers["ETag"])
+
+    assert len(set(etags)) == 5
+    assert client.get(ruta, headers={"If-None-Match": etags[-1]}).status_code == 304
+
+
+def test_version_en_la_base(client, sesion):
+    client.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    client.post("/api/pagos/batch", json=[{"motivo": "Lote", "monto": 5}])
+    db.session.expire_all()
+    assert Dinero.query.filter_by(idUser=sesion).one().version == 3
+
+
+def test_pago_rechazado_conserva_el_etag(client, sesion):
+    etag = client.get("/api/saldo").headers["ETag"]
+    assert client.post("/api/pago", json={"motivo": "X", "monto": 10**6}).status_code == 400
+    assert client.get("/api/saldo", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_dashboard_304_desde_el_snapshot(client, sesion, sentencias):
+    etag = client.get("/api/dashboard").headers["ETag"]
+    sentencias.clear()
+    r = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert len(sentencias) == 1 and "pagos" not in sentencias[0]
+
+
+def test_dashboard_cambiado_en_otro_worker(client, sesion):
+    etag = client.get("/api/dashboard").headers["ETag"]
+    _pago_de_otro_worker(sesion, 100)
+
+    r = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json["saldo"] == 400 and r.headers["ETag"] != etag
@@ -0,0 +1,134 @@
+# tests/test_evaluar.py
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.conftest import CLAVE, CORREO
+from models import db
+from models.estadistica_gasto import EstadisticaGasto
+from models.pago import Pago
+from ml.model import evaluar_gasto, limite_gasto_seguro
+from services.estadistica_service import EstadisticaService
+
+EVALUAR = {"saldo": 5000, "suscripciones": 1, "esencial": 1, "nuevo_gasto": 100}
+RUTAS = ["/api/evaluar", "/api/evaluar/stream", "/api/evaluar/limite"]
+SQLITE_MEMORIA = os.getenv("TEST_DATABASE_URL", "").rstrip("/") in ("sqlite:", "sqlite:///:memory:")
+
+
+@pytest.fixture(autouse=True)
+def sin_openai(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+def _sembrar_pagos(user_id: int, dinero_id: int, montos) -> None:
+    inicio = datetime(2024, 1, 1)
+    for i, monto in enumerate(montos):
+        db.session.add(Pago(idUser=user_id, idDinero=dinero_id, motivo=f"p{i}", monto=monto,
+                            tipo="debito", pagoFecha=inicio + timedelta(days=i)))
+    db.session.commit()
+
+
+@pytest.mark.parametrize("ruta", RUTAS)
+def test_sin_sesion_no_evalua_ni_crea_estadisticas(client, cuenta, ruta):
+    r = client.post(ruta, json={**EVALUAR, "idUser": cuenta[0]})
+    assert r.status_code == 401
+    r = client.post(ruta, json={**EVALUAR, "idUser": 99999})
+    assert r.status_code == 401
+    assert db.session.query(EstadisticaGasto).count() == 0
+
+
+@pytest.mark.parametrize("ruta", RUTAS)
+def test_idUser_ajeno_se_rechaza(client, sesion, ruta):
+    r = client.post(ruta, json={**EVALUAR, "idUser": sesion + 1})
+    assert r.status_code == 403
+    assert db.session.query(EstadisticaGasto).count() == 0
+
+    r = client.post(ruta, json={**EVALUAR, "idUser": sesion})
+    assert r.status_code == 200
+    assert db.session.get(EstadisticaGasto, sesion) is not None
+
+
+def test_usuario_inexistente_no_crea_fila(api_app):
+    resumen = EstadisticaService.obtener_resumen(99999)
+    db.session.commit()
+    assert resumen["conteo"] == 0
+    assert db.session.query(EstadisticaGasto).count() == 0
+
+
+@pytest.mark.skipif(SQLITE_MEMORIA, reason="requiere una base con conexiones independientes")
+def test_primeras_evaluaciones_simultaneas_crean_una_fila(api_app, cuenta):
+    user_id, dinero_id = cuenta
+    montos = [10, 20, 30, 40, 50, 60, 70]
+    _sembrar_pagos(user_id, dinero_id, montos)
+
+    clientes = []
+    for _ in range(8):
+        c = api_app.test_client()
+        assert c.post("/api/login", json={"correo": CORREO, "contrasena": CLAVE}).status_code == 200
+        clientes.append(c)
+
+    with ThreadPoolExecutor(max_workers=len(clientes)) as pool:
+        codigos = list(pool.map(lambda c: c.post("/api/evaluar", json=EVALUAR).status_code, clientes))
+
+    assert codigos == [200] * len(clientes)
+    db.session.expire_all()
+    filas = db.session.query(EstadisticaGasto).all()
+    assert len(filas) == 1
+    assert filas[0].conteo == len(montos) and float(filas[0].suma) == sum(montos)
+
+
+def _caso(semilla: int) -> dict:
+    azar = random.Random(semilla)
+    return {
+        "saldo": round(azar.uniform(1, 120), 2),
+        "suscripciones": azar.randint(0, 8),
+        "esencial": azar.randint(0, 1),
+        "historial_pagos": [{"monto": round(azar.uniform(0.5, 80), 2), "motivo": "m"}
+                            for _ in range(azar.randint(0, 12))],
+    }
+
+
+CASOS_LIMITE = {
+    # El límite cae justo en 2x el promedio (20.04), que todavía es seguro
+    "borde_exacto": {"saldo": 80.5, "suscripciones": 2, "esencial": 0,
+                     "historial_pagos": [{"monto": 10.02, "motivo": "m"}]},
+    "sin_historial": {"saldo": 100, "suscripciones": 0, "esencial": 1, "historial_pagos": []},
+    **{f"azar_{n}": _caso(n) for n in range(6)},
+}
+
+
+@pytest.mark.parametrize("caso", list(CASOS_LIMITE.values()), ids=list(CASOS_LIMITE))
+def test_limite_coincide_con_fuerza_bruta(caso):
+    seguros = [
+        c / 100 for c in range(1, round(caso["saldo"] * 100) + 1)
+        if evaluar_gasto(**caso, nuevo_gasto=c / 100) == 0
+    ]
+    assert limite_gasto_seguro(**caso) == (max(seguros) if seguros else 0.0)
+
+
+@pytest.mark.parametrize("cuerpo", [
+    {"saldo": "nan"},
+    {"saldo": "inf"},
+    {"saldo": 100, "candidatos": [10, "nan"]},
+    {"saldo": 100, "candidatos": ["-inf"]},
+])
+def test_limite_rechaza_valores_no_finitos(client, sesion, cuerpo):
+    assert client.post("/api/evaluar/limite", json=cuerpo).status_code == 400
+
+
+@pytest.mark.parametrize("ruta", RUTAS[:2])
+@pytest.mark.parametrize("cuerpo", [
+    {**EVALUAR, "saldo": "inf"},
+    {**EVALUAR, "nuevo_gasto": "inf"},
+    {**EVALUAR, "nuevo_gasto": "nan"},
+    {**EVALUAR, "saldo": "mucho"},
+])
+def test_evaluar_rechaza_valores_no_finitos(client, sesion, monkeypatch, ruta, cuerpo):
+    # Con OpenAI configurado el mensaje pasa por la llave de caché
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    r = client.post(ruta, json=cuerpo)
+    assert r.status_code == 400
+    assert r.json["error"] == "Parámetros inválidos"
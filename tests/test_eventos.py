@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from services.eventos_service import BusLocal, obtener_bus
+
+
+@pytest.fixture(autouse=True)
+def _canal_activo(monkeypatch):
+    monkeypatch.setenv("EVENTOS_SSE", "1")
+    monkeypatch.setenv("EVENTOS_HEARTBEAT", "0.05")
+
+
+def leer(stream) -> dict:
+    """Siguiente evento "saldo" del stream, o None si llegó un keep-alive."""
+    chunk = next(stream)
+    chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+    if chunk.startswith(":"):
+        return None
+    evento, data = chunk.strip().split("\n")
+    assert evento == "event: saldo"
+    return json.loads(data[len("data: "):])
+
+
+def test_eventos_al_confirmar_cambios(client, sesion):
+    r = client.get("/api/eventos", buffered=False)
+    assert r.mimetype == "text/event-stream"
+    stream = iter(r.response)
+    assert leer(stream) == {"saldo": 500, "deuda_credito": 0, "version": 1, "movimiento": None}
+    assert obtener_bus().stats()["conexiones"] == 1
+
+    client.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    ev = leer(stream)
+    assert ev["saldo"] == 450 and ev["version"] == 2
+    assert ev["movimiento"]["motivo"] == "Café"
+
+    # Rechazado: no hay commit, no hay evento
+    client.post("/api/pago", json={"motivo": "X", "monto": 10**6})
+    assert leer(stream) is None
+
+    client.post("/api/pagos/batch", json=[
+        {"motivo": "Nuevo", "monto": 5, "fecha": "2030-01-01"},
+        {"motivo": "Viejo", "monto": 5, "fecha": "2020-01-01"},
+    ])
+    ev = leer(stream)
+    assert ev["saldo"] == 440
+    assert ev["movimiento"]["motivo"] == "Nuevo"
+
+    r.close()
+    assert obtener_bus().stats()["conexiones"] == 0
+
+
+def test_eventos_requiere_sesion(client):
+    assert client.get("/api/eventos").status_code == 401
+
+
+def test_canal_deshabilitado_no_abre_stream(client, sesion, monkeypatch):
+    monkeypatch.setenv("EVENTOS_SSE", "0")
+    r = client.get("/api/eventos")
+    assert r.status_code == 404 and r.mimetype == "application/json"
+    assert obtener_bus().stats()["conexiones"] == 0
+
+
+def test_bus_local_reparte_por_usuario():
+    bus = BusLocal(max_eventos=2)
+    a, b = bus.suscribir(1), bus.suscribir(2)
+    for i in range(3):
+        bus.publicar(1, {"n": i})
+    # La cola es acotada: se conservan los más recientes
+    assert a.esperar(0) == [{"n": 1}, {"n": 2}]
+    assert b.esperar(0) == []
+    bus.cancelar(a)
+    bus.cancelar(b)
+    assert bus.stats() == {"backend": "local", "usuarios": 0, "conexiones": 0}
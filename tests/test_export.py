@@ -0,0 +1,70 @@
+# tests/test_export.py
+import csv
+import gzip
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from models import db
+from models.pago import Pago
+
+
+@pytest.fixture()
+def movimientos(cuenta, sesion):
+    user_id, dinero_id = cuenta
+    inicio = date(2024, 1, 1)
+    db.session.execute(db.insert(Pago), [{
+        "idUser": user_id, "idDinero": dinero_id, "motivo": f"m{i}, \"con\" comas",
+        "monto": 10 + i, "tipo": "credito" if i % 3 == 0 else "debito",
+        "pagoFecha": inicio + timedelta(days=(300 - i) % 100), "categoria": "hogar",
+    } for i in range(300)])
+    db.session.commit()
+
+
+def test_csv_completo_en_orden(client, movimientos):
+    r = client.get("/api/movimientos/export")
+    assert r.status_code == 200
+    assert r.mimetype == "text/csv"
+    assert r.headers["Content-Disposition"] == 'attachment; filename="movimientos-inicio-hoy.csv"'
+    assert "Content-Encoding" not in r.headers
+
+    filas = list(csv.DictReader(io.StringIO(r.get_data(as_text=True))))
+    assert len(filas) == 300
+    claves = [(f["fecha"], int(f["id"])) for f in filas]
+    assert claves == sorted(claves)
+    assert filas[0]["motivo"].endswith(', "con" comas')
+    assert {f["signo"] for f in filas if f["tipo"] == "credito"} == {"+"}
+
+
+def test_ndjson_con_rango_y_tipo(client, movimientos):
+    r = client.get("/api/movimientos/export?format=ndjson&desde=2024-02-01&hasta=2024-02-10&tipo=debito")
+    assert r.mimetype == "application/x-ndjson"
+    filas = [json.loads(linea) for linea in r.get_data(as_text=True).splitlines()]
+    assert filas
+    assert all("2024-02-01" <= f["fecha"] <= "2024-02-10" and f["tipo"] == "debito" for f in filas)
+
+
+def test_gzip_mientras_se_envia(client, movimientos, monkeypatch):
+    monkeypatch.setenv("EXPORT_CHUNK_KB", "1")
+    plano = client.get("/api/movimientos/export?format=ndjson").get_data()
+
+    r = client.get("/api/movimientos/export?format=ndjson",
+                   headers={"Accept-Encoding": "gzip"}, buffered=False)
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    trozos = list(r.response)
+    r.close()
+    assert len(trozos) > 3
+    assert gzip.decompress(b"".join(trozos)) == plano
+
+
+def test_parametros_invalidos(client, movimientos):
+    assert client.get("/api/movimientos/export?format=xml").status_code == 400
+    r = client.get("/api/movimientos/export?desde=01/02/2024")
+    assert r.status_code == 400 and "desde" in r.json["error"]
+
+
+def test_requiere_sesion(client):
+    assert client.get("/api/movimientos/export").status_code == 401
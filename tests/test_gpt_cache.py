@@ -0,0 +1,121 @@
+# tests/test_gpt_cache.py
+from types import SimpleNamespace
+
+import pytest
+
+import ml.cache as cache_mod
+from ml.cache import LRUTTLCache, MensajeCache, clave_mensaje, crear_cache_desde_env
+from ml.model import resumen_historial
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture()
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_mod, "time", SimpleNamespace(monotonic=reloj))
+    return reloj
+
+
+class Compartido(dict):
+    """Backend compartido en memoria, con la interfaz de RedisBackend."""
+
+    def set(self, key, valor, ttl=None):
+        self[key] = valor
+
+
+class CompartidoCaido:
+    def get(self, key):
+        raise ConnectionError("sin redis")
+
+    def set(self, key, valor, ttl=None):
+        raise ConnectionError("sin redis")
+
+
+def _datos(nuevo_gasto=500, **extra) -> dict:
+    historial = [{"monto": 300, "motivo": "Súper"}, {"monto": 80, "motivo": "Cine"}]
+    return {"saldo": 4200, "suscripciones": 3, "esencial": False,
+            "nuevo_gasto": nuevo_gasto, "resumen": resumen_historial(historial), **extra}
+
+
+def test_lru_saca_la_menos_usada(reloj):
+    cache = LRUTTLCache(max_items=2, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "a" pasa a ser la más reciente
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == ("1", "3", 2)
+
+
+def test_ttl_expira_por_entrada(reloj):
+    cache = LRUTTLCache(max_items=10, ttl=60)
+    cache.set("corta", "x", ttl=5)
+    cache.set("larga", "y")
+    reloj.ahora += 10
+    assert cache.get("corta") is None
+    assert cache.get("larga") == "y"
+    reloj.ahora += 60
+    assert cache.get("larga") is None
+    assert len(cache) == 0
+
+
+def test_aciertos_y_fallos():
+    cache = MensajeCache(LRUTTLCache(max_items=10, ttl=60))
+    assert cache.get("k") is None
+    cache.set("k", "mensaje")
+    assert cache.get("k") == "mensaje"
+    assert cache.get("k") == "mensaje"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"], stats["size"]) == (2, 1, 0.6667, 1)
+
+    cache.clear()
+    assert cache.stats()["hits"] == 0 and cache.stats()["size"] == 0
+
+
+def test_compartido_llena_la_local():
+    compartido = Compartido()
+    otro_worker = MensajeCache(LRUTTLCache(), compartido)
+    otro_worker.set("k", "mensaje")
+
+    cache = MensajeCache(LRUTTLCache(), compartido)
+    assert cache.get("k") == "mensaje"
+    compartido.clear()
+    assert cache.get("k") == "mensaje"  # ya vive en la LRU local
+
+
+def test_compartido_caido_no_rompe():
+    cache = MensajeCache(LRUTTLCache(), CompartidoCaido())
+    cache.set("k", "mensaje")
+    assert cache.get("k") == "mensaje"
+    assert cache.get("otra") is None
+
+
+def test_clave_agrupa_montos_parecidos():
+    assert clave_mensaje(**_datos(500)) == clave_mensaje(**_datos(501))
+    assert clave_mensaje(**_datos(500)) != clave_mensaje(**_datos(700))
+    assert clave_mensaje(**_datos(500)) != clave_mensaje(**_datos(500, suscripciones=4))
+    assert clave_mensaje(**_datos(500)) != clave_mensaje(**_datos(500, esencial=True))
+
+    otro_historial = _datos(500, resumen=resumen_historial([{"monto": 900, "motivo": "Renta"}]))
+    assert clave_mensaje(**_datos(500)) != clave_mensaje(**otro_historial)
+
+
+@pytest.mark.parametrize("valor", [float("inf"), float("-inf"), float("nan")])
+def test_clave_con_valores_no_finitos(valor):
+    assert clave_mensaje(**_datos(valor)) != clave_mensaje(**_datos(500))
+    assert clave_mensaje(**_datos(500, saldo=valor)).startswith(f"gpt:{valor}:")
+
+
+def test_configuracion_desde_env(monkeypatch):
+    monkeypatch.setenv("GPT_CACHE_MAX", "3")
+    monkeypatch.setenv("GPT_CACHE_TTL", "7")
+    monkeypatch.delenv("GPT_CACHE_URL", raising=False)
+    stats = crear_cache_desde_env().stats()
+    assert (stats["max_items"], stats["ttl"], stats["shared"]) == (3, 7.0, False)
@@ -0,0 +1,187 @@
+# tests/test_gpt_client.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ml import cliente_openai
+from ml.gpt import (
+    generar_mensaje_gpt, generar_mensaje_gpt_async, generar_mensaje_gpt_stream,
+    obtener_breaker, obtener_cache,
+)
+from ml.model import resumen_vacio
+
+
+class _ChatStub(BaseHTTPRequestHandler):
+    """Imita POST /v1/chat/completions con keep-alive (HTTP/1.1)."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        time.sleep(self.server.demora)
+        largo = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(largo))
+        self.server.peticiones.append((self.path, self.client_address[1], body))
+        if body.get("stream"):
+            return self._responder_stream(body)
+
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": f" respuesta {len(self.server.peticiones)} "},
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _responder_stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for texto in ["Cuidado: ", "este gasto ", "es alto."]:
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": texto}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatStub)
+    server.peticiones = []
+    server.demora = 0
+    server.handle_error = lambda *args: None  # cliente que se fue por timeout
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    cliente_openai.cerrar_clientes()
+    obtener_cache().clear()
+    obtener_breaker().reiniciar()
+    yield server
+    cliente_openai.cerrar_clientes()
+    server.shutdown()
+
+
+def _datos(nuevo_gasto):
+    return dict(saldo=1000, suscripciones=1, esencial=False,
+                nuevo_gasto=nuevo_gasto, resumen=resumen_vacio())
+
+
+def test_cliente_sincrono_reutiliza_la_conexion(stub):
+    mensajes = [generar_mensaje_gpt(**_datos(g)) for g in (500, 700, 900)]
+
+    assert mensajes == ["respuesta 1", "respuesta 2", "respuesta 3"]
+    assert {p[0] for p in stub.peticiones} == {"/v1/chat/completions"}
+    # keep-alive: las tres peticiones salen por el mismo socket
+    assert len({p[1] for p in stub.peticiones}) == 1
+
+
+def test_cliente_async_desde_varios_event_loops(stub):
+    # Cada asyncio.run crea su propio loop (como una vista async de Flask)
+    primero = asyncio.run(generar_mensaje_gpt_async(**_datos(500)))
+    segundo = asyncio.run(generar_mensaje_gpt_async(**_datos(900)))
+
+    assert (primero, segundo) == ("respuesta 1", "respuesta 2")
+    assert len({p[1] for p in stub.peticiones}) == 1
+
+
+def test_sin_servidor_regresa_fallback(stub, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "0")
+    cliente_openai.cerrar_clientes()
+
+    mensaje = generar_mensaje_gpt(**_datos(900))
+
+    assert "Recomendaciones" in mensaje
+    assert stub.peticiones == []
+
+
+def test_presupuesto_de_latencia_regresa_fallback_a_tiempo(stub, monkeypatch):
+    stub.demora = 1.0
+    monkeypatch.setenv("GPT_LATENCY_BUDGET", "0.2")
+
+    inicio = time.monotonic()
+    mensaje = generar_mensaje_gpt(**_datos(900))
+    transcurrido = time.monotonic() - inicio
+
+    assert "Recomendaciones" in mensaje
+    assert transcurrido < 0.8
+    assert obtener_breaker().stats()["timeouts"] == 1
+    # El texto de respaldo nunca se guarda en la caché
+    assert obtener_cache().stats()["size"] == 0
+
+
+def test_breaker_se_abre_y_deja_de_llamar(stub, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "0")
+    cliente_openai.cerrar_clientes()
+    breaker = obtener_breaker()
+    breaker.umbral_fallos = 2
+
+    for g in (500, 600, 700, 800):
+        generar_mensaje_gpt(**_datos(g))
+
+    stats = breaker.stats()
+    assert stats["estado"] == "abierto"
+    assert stats["fallos"] == 2
+    assert stats["rechazadas"] == 2
+
+
+def test_stream_entrega_fragmentos_y_mensaje_final(stub):
+    eventos = list(generar_mensaje_gpt_stream(**_datos(900)))
+
+    assert [e["texto"] for e in eventos if e["tipo"] == "token"] == [
+        "Cuidado: ", "este gasto ", "es alto."
+    ]
+    assert eventos[-1] == {"tipo": "fin", "mensaje": "Cuidado: este gasto es alto.", "fuente": "gpt"}
+
+    # La segunda vez sale de la caché en un solo fragmento
+    eventos = list(generar_mensaje_gpt_stream(**_datos(900)))
+    assert eventos[-1]["fuente"] == "cache"
+
+
+def test_stream_sin_servidor_usa_fallback(stub, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "0")
+    cliente_openai.cerrar_clientes()
+
+    eventos = list(generar_mensaje_gpt_stream(**_datos(900)))
+
+    assert eventos[-1]["fuente"] == "local"
+    assert eventos[0]["texto"] == eventos[-1]["mensaje"]
+
+
+def test_stream_cerrado_en_la_prueba_libera_el_breaker(stub):
+    breaker = obtener_breaker()
+    breaker.umbral_fallos = 1
+    breaker.enfriamiento = 0
+    breaker.registrar_fallo()  # abierto; con enfriamiento 0 la siguiente es la prueba
+
+    eventos = generar_mensaje_gpt_stream(**_datos(900))
+    assert next(eventos)["tipo"] == "token"
+    assert breaker.stats()["estado"] == "semi_abierto"
+    eventos.close()  # el cliente se desconecta a la mitad
+
+    assert breaker.stats()["estado"] == "semi_abierto"
+    assert breaker.permitir()
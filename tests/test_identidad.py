@@ -0,0 +1,51 @@
+# tests/test_identidad.py
+import pytest
+from sqlalchemy import event
+
+from models import db
+from models.user import User
+
+
+@pytest.fixture()
+def consultas_users():
+    sentencias = []
+
+    def antes(conn, cursor, statement, params, context, executemany):
+        if " users" in statement.lower():
+            sentencias.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", antes)
+    yield sentencias
+    event.remove(db.engine, "before_cursor_execute", antes)
+
+
+def test_rutas_autenticadas_no_consultan_users(client, sesion, consultas_users):
+    client.get("/api/me")  # calienta la caché
+    consultas_users.clear()
+
+    assert client.get("/api/saldo").json["saldo"] == 500
+    assert client.get("/api/movimientos").status_code == 200
+    assert client.get("/api/movimientos?cursor=").status_code == 200
+    r = client.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    assert r.status_code == 200
+
+    assert consultas_users == []
+
+
+def test_una_consulta_por_peticion_sin_cache(client, sesion, consultas_users, monkeypatch):
+    monkeypatch.setenv("IDENTIDAD_CACHE_TTL", "0")
+    consultas_users.clear()
+    assert client.get("/api/saldo").status_code == 200
+    assert len(consultas_users) == 1
+
+
+def test_logout_y_cambio_de_perfil_invalidan(client, sesion):
+    assert client.get("/api/me").json["user"]["nombre"] == "Ana"
+
+    db.session.get(User, sesion).nombre = "Anita"
+    db.session.commit()
+    assert client.get("/api/me").json["user"]["nombre"] == "Anita"
+
+    client.post("/api/logout")
+    assert client.get("/api/me").json["user"] is None
+    assert client.get("/api/saldo").status_code == 401
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import instrumentacion
+
+
+def _timing(resp) -> dict:
+    partes = {}
+    for metrica in resp.headers["Server-Timing"].split(", "):
+        nombre, *attrs = metrica.split(";")
+        partes[nombre] = dict(a.split("=", 1) for a in attrs)
+    return partes
+
+
+def _valor(texto: str, serie: str) -> float:
+    for linea in texto.splitlines():
+        if linea.startswith(serie + " "):
+            return float(linea.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_server_timing_cuenta_sentencias(client, sesion, sentencias):
+    sentencias.clear()
+    r = client.get("/api/saldo")
+    timing = _timing(r)
+    assert timing["db"]["desc"] == f'"{len(sentencias)} consultas"'
+    assert len(sentencias) > 0
+    assert float(timing["app"]["dur"]) >= float(timing["db"]["dur"])
+    assert "gpt" not in timing
+
+
+def test_metrics_por_ruta(client, sesion):
+    serie = 'http_request_duration_seconds_count{ruta="/api/saldo",metodo="GET",status="200"}'
+    antes = _valor(client.get("/metrics").get_data(as_text=True), serie)
+    client.get("/api/saldo")
+    client.get("/api/saldo")
+
+    r = client.get("/metrics")
+    assert r.mimetype == "text/plain"
+    texto = r.get_data(as_text=True)
+    assert _valor(texto, serie) == antes + 2
+    assert "# TYPE http_request_db_statements histogram" in texto
+    assert 'http_request_db_statements_bucket{ruta="/api/saldo",le="+Inf"}' in texto
+
+
+def test_gpt_en_server_timing(client, sesion, monkeypatch):
+    import time
+    import app as app_module
+
+    def modelo(**_kw):
+        with instrumentacion.medir_gpt():
+            time.sleep(0.02)
+        return "ok"
+
+    monkeypatch.setattr(app_module, "generar_mensaje_gpt", modelo)
+    r = client.post("/api/evaluar", json={"saldo": 100, "suscripciones": 5, "esencial": 0, "nuevo_gasto": 5000})
+    assert r.json == {"alerta": True, "mensaje": "ok"}
+    assert float(_timing(r)["gpt"]["dur"]) >= 20
+
+
+def test_error_no_controlado_se_registra(api_app, client, caplog):
+    @api_app.get("/_prueba_error")
+    def revienta():
+        raise RuntimeError("boom")
+
+    r = client.get("/_prueba_error")
+    assert r.status_code == 500 and r.json["error"] == "internal_error"
+    assert "Error no controlado en GET /_prueba_error" in caplog.text
+    texto = client.get("/metrics").get_data(as_text=True)
+    assert _valor(texto, 'http_request_errors_total{ruta="/_prueba_error",tipo="RuntimeError"}') >= 1
+
+
+def test_perfilado_por_muestreo(client, sesion, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "1")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    r = client.get("/api/saldo")
+    nombre = r.headers["X-Profile"]
+    assert nombre.endswith("api_saldo.prof")
+    assert os.path.exists(tmp_path / nombre)
+
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "0")
+    assert "X-Profile" not in client.get("/api/saldo").headers
+
+
+def test_sentencia_fallida_cuenta_y_no_deja_residuos(api_app, client):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from models import db
+
+    @api_app.get("/_prueba_sql")
+    def sql_roto():
+        conn = db.session.connection()
+        try:
+            conn.execute(text("SELECT * FROM tabla_inexistente"))
+        except OperationalError:
+            db.session.rollback()
+        db.session.execute(text("SELECT 1"))
+        return {"ok": True}
+
+    r = client.get("/_prueba_sql")
+    assert r.status_code == 200
+    assert _timing(r)["db"]["desc"] == '"2 consultas"'
+    texto = client.get("/metrics").get_data(as_text=True)
+    assert _valor(texto, 'http_request_db_errors_total{ruta="/_prueba_sql"}') == 1
+    with api_app.app_context():
+        with db.engine.connect() as conn:
+            assert "inicio_sql" not in conn.info
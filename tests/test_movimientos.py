@@ -0,0 +1,78 @@
+# tests/test_movimientos.py
+import pytest
+
+# Varios pagos por día: el orden dentro del día lo da idPago
+MOVIMIENTOS = [
+    {"motivo": f"m{i:02d}", "monto": 1 + i, "fecha": f"2024-03-{1 + i // 3:02d}",
+     "tipo": "credito" if i % 4 == 0 else "debito"}
+    for i in range(23)
+]
+
+
+@pytest.fixture()
+def saldo_inicial():
+    return 10_000, 0
+
+
+@pytest.fixture()
+def movimientos(client, sesion):
+    r = client.post("/api/pagos/batch", json=MOVIMIENTOS)
+    assert r.json["insertados"] == len(MOVIMIENTOS)
+
+
+def _recorrer(client, query: str = "") -> list:
+    paginas, cursor = [], ""
+    while True:
+        r = client.get(f"/api/movimientos?per_page=5&cursor={cursor}{query}")
+        assert r.status_code == 200
+        paginas.append([m["motivo"] for m in r.json["movimientos"]])
+        if not r.json["has_next"]:
+            assert r.json["next_cursor"] is None
+            return paginas
+        cursor = r.json["next_cursor"]
+
+
+def test_cursor_recorre_todo_en_orden(client, movimientos):
+    paginas = _recorrer(client)
+    assert [len(p) for p in paginas] == [5, 5, 5, 5, 3]
+    # Más reciente primero; en el mismo día, el último insertado primero
+    assert sum(paginas, []) == [m["motivo"] for m in reversed(MOVIMIENTOS)]
+
+
+def test_cursor_coincide_con_paginas(client, movimientos):
+    por_pagina = [
+        [m["motivo"] for m in client.get(f"/api/movimientos?per_page=5&page={n}").json["movimientos"]]
+        for n in range(1, 6)
+    ]
+    assert _recorrer(client) == por_pagina
+
+
+def test_cursor_con_tipo(client, movimientos):
+    creditos = [m["motivo"] for m in reversed(MOVIMIENTOS) if m["tipo"] == "credito"]
+    assert sum(_recorrer(client, "&tipo=credito"), []) == creditos
+
+
+def test_cursor_no_se_mueve_con_pagos_nuevos(client, movimientos):
+    primera = client.get("/api/movimientos?per_page=5&cursor=").json
+    client.post("/api/pago", json={"motivo": "nuevo", "monto": 1})
+
+    segunda = client.get(f"/api/movimientos?per_page=5&cursor={primera['next_cursor']}").json
+    motivos = [m["motivo"] for m in segunda["movimientos"]]
+    assert motivos == [m["motivo"] for m in reversed(MOVIMIENTOS)][5:10]
+    assert segunda["cursor"] == primera["next_cursor"]
+
+
+def test_total_solo_si_se_pide(client, movimientos):
+    assert "total" not in client.get("/api/movimientos?cursor=").json
+    assert client.get("/api/movimientos?cursor=&total=1").json["total"] == len(MOVIMIENTOS)
+
+
+@pytest.mark.parametrize("cursor", ["basura", "MjAyNC0wMy0wMQ", "eHx5"])
+def test_cursor_invalido(client, movimientos, cursor):
+    r = client.get(f"/api/movimientos?cursor={cursor}")
+    assert r.status_code == 400
+    assert r.json["error"] == "Cursor inválido"
+
+
+def test_cursor_requiere_sesion(client):
+    assert client.get("/api/movimientos?cursor=").status_code == 401
@@ -0,0 +1,99 @@
+# tests/test_password_service.py
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db
+from models.user import User
+import services.password_service as ps
+from services.password_service import PasswordService, PoolHash, PoolSaturado
+
+
+@pytest.fixture()
+def pool(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:20000")
+    pool = PoolHash(procesos=1, cola=1, timeout=30, retry_after=3)
+    monkeypatch.setattr(ps, "_pool", pool)
+    yield pool
+    pool.cerrar()
+
+
+def test_hash_y_verificacion_en_el_pool(pool):
+    h = PasswordService.hashear("secreto")
+    assert h.startswith("pbkdf2:sha256:20000$")
+    assert PasswordService.verificar(h, "secreto")
+    assert not PasswordService.verificar(h, "otro")
+    assert not PasswordService.verificar("", "secreto")
+
+    stats = pool.stats()
+    assert stats["operaciones"] == {"hash": 1, "verificar": 2}
+    assert stats["en_vuelo"] == 0
+    assert stats["ms"]["max"] > 0
+
+
+def test_pool_lleno_rechaza_sin_esperar(pool):
+    lento = generate_password_hash("x", method="pbkdf2:sha256:3000000")
+    hilo = threading.Thread(target=PasswordService.verificar, args=(lento, "x"))
+    hilo.start()
+    while pool.stats()["en_vuelo"] == 0:
+        time.sleep(0.01)
+
+    t0 = time.perf_counter()
+    with pytest.raises(PoolSaturado) as exc:
+        PasswordService.hashear("otra")
+    assert time.perf_counter() - t0 < 0.1
+    assert exc.value.retry_after == 3
+    hilo.join()
+    assert pool.stats()["rechazadas"] == 1
+
+
+def test_necesita_rehash_por_parametros(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:20000")
+    actual = ps.generar_hash("x")
+    assert not PasswordService.necesita_rehash(actual)
+    assert PasswordService.necesita_rehash(
+        generate_password_hash("x", method="pbkdf2:sha256:1000", salt_length=16)
+    )
+    assert PasswordService.necesita_rehash(
+        generate_password_hash("x", method="pbkdf2:sha256:20000", salt_length=8)
+    )
+    # Sin iteraciones explícitas se usa el default de werkzeug
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+    assert PasswordService.necesita_rehash(actual)
+
+
+def test_login_rehashea_y_responde_503_si_esta_saturado(client, pool, monkeypatch):
+    viejo = generate_password_hash("clave", method="pbkdf2:sha256:1000", salt_length=16)
+    db.session.add(User(nombre="A", correo="a@example.com", contrasena=viejo))
+    db.session.commit()
+
+    r = client.post("/api/login", json={"correo": "a@example.com", "contrasena": "clave"})
+    assert r.status_code == 200
+    nuevo = db.session.execute(db.select(User.contrasena)).scalar_one()
+    assert nuevo.startswith("pbkdf2:sha256:20000$")
+    assert pool.stats()["rehashes"] == 1
+
+    def lleno(*args):
+        raise PoolSaturado(3)
+    monkeypatch.setattr(pool, "ejecutar", lleno)
+    r = client.post("/api/login", json={"correo": "a@example.com", "contrasena": "clave"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+    r = client.post("/api/register", json={
+        "nombre": "B", "apellido": "C", "correo": "b@example.com", "contrasena": "clave",
+    })
+    assert r.status_code == 503
+
+
+def test_timeout_del_pool_responde_503(client, pool):
+    pool.timeout = 0.2
+    lento = generate_password_hash("clave", method="pbkdf2:sha256:3000000")
+    db.session.add(User(nombre="A", correo="a@example.com", contrasena=lento))
+    db.session.commit()
+
+    r = client.post("/api/login", json={"correo": "a@example.com", "contrasena": "clave"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+    assert pool.stats()["errores"] == 1
@@ -0,0 +1,90 @@
+# tests/test_planes.py
+"""
+Planes de ejecución del historial: cada SELECT sobre pagos de las rutas de
+movimientos, del export y del dashboard debe ser un rango de ix_pagos_dinero_* (sin
+recorrer pagos ni ordenar la historia completa). Corre EXPLAIN sobre las
+sentencias reales, en SQLite o MySQL (TEST_DATABASE_URL).
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import db
+from models.dinero import Dinero
+from services.dashboard_service import DashboardService
+from services.export_service import ExportService
+from services.payment_service import PaymentService
+
+
+@pytest.fixture()
+def cuenta(api_app):
+    from benchmarks.dataset import generar
+
+    generar(3, 60, prefijo="plan")
+    # Estadísticas al día, como en producción
+    db.session.execute(db.text("ANALYZE" if db.engine.dialect.name == "sqlite" else "ANALYZE TABLE pagos"))
+    db.session.commit()
+    return db.session.execute(
+        db.select(Dinero.idUser, Dinero.idDinero).order_by(Dinero.idDinero).limit(1)
+    ).one()
+
+
+@pytest.fixture()
+def selects_de_pagos(api_app):
+    capturadas = []
+
+    def antes(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "pagos" in statement:
+            capturadas.append((statement, params))
+
+    event.listen(db.engine, "before_cursor_execute", antes)
+    yield capturadas
+    event.remove(db.engine, "before_cursor_execute", antes)
+
+
+def _plan(statement: str, params) -> list:
+    """[(tabla, índice, detalle)] de EXPLAIN en el dialecto actual."""
+    conn = db.session.connection()
+    if db.engine.dialect.name == "sqlite":
+        filas = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).all()
+        return [(None, None, f[3]) for f in filas]
+    filas = conn.exec_driver_sql("EXPLAIN " + statement, params).mappings().all()
+    return [(f["table"], f["key"], f["Extra"] or "") for f in filas]
+
+
+def _verificar(statement: str, params) -> None:
+    plan = _plan(statement, params)
+    texto = "\n".join(f"  {p}" for p in plan)
+    if db.engine.dialect.name == "sqlite":
+        detalles = [d for _, _, d in plan]
+        assert any(d.startswith("SEARCH pagos USING") and "ix_pagos_dinero_" in d for d in detalles), texto
+        assert not any(d.startswith("SCAN pagos") for d in detalles), texto
+        if "ultimos" not in statement:
+            assert not any("TEMP B-TREE" in d for d in detalles), texto
+    else:
+        pagos = [p for p in plan if p[0] == "pagos"]
+        assert pagos and all((k or "").startswith("ix_pagos_dinero_") for _, k, _ in pagos), texto
+        assert not any("filesort" in e for t, _, e in plan if t == "pagos"), texto
+
+
+def test_paginas_y_top_n_usan_el_indice(cuenta, selects_de_pagos):
+    user_id, dinero_id = cuenta
+    PaymentService.get_payments_by_user(user_id, dinero_id, page=3, per_page=10)
+    PaymentService.get_payments_by_user(user_id, dinero_id, page=1, per_page=10, tipo="credito")
+    primera = PaymentService.get_payments_by_cursor(dinero_id, None, 10, with_total=True)
+    PaymentService.get_payments_by_cursor(dinero_id, primera["next_cursor"], 10, tipo="debito")
+    DashboardService._consultar(user_id)
+    list(ExportService.filas(dinero_id, desde=date.today() - timedelta(days=90)))
+
+    assert len(selects_de_pagos) == 9
+    for statement, params in selects_de_pagos:
+        _verificar(statement, params)
+
+
+def test_historial_no_se_consulta(cuenta, sentencias):
+    user_id, dinero_id = cuenta
+    PaymentService.get_payments_by_user(user_id, dinero_id)
+    PaymentService.get_payments_by_cursor(dinero_id)
+    DashboardService._consultar(user_id)
+    assert sentencias and not any("historial" in s for s in sentencias)
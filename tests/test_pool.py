@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import exc
+
+from models import db
+from services.pool_service import QueuePoolMedido, estado_pool
+
+
+@pytest.fixture()
+def app_pool(tmp_path):
+    from app import create_app
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'pool.db'}",
+        "SQLALCHEMY_ENGINE_OPTIONS": {
+            "poolclass": QueuePoolMedido, "pool_size": 1, "max_overflow": 0, "pool_timeout": 0.05,
+        },
+        "TESTING": True,
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_health_hace_ping(client):
+    r = client.get("/health")
+    assert r.status_code == 200
+    assert r.json["ok"] is True
+    assert r.json["db"]["ok"] is True and r.json["db"]["ping_ms"] >= 0
+
+
+def test_metricas_del_pool(app_pool):
+    engine = db.engine
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        assert estado_pool(engine)["en_uso"] == 1
+
+    engine.dispose()  # el pool nuevo conserva las métricas
+    r = app_pool.test_client().get("/health/db")
+    estado = r.json["default"]
+    assert estado["clase"] == "QueuePoolMedido"
+    assert estado["tamano"] == 1 and estado["en_uso"] == 0
+    assert estado["timeouts"] == 1
+    assert estado["checkouts"] == 2
+    assert estado["conexiones_nuevas"] == 1
+    assert sum(estado["espera_ms"]["histograma"].values()) == 2
+
+
+def test_health_503_sin_base(app_pool, monkeypatch):
+    def falla(*_args):
+        raise exc.OperationalError("SELECT 1", {}, Exception("gone away"))
+
+    monkeypatch.setattr(db.engine, "connect", falla)
+    r = app_pool.test_client().get("/health")
+    assert r.status_code == 503
+    assert r.json["db"] == {"ok": False, "ping_ms": r.json["db"]["ping_ms"], "error": "OperationalError"}
@@ -0,0 +1,160 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from models import db
+from models.user import User
+from models.dinero import Dinero
+from services import replica_service
+
+
+@pytest.fixture()
+def dos_bases(tmp_path, monkeypatch, caches_limpias, crear_cuenta):
+    """Primario y réplica en dos SQLite; la réplica se llena a mano."""
+    from app import create_app
+
+    monkeypatch.setenv("REPLICA_LAG_CHECK", "0")
+    monkeypatch.setattr(replica_service, "_monitor", None)
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primario.db'}",
+        "SQLALCHEMY_BINDS": {"replica": f"sqlite:///{tmp_path / 'replica.db'}"},
+        "TESTING": True,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)
+        replica = db.engines["replica"]
+        db.metadata.create_all(replica)
+
+        user_id, _ = crear_cuenta()
+        with replica.begin() as conn:
+            conn.execute(User.__table__.insert(), [{
+                "idUser": user_id, "nombre": "Ana", "apellido": "Ruiz",
+                "correo": "ana@example.com", "contrasena": db.session.get(User, user_id).contrasena,
+            }])
+            # Saldo distinto para saber de dónde se leyó
+            conn.execute(Dinero.__table__.insert(), [{"saldo": 111, "deuda_credito": 0, "idUser": user_id}])
+
+        client = app.test_client()
+        client.post("/api/login", json={"correo": "ana@example.com", "contrasena": "clave"})
+        yield client
+        db.session.remove()
+        db.drop_all(bind_key=None)
+        db.metadata.drop_all(replica)
+    # init_app registra la metadata del bind en el objeto db compartido
+    db.metadatas.pop("replica", None)
+
+
+def olvidar_pin(client):
+    with client.session_transaction() as s:
+        s.pop("primario_hasta", None)
+
+
+def test_lecturas_van_a_la_replica(dos_bases):
+    olvidar_pin(dos_bases)  # el login escribió last_login_at
+    assert dos_bases.get("/api/saldo").json["saldo"] == 111
+    assert dos_bases.get("/api/dashboard").json["saldo"] == 111
+    assert dos_bases.get("/health/replica").json["lecturas"]["replica"] == 2
+
+
+def test_read_your_writes_tras_un_commit(dos_bases):
+    olvidar_pin(dos_bases)
+    r = dos_bases.post("/api/pago", json={"motivo": "Café", "monto": 50, "tipo": "debito"})
+    assert r.json["nuevo_saldo"] == 450
+    # Fijado al primario: ve su propio pago
+    assert dos_bases.get("/api/saldo").json["saldo"] == 450
+    assert dos_bases.get("/api/dashboard").json["movimientos"][0]["motivo"] == "Café"
+
+    olvidar_pin(dos_bases)
+    assert dos_bases.get("/api/saldo").json["saldo"] == 111
+
+
+def test_replica_atrasada_lee_del_primario(dos_bases, monkeypatch):
+    olvidar_pin(dos_bases)
+    monkeypatch.setattr(replica_service, "medir_retraso", lambda engine: 30.0)
+    assert dos_bases.get("/api/saldo").json["saldo"] == 500
+
+    monkeypatch.setattr(replica_service, "medir_retraso", lambda engine: None)
+    assert dos_bases.get("/api/saldo").json["saldo"] == 500
+    assert dos_bases.get("/health/replica").json["lecturas"]["retraso"] == 2
+
+
+def test_sin_replica_todo_va_al_primario(client):
+    assert client.get("/health/replica").json["configurada"] is False
+
+
+class _MySQLFalso:
+    """Engine mínimo: sólo responde SHOW REPLICA STATUS con ``fila``."""
+
+    class dialect:
+        name = "mysql"
+
+    def __init__(self, fila):
+        self.fila = fila
+        # Lo que vería el timeout de lectura de PyMySQL durante la consulta
+        self.connection = SimpleNamespace(dbapi_connection=SimpleNamespace(_read_timeout=None))
+        self.timeouts = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, _sql):
+        self.timeouts.append(self.connection.dbapi_connection._read_timeout)
+        return self
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.fila
+
+
+@pytest.mark.parametrize("fila,esperado", [
+    ({"Seconds_Behind_Source": 3}, 3.0),
+    ({"Seconds_Behind_Master": 0}, 0.0),
+    ({"Seconds_Behind_Source": None}, None),  # replicación detenida
+    (None, None),  # el servidor no es réplica
+])
+def test_medir_retraso(fila, esperado):
+    assert replica_service.medir_retraso(_MySQLFalso(fila)) == esperado
+
+
+def test_medir_retraso_con_timeout_de_lectura(monkeypatch):
+    monkeypatch.setenv("REPLICA_LAG_TIMEOUT", "0.5")
+    engine = _MySQLFalso({"Seconds_Behind_Source": 1})
+    replica_service.medir_retraso(engine)
+    assert engine.timeouts == [0.5]
+    assert engine.connection.dbapi_connection._read_timeout is None
+
+
+def test_medicion_lenta_no_bloquea_a_los_demas(monkeypatch):
+    monitor = replica_service.MonitorReplica(intervalo=0)
+    monkeypatch.setattr(replica_service, "medir_retraso", lambda engine: 1.0)
+    assert monitor.retraso(None) == 1.0
+
+    entro, soltar = threading.Event(), threading.Event()
+
+    def colgada(engine):
+        entro.set()
+        soltar.wait(5)
+        return 3.0
+
+    monkeypatch.setattr(replica_service, "medir_retraso", colgada)
+    hilo = threading.Thread(target=monitor.retraso, args=(None,))
+    hilo.start()
+    assert entro.wait(5)
+
+    # Mientras una medición está en curso los demás usan la anterior
+    assert monitor.retraso(None) == 1.0
+    monitor.contar("replica")
+    assert monitor.stats()["retraso_s"] == 1.0
+
+    soltar.set()
+    hilo.join()
+    assert monitor.stats()["retraso_s"] == 3.0